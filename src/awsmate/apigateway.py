@@ -1,13 +1,31 @@
+import abc
 import base64
-import gzip
+import csv
+import collections.abc
+import binascii
+import dataclasses
+import datetime
+import decimal
+import email.utils
+import enum
+import functools
+import hashlib
 import ipaddress
+import io
+import itertools
 import json
+import os
 import re
+import tempfile
+import time
 import typing
+import urllib.parse
+import uuid
+import zlib
 
 from http import HTTPStatus
 
-from awsmate.logger import logger, log_internal_error
+from awsmate.logger import logger, log_internal_error, dump_debug_buffer
 from awsmate.lambdafunction import LambdaEvent, AwsEventSpecificationError
 
 
@@ -27,1702 +45,5157 @@ class MalformedPayloadError(RuntimeError):
         super().__init__(msg)
         
 
-class LambdaProxyEvent(LambdaEvent):
-    """
-    Mapping of the input event received by an AWS Lambda function triggered by AWS API Gateway and integrated 
-    in `AWS_PROXY <https://docs.aws.amazon.com/apigateway/latest/developerguide/api-gateway-set-up-simple-proxy.html>`_ mode.
+class HeaderPreference(typing.NamedTuple):
     """
+    Element of a header using the weighted quality value syntax, such as ``Accept`` or ``Accept-Encoding``, as parsed by :func:`parse_header_preferences`.
 
-    def __init__(self, event_object: dict) -> None:
-        """
-        Parameters
-        ----------
-        event_object : dict
-            The parameter ``event`` received by the AWS Lambda function handler.
+    Examples
+    --------
+    Given the header ``Accept: text/html;level=1;q=0.8``:
 
-        Raises
-        ------
-        TypeError
-            If ``event_object`` is not a ``dict``.  
-                    
-        Examples
-        --------
-        >>> def lambda_handler(raw_event, context):
-        >>>     from awsmate.apigateway import LambdaProxyEvent
-        >>>     event = LambdaProxyEvent(raw_event)                
-        """
-        
-        super().__init__(event_object)
+    >>> parse_header_preferences(event.header('Accept'))[0]
+    HeaderPreference(value='text/html', quality=0.8, parameters=(('level', '1'),))
+    """
 
+    value: str
+    """
+    str : The value, as submitted.
+    """
 
-    def source_ip(self) -> typing.Union[ipaddress.IPv4Address, ipaddress.IPv6Address]:
-        """
-        Returns the source IP address of the API call.
+    quality: float
+    """
+    float : The quality value, between ``0.0`` (not acceptable) and ``1.0``.
+    """
 
-        Returns
-        -------
-        ipaddress.IPv4Address or ipaddress.IPv6Address
-            The IP address the API call comes from.
+    parameters: typing.Tuple[typing.Tuple[str, str], ...]
+    """
+    tuple : The parameters preceding the quality value, as (name in lower case, unquoted value) pairs.
+    """
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``requestContext.identity.sourceIp`` key is present in the event data or if the IP address is invalid.            
 
-        Examples
-        --------
-        >>> event.source_ip()
-        IPv4Address('93.184.216.34')
-        """
+def _split_unquoted(value: str, separator: str) -> typing.List[str]:
+    parts = []
+    start = 0
+    quoted = False
+    escaped = False
 
-        try: 
-            sourceIp = ipaddress.ip_address(self._event["requestContext"]["identity"]["sourceIp"])
+    for i, c in enumerate(value):
+        if escaped:
+            escaped = False
+        elif c == '\\' and quoted:
+            escaped = True
+        elif c == '"':
+            quoted = not quoted
+        elif c == separator and not quoted:
+            parts.append(value[start:i])
+            start = i + 1
 
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
+    parts.append(value[start:])
 
-        except ValueError as err:
-            raise AwsEventSpecificationError(f'Invalid IP address: {err}')
+    return parts
 
-        return sourceIp      
-        
-    
-    def http_headers(self) -> typing.Dict[str, str]:
-        """
-        Returns all HTTP headers of the API call.
 
-        Header names are always returned in lower case. Values of these headers are returned unparsed, as submitted.
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
 
-        Returns
-        -------
-        dict
-            Keys: header names as ``str``. Values: corresponding raw values as ``str``.
-            
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``headers`` key is present in the event data.
+    return value
 
-        Examples
-        --------
-        >>> event.http_headers()
-        {'accept': 'application/json', 'accept-encoding': 'gzip,identity'}                
-        """
-        
-        try: 
-            headers = self._event["headers"]
 
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
+def _specificity(preference: HeaderPreference) -> int:
+    if preference.value in ('*', '*/*'):
+        return 0
 
-        return {} if headers is None else { k.lower(): v for k, v in headers.items() }
+    if preference.value.endswith('/*'):
+        return 1
 
+    return 3 if preference.parameters else 2
 
-    def http_method(self) -> str:
-        """
-        Returns the HTTP method of the API call.
 
-        The method verb is always returned in upper case. GET, PUT, POST, PATCH, DELETE are expected, but no verification is performed.
+@functools.lru_cache(maxsize = 256)
+def parse_header_preferences(header_value: str) -> typing.Tuple[HeaderPreference, ...]:
+    """
+    Parses a header using the weighted quality value syntax of `RFC 7231 <https://www.rfc-editor.org/rfc/rfc7231#section-5.3.1>`_.
 
-        Returns
-        -------
-        str
-            HTTP method of the API call.
+    Elements are sorted by decreasing quality value, then by decreasing specificity (``text/html;level=1``, then ``text/html``, then ``text/*``, 
+    then ``*/*``), then in the order they were submitted. Elements weighted ``q=0`` are kept, as they exclude the matching values. 
+    Elements having no quality value or a malformed one are weighted ``1.0``. Malformed parameters and empty elements are ignored.
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``requestContext.httpMethod`` key is present in the event data.            
+    Results are cached by header value: browsers and SDKs only send a handful of distinct values. They are immutable and can be shared safely.
 
-        Examples
-        --------
-        >>> event.http_method()
-        'GET'
-        """
+    Parameters
+    ----------
+    header_value : str
+        The raw value of the header.
 
-        try: 
-            method = self._event["requestContext"]["httpMethod"]
+    Returns
+    -------
+    tuple
+        The elements of the header as :class:`HeaderPreference`, in decreasing preference order.
 
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
+    Examples
+    --------
+    >>> parse_header_preferences('text/*;q=0.5, text/html, application/json;q=0')
+    (HeaderPreference(value='text/html', quality=1.0, parameters=()), HeaderPreference(value='text/*', quality=0.5, parameters=()), HeaderPreference(value='application/json', quality=0.0, parameters=()))
+    """
 
-        return method.upper()
-    
+    preferences = []
 
-    def http_protocol(self) -> str:
-        """
-        Returns the HTTP protocol of the API call.
+    for element in _split_unquoted(header_value, ','):
+        parts = _split_unquoted(element, ';')
+        value = parts[0].strip()
 
-        The protocol is always returned in upper case.
+        if not value:
+            continue
 
-        Returns
-        -------
-        str
-            HTTP protocol of the API call.
+        quality = 1.0
+        parameters = []
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``requestContext.protocol`` key is present in the event data.            
+        for part in parts[1:]:
+            name, separator, parameterValue = part.partition('=')
+            name = name.strip().lower()
 
-        Examples
-        --------
-        >>> event.http_protocol()
-        'HTTP/1.1'
-        """
+            if not separator or not name:
+                continue
 
-        try: 
-            protocol = self._event["requestContext"]["protocol"]
+            if name == 'q':
+                try:
+                    quality = float(parameterValue.strip())
+                    quality = min(max(quality, 0.0), 1.0) if quality == quality else 1.0
 
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
+                except ValueError:
+                    quality = 1.0
 
-        return protocol.upper()    
-    
+                # Parameters following the quality value are extensions, not parameters of the value.
+                break
 
-    def http_user_agent(self) -> str:
-        """
-        Returns the HTTP user-agent of the API call.
+            parameters.append((name, _unquote(parameterValue.strip())))
 
-        The user-agent is returned as transmitted by AWS API Gateway.
+        preferences.append(HeaderPreference(value, quality, tuple(parameters)))
 
-        Returns
-        -------
-        str
-            HTTP user-agent of the API call.
+    return tuple(sorted(preferences, key = lambda p: (-p.quality, -_specificity(p))))
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``requestContext.identity.userAgent`` key is present in the event data.            
 
-        Examples
-        --------
-        >>> event.http_user_agent()
-        'curl/7.83.1'
-        """
+@functools.lru_cache(maxsize = 256)
+def _acceptable_values(header_value: str) -> typing.Tuple[str, ...]:
+    return tuple(dict.fromkeys(p.value for p in parse_header_preferences(header_value) if p.quality > 0))
 
-        try: 
-            userAgent = self._event["requestContext"]["identity"]["userAgent"]
 
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
+_content_decoders = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'x-gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS
+}
 
-        return userAgent        
-    
 
-    def header_sorted_preferences(self, header: str) -> typing.Tuple[str, ...]:
-        """
-        Returns all values assigned to the given header, sorted by decreasing preferences.
+class UploadedFile():
+    """
+    File submitted as a part of a ``multipart/form-data`` body, as returned by :meth:`LambdaProxyEvent.files`.
 
-        Preferences are determined according to the weighted quality value syntax.
-        An empty ``tuple`` is returned if the given header is not found among those submitted by the caller.
+    Small files are held as a zero-copy view of the decoded body, larger ones are spilled to a temporary file
+    (see :attr:`LambdaProxyEvent.file_spill_threshold`).
 
-        Returns
-        -------
-        tuple
-            Header values as ``str``, in decreasing preference order.
-            
-        Examples
-        --------
-        Given the header ``Accept-Encoding: gzip;q=0.2,deflate,identity;q=0.9``: 
+    Examples
+    --------
+    >>> upload = event.files()['picture'][0]
+    >>> upload.filename, upload.content_type, upload.size
+    ('cat.png', 'image/png', 5242880)
+    >>> with upload.open() as f:
+    >>>     header = f.read(8)
+    """
 
-        >>> event.header_sorted_preferences('Accept-Encoding')
-        ('deflate', 'identity', 'gzip')
+    def __init__(
+            self,
+            name: str,
+            filename: str,
+            content_type: str,
+            headers: typing.Dict[str, str], *,
+            data: typing.Optional[memoryview] = None,
+            path: typing.Optional[str] = None
+        ) -> None:
+        """
+        Parameters
+        ----------
+        name : str
+            The name of the form field.
+        filename : str
+            The file name, as submitted.
+        content_type : str
+            The ``Content-Type`` of the part, ``application/octet-stream`` if it was not submitted.
+        headers : dict
+            The headers of the part. Keys: header names in lower case. Values: corresponding raw values.
+        data : memoryview
+            The content of the file if it is held in memory. Exclusive with ``path``.
+        path : str
+            The path of the file the content was spilled to. Exclusive with ``data``.
         """
-        
-        headers = self.http_headers()
-        preferences = {}
-        header = header.lower()
 
-        if header in headers:
-            for p in headers[header].split(','):
-                prefDesc = p.replace(' ', '').split(';')
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.headers = headers
 
-                if len(prefDesc[0]):
-                    try:
-                        qValue = 1.0 if len(prefDesc) == 1 else float(prefDesc[1].split('q=')[1])
-                    except:
-                        qValue = 0.5
+        self._data = data
+        self._path = path
 
-                    preferences[prefDesc[0]] = qValue
 
-        return tuple(sorted(preferences.keys(), key = lambda k: preferences[k], reverse = True))
+    @property
+    def size(self) -> int:
+        """
+        int : The size of the file in bytes.
+        """
 
+        return self._data.nbytes if self._data is not None else os.path.getsize(self._path)
 
-    def query_domain_name(self) -> str:
-        """
-        Returns the domain name of the API call.
 
-        The domain name is always returned in lower case.
+    @property
+    def data(self) -> typing.Optional[memoryview]:
+        """
+        memoryview : The content of the file if it is held in memory, ``None`` if it was spilled to :attr:`path`.
+        """
 
-        Returns
-        -------
-        str
-            Domain name of the API call.
+        return self._data
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``requestContext.domainName`` key is present in the event data.            
 
-        Examples
-        --------
-        >>> event.query_domain_name()
-        'example.com'
+    @property
+    def path(self) -> typing.Optional[str]:
+        """
+        str : The path of the temporary file the content was spilled to, ``None`` if it is held in memory.
         """
 
-        try: 
-            domainName = self._event["requestContext"]["domainName"]
+        return self._path
 
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
 
-        return domainName.lower()   
-        
-        
-    def query_path(self) -> typing.Tuple[str, ...]:
+    def open(self) -> typing.BinaryIO:
         """
-        Returns the path of the API call, broken down into elements.
+        Opens the content of the file for reading.
 
         Returns
         -------
-        tuple
-            Path elements as ``str``.
+        file object
+            A binary file object, to be closed by the caller.
+        """
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``requestContext.path`` key is present in the event data.      
+        return open(self._path, 'rb') if self._path is not None else typing.cast(typing.BinaryIO, io.BytesIO(self._data))
 
-        Examples
-        --------
-        Given the API call ``GET /projects/foobar/modules``
-         
-        >>> event.query_path()
-        ('projects', 'foobar', 'modules')              
+
+    def save(self, path: str) -> None:
         """
-        
-        try: 
-            path = self._event["requestContext"]["path"].split('/')
-            path = path[1 if not len(path[0]) else 0 : -1 if len(path[-1]) == 0 else len(path)]
+        Writes the content of the file to the given path.
 
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
+        Parameters
+        ----------
+        path : str
+            The destination path.
+        """
 
-        return tuple(path)
+        if self._path is not None:
+            with open(self._path, 'rb') as src, open(path, 'wb') as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
 
+                    if not chunk:
+                        break
 
-    def query_string_parameters(self) -> typing.Dict[str, str]:
+                    dst.write(chunk)
+        else:
+            with open(path, 'wb') as dst:
+                dst.write(self._data)
+
+
+    def discard(self) -> None:
         """
-        Returns all URL parameters of the API call.
+        Deletes the temporary file the content was spilled to, if any.
 
-        Values of these parameters are returned as transmitted by AWS API Gateway.
-        An empty ``dict`` is returned if no parameters were submitted by the caller.
+        ``/tmp`` is preserved between the invocations of a warm AWS Lambda function: spilled files should be discarded once processed.
+        """
 
-        Returns
-        -------
-        dict
-            Keys: parameter names as ``str``. Values: corresponding raw values as ``str``.
+        if self._path is not None:
+            try:
+                os.remove(self._path)
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``queryStringParameters`` key is present in the event data. No parameters is supposed to be represented as ``'queryStringParameters': None``.       
+            except FileNotFoundError:
+                pass
 
-        Examples
-        --------
-        Given the API call ``GET '/reports?from_date=2020-01-01&to_date=2023-03-01'``
 
-        >>> event.query_string_parameters()
-        {'from_date': '2020-01-01', 'to_date': '2023-03-01'}     
-        """
-        
-        try:
-            params = self._event["queryStringParameters"]
+def _parse_header_parameters(header_value: str) -> typing.Tuple[str, typing.Dict[str, str]]:
+    # Parses single-valued headers such as Content-Type or Content-Disposition: value; name=token; name="quoted string".
+    # Unlike parse_header_preferences(), commas and q parameters have no special meaning and nothing is cached: values are per request.
+    parts = _split_unquoted(header_value, ';')
+    parameters: typing.Dict[str, str] = {}
+    extendedParameters: typing.Dict[str, str] = {}
 
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
+    for part in parts[1:]:
+        name, separator, parameterValue = part.partition('=')
+        name = name.strip().lower()
+        parameterValue = parameterValue.strip()
 
-        return params or {}
+        if not separator or not name:
+            continue
 
+        if name.endswith('*'):
+            # RFC 5987 extended value, such as filename*=UTF-8''na%C3%AFve.txt, which takes precedence over the plain one.
+            charset, _, rest = parameterValue.partition("'")
+            _, _, encoded = rest.partition("'")
 
-    def query_string(self) -> str:
-        """
-        Convenience function that returns the HTTP method of the call followed by the URL of the call.
+            try:
+                extendedParameters[name[:-1]] = urllib.parse.unquote(encoded, encoding = charset or 'utf-8', errors = 'strict')
 
-        Returns
-        -------
-        str
-            The query string of the API call, including URL parameters if any.
+            except (LookupError, UnicodeDecodeError):
+                pass
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If at least one of the ``httpMethod``, ``query_domain``, ``query_path`` or ``query_string_parameters`` keys is not present in the event data.     
+        else:
+            parameters[name] = _unquote(parameterValue)
 
-        Examples
-        --------
-        Given the API call ``curl -X GET 'https://api.example.com/billing/reports?from_date=2020-01-01&to_date=2023-03-01'``
+    return parts[0].strip().lower(), { **parameters, **extendedParameters }
 
-        >>> event.query_string()
-        'GET https://api.example.com/billing/reports?from_date=2020-01-01&to_date=2023-03-01'                  
-        """
-        
-        paramsString = '&'.join(f'{key}={value}' for key, value in self.query_string_parameters().items())
 
-        return f'{self.http_method()} https://{self.query_domain_name()}/{"/".join(self.query_path())}{"?" if len(paramsString) else ""}{paramsString}'
+def _parse_part_headers(raw: bytes) -> typing.Dict[str, str]:
+    headers = {}
 
+    for line in raw.decode('utf-8', errors = 'replace').split('\r\n'):
+        name, separator, value = line.partition(':')
 
-    def query_payload(self) -> typing.Dict[str, typing.Any]:
-        """
-        Returns the data sent as the body of the API call.
+        if separator:
+            headers[name.strip().lower()] = value.strip()
 
-        Data is expected to be valid JSON.
+    return headers
 
-        Returns
-        -------
-        dict
-            Data sent as the body of the API call loaded as a ``dict``, ``None`` if body is null.
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``body`` key is present in the event data.    
-        MalformedPayloadError
-            If the submitted data is not valid JSON.        
+def _parse_multipart(
+        body: bytes,
+        boundary: str,
+        spill_threshold: typing.Optional[int]
+    ) -> typing.Tuple[typing.Dict[str, typing.List[str]], typing.Dict[str, typing.List[UploadedFile]]]:
 
-        Examples
-        --------
-        >>> event.query_payload()
-        {'some_key': 5, 'some_other_key': [1, 2, 3, 4, 5]}            
-        """
+    view = memoryview(body)
+    delimiter = b'--' + boundary.encode('latin-1')
+    fields: typing.Dict[str, typing.List[str]] = {}
+    files: typing.Dict[str, typing.List[UploadedFile]] = {}
 
-        try:
-            body = self._event['body']
-            ret = None if body is None else json.loads(body)
-    
-        except KeyError as err:
-            LambdaEvent._raiseCannotReachError(str(err))
-    
-        except (TypeError, json.JSONDecodeError) as err:
-            raise MalformedPayloadError(f"Payload is malformed. JSON cannot be decoded: {str(err)}.")
+    position = body.find(delimiter)
 
-        return ret
-    
+    if position < 0:
+        raise MalformedPayloadError("Payload is malformed. Multipart boundary cannot be found.")
 
-    def authorizer_claims(self) -> typing.Optional[typing.Dict[str, typing.Any]]:
-        """
-        Returns the authenticated user details or ``None`` if this is an anonymous API call.
+    # Parts are located by scanning the body in place: their contents are slices of it, not copies.
+    while True:
+        position += len(delimiter)
 
-        Returns
-        -------
-        dict
-            User details or ``None`` if this call is anonymous.
+        if body.startswith(b'--', position):
+            break
 
-        Raises
-        ------
-        awsmate.lambdafunction.AwsEventSpecificationError
-            If no ``requestContext`` key is present in the event data, or if claims is not ``None`` and not a ``dict``.  
+        headersStart = body.find(b'\r\n', position) + 2
+        headersEnd = body.find(b'\r\n\r\n', headersStart - 2)
+        contentEnd = body.find(b'\r\n' + delimiter, headersEnd + 4)
 
-        Examples
-        --------
-        >>> event.authorizer_claims()
-        {'cognito:username': '192837645', 'email': 'jane@example.com', 'given_name': 'Jane', 'family_name': 'Doe'}
-        """
+        if headersStart < 2 or headersEnd < 0 or contentEnd < 0:
+            raise MalformedPayloadError("Payload is malformed. Multipart body is truncated.")
 
-        try:
-            claims = self._event['requestContext']['authorizer']['claims']
-    
-        except KeyError as err:
-            if str(err) == "'requestContext'":
-                LambdaEvent._raiseCannotReachError(str(err))
+        headers = _parse_part_headers(body[headersStart:headersEnd])
+        content = view[headersEnd + 4:contentEnd]
+        position = contentEnd + 2
+
+        _, parameters = _parse_header_parameters(headers.get('content-disposition', ''))
+
+        if 'name' not in parameters:
+            raise MalformedPayloadError("Payload is malformed. Multipart part has no name.")
+
+        if 'filename' in parameters:
+            if spill_threshold is not None and content.nbytes > spill_threshold:
+                descriptor, path = tempfile.mkstemp(prefix = 'awsmate-')
+
+                with os.fdopen(descriptor, 'wb') as f:
+                    f.write(content)
+
+                upload = UploadedFile(parameters['name'], parameters['filename'], headers.get('content-type', 'application/octet-stream'), headers, path = path)
             else:
-                claims = None
+                upload = UploadedFile(parameters['name'], parameters['filename'], headers.get('content-type', 'application/octet-stream'), headers, data = content)
 
-        if claims and not isinstance(claims, dict):
-            raise AwsEventSpecificationError(f"Claims should be a dict, not a {type(claims)}.")
+            files.setdefault(parameters['name'], []).append(upload)
+        else:
+            charset = _parse_header_parameters(headers.get('content-type', 'text/plain'))[1].get('charset', 'utf-8')
 
-        return claims
-    
+            try:
+                fields.setdefault(parameters['name'], []).append(str(content, charset))
 
-class HttpError(RuntimeError):
+            except (LookupError, UnicodeDecodeError) as err:
+                raise MalformedPayloadError(f"Payload is malformed. Multipart field cannot be decoded: {str(err)}.")
+
+    return fields, files
+
+
+class QueryIndex():
     """
-    HTTP error response: status code and message.
+    Parsed URL parameters of an API call, as returned by :meth:`LambdaProxyEvent.query_parameters`.
+
+    Typed getters return ``default`` if the parameter is absent and raise :class:`HttpBadRequestError` if it cannot be converted,
+    so that their errors can be returned as is to the caller. Should a parameter be submitted several times, its last value is used.
 
     Examples
     --------
-    >>> raise HttpError(404, 'Not Found')    
+    Given the API call ``GET '/reports?from_date=2020-01-01&limit=50&format=csv&tag=a&tag=b'``
+
+    >>> params = event.query_parameters()
+    >>> params.get_date('from_date'), params.get_int('limit', 100), params.get_enum('format', ('csv', 'json')), params.get_all('tag')
+    (datetime.date(2020, 1, 1), 50, 'csv', ['a', 'b'])
     """
 
-    def __init__(self, status: int, msg: str) -> None:
+    _booleans = {
+        'true': True, '1': True, 'yes': True, 'on': True,
+        'false': False, '0': False, 'no': False, 'off': False
+    }
+
+    def __init__(self, parameters: typing.Dict[str, typing.List[str]]) -> None:
         """
         Parameters
         ----------
-        status : int
-            The HTTP response status code. This value is taken as-is, there is no validation routine.
-        msg : str
-            The explanatory message.
+        parameters : dict
+            Keys: parameter names as ``str``. Values: corresponding values as ``list`` of ``str``, in the order they were submitted.
         """
 
-        super().__init__(msg)
+        self._parameters = parameters
 
-        self._status = status
 
+    def __contains__(self, name: object) -> bool:
+        return name in self._parameters
 
-    @property
-    def status(self) -> int:
+
+    def names(self) -> typing.Tuple[str, ...]:
         """
-        int : HTTP response status code. 
+        Returns the names of the submitted parameters.
 
-        Examples
-        --------
-        Given ``e = HttpError(403, 'Forbidden')``
+        Returns
+        -------
+        tuple
+            The parameter names as ``str``.
+        """
 
-        >>> e.status
-        403
+        return tuple(self._parameters.keys())
+
+
+    def get(self, name: str, default: typing.Optional[str] = None, *, required: bool = False) -> typing.Optional[str]:
         """
-        
-        return self._status
+        Returns the raw value of a parameter.
 
+        Parameters
+        ----------
+        name : str
+            The parameter name.
+        default : str
+            Optional value to return if the parameter is absent. ``None`` if omitted.
+        required : bool
+            Optional flag that makes an absent parameter raise. ``False`` if omitted.
 
-class HttpClientError(HttpError):
-    """
-    Client HTTP error response.
+        Returns
+        -------
+        str
+            The last submitted value of the parameter, or ``default``.
 
-    Examples
-    --------
-    >>> raise HttpClientError(404, 'Not Found')    
-    """
-    pass
+        Raises
+        ------
+        HttpBadRequestError
+            If the parameter is required but absent.
+        """
 
+        values = self._parameters.get(name)
 
-class HttpServerError(HttpError):
-    """
-    Server-side HTTP error response.
+        if not values:
+            if required:
+                raise HttpBadRequestError(f"Missing parameter: {name}.")
 
-    Examples
-    --------
-    >>> raise HttpServerError(503, 'Service Unavailable')    
-    """
-    pass
+            return default
 
+        return values[-1]
 
-class HttpBadRequestError(HttpClientError):
-    """
-    Error that represents a HTTP response status 400 "Bad request".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def get_all(self, name: str) -> typing.List[str]:
         """
+        Returns all values of a parameter.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        name : str
+            The parameter name.
 
-        Examples
-        --------
-        >>> raise HttpBadRequestError()  
+        Returns
+        -------
+        list
+            The values of the parameter as ``str``, in the order they were submitted. Empty if the parameter is absent.
         """
-        
-        httpStatus = HTTPStatus.BAD_REQUEST
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)
 
+        return list(self._parameters.get(name, ()))
 
-class HttpUnauthorizedError(HttpClientError):
-    """
-    Error that represents a HTTP response status 401 "Unauthorized".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def get_int(self, name: str, default: typing.Optional[int] = None, *, required: bool = False) -> typing.Optional[int]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the value of a parameter as an ``int``.
 
-        Examples
-        --------
-        >>> raise HttpUnauthorizedError()  
+        See :meth:`get` for the parameters.
+
+        Raises
+        ------
+        HttpBadRequestError
+            If the parameter is required but absent, or is not an integer.
         """
-        
-        httpStatus = HTTPStatus.UNAUTHORIZED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)
 
+        return self._convert(name, default, required, int, 'an integer')
 
-class HttpPaymentRequiredError(HttpClientError):
-    """
-    Error that represents a HTTP response status 402 "Payment required".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def get_float(self, name: str, default: typing.Optional[float] = None, *, required: bool = False) -> typing.Optional[float]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the value of a parameter as a ``float``.
 
-        Examples
-        --------
-        >>> raise HttpPaymentRequiredError()       
+        See :meth:`get` for the parameters.
+
+        Raises
+        ------
+        HttpBadRequestError
+            If the parameter is required but absent, or is not a finite number.
         """
-        
-        httpStatus = HTTPStatus.PAYMENT_REQUIRED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)        
 
+        def toFloat(value: str) -> float:
+            ret = float(value)
 
-class HttpForbiddenError(HttpClientError):
-    """
-    Error that represents a HTTP response status 403 "Forbidden".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+            if ret != ret or ret in (float('inf'), float('-inf')):
+                raise ValueError(value)
+
+            return ret
+
+        return self._convert(name, default, required, toFloat, 'a number')
+
+
+    def get_bool(self, name: str, default: typing.Optional[bool] = None, *, required: bool = False) -> typing.Optional[bool]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the value of a parameter as a ``bool``.
 
-        Examples
-        --------
-        >>> raise HttpForbiddenError()             
+        ``true``, ``1``, ``yes`` and ``on`` are ``True``, ``false``, ``0``, ``no`` and ``off`` are ``False``, whatever their case.
+        See :meth:`get` for the parameters.
+
+        Raises
+        ------
+        HttpBadRequestError
+            If the parameter is required but absent, or is not a boolean.
         """
-        
-        httpStatus = HTTPStatus.FORBIDDEN
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)         
 
+        return self._convert(name, default, required, lambda value: QueryIndex._booleans[value.lower()], 'a boolean')
 
-class HttpNotFoundError(HttpClientError):
-    """
-    Error that represents a HTTP response status 404 "Not found".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def get_date(self, name: str, default: typing.Optional[datetime.date] = None, *, required: bool = False) -> typing.Optional[datetime.date]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the value of a parameter as a ``datetime.date``.
 
-        Examples
-        --------
-        >>> raise HttpNotFoundError()             
+        The value is expected to be an ISO 8601 date: ``YYYY-MM-DD``. See :meth:`get` for the parameters.
+
+        Raises
+        ------
+        HttpBadRequestError
+            If the parameter is required but absent, or is not an ISO 8601 date.
         """
-        
-        httpStatus = HTTPStatus.NOT_FOUND
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        return self._convert(name, default, required, datetime.date.fromisoformat, 'an ISO 8601 date')
 
-class HttpMethodNotAllowedError(HttpClientError):
-    """
-    Error that represents a HTTP response status 405 "Method not allowed".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def get_enum(
+            self,
+            name: str,
+            choices: typing.Union[typing.Type[enum.Enum], typing.Iterable[str]],
+            default: typing.Any = None, *,
+            required: bool = False
+        ) -> typing.Any:
         """
+        Returns the value of a parameter as one of the given choices.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        name : str
+            The parameter name.
+        choices : enum.Enum subclass or iterable
+            The ``Enum`` whose members are matched by value then by name, or the accepted ``str`` values.
+        default : any
+            Optional value to return if the parameter is absent. ``None`` if omitted.
+        required : bool
+            Optional flag that makes an absent parameter raise. ``False`` if omitted.
 
-        Examples
-        --------
-        >>> raise HttpMethodNotAllowedError()                
-        """
-        
-        httpStatus = HTTPStatus.METHOD_NOT_ALLOWED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)          
+        Returns
+        -------
+        enum.Enum or str
+            The matching member of ``choices``, or ``default``.
+
+        Raises
+        ------
+        HttpBadRequestError
+            If the parameter is required but absent, or is not one of the choices.
+        """
 
+        if isinstance(choices, type) and issubclass(choices, enum.Enum):
+            members = { str(m.value): m for m in choices }
+            members.update({ m.name: m for m in choices if m.name not in members })
+        else:
+            members = { c: c for c in choices }
 
-class HttpNotAcceptableError(HttpClientError):
+        return self._convert(name, default, required, members.__getitem__, f'one of {", ".join(members.keys())}')
+
+
+    def _convert(self, name: str, default: typing.Any, required: bool, converter: typing.Callable[[str], typing.Any], expected: str) -> typing.Any:
+        value = self.get(name, required = required)
+
+        if value is None:
+            return default
+
+        try:
+            return converter(value)
+
+        except (KeyError, ValueError):
+            raise HttpBadRequestError(f"Invalid value for parameter {name}: expected {expected}.")
+
+
+class LambdaProxyEvent(LambdaEvent):
     """
-    Error that represents a HTTP response status 406 "Not acceptable".
+    Mapping of the input event received by an AWS Lambda function triggered by AWS API Gateway and integrated 
+    in `AWS_PROXY <https://docs.aws.amazon.com/apigateway/latest/developerguide/api-gateway-set-up-simple-proxy.html>`_ mode.
     """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
-        """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
 
-        Examples
-        --------
-        >>> raise HttpNotAcceptableError()            
-        """
-        
-        httpStatus = HTTPStatus.NOT_ACCEPTABLE
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
-        
+    max_payload_size: typing.Optional[int] = 6 * 1024 * 1024
+    """
+    int : Default maximum size of the decoded body of the API calls, in bytes. ``None`` means no limit. 
+    """
 
-class HttpProxyAuthenticationRequiredError(HttpClientError):
+    file_spill_threshold: typing.Optional[int] = 1024 * 1024
     """
-    Error that represents a HTTP response status 407 "Proxy authentication required".
+    int : Size in bytes above which the files submitted as ``multipart/form-data`` are spilled to a temporary file rather than held in memory. ``None`` means never.
     """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def __init__(self, event_object: dict, *, max_payload_size: typing.Optional[int] = ...) -> None:
         """
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        event_object : dict
+            The parameter ``event`` received by the AWS Lambda function handler.
+        max_payload_size : int
+            Optional maximum size of the decoded body in bytes, ``None`` meaning no limit. :attr:`max_payload_size` is used if omitted.
 
+        Raises
+        ------
+        TypeError
+            If ``event_object`` is not a ``dict``.  
+                    
         Examples
         --------
-        >>> raise HttpProxyAuthenticationRequiredError()                
+        >>> def lambda_handler(raw_event, context):
+        >>>     from awsmate.apigateway import LambdaProxyEvent
+        >>>     event = LambdaProxyEvent(raw_event)                
         """
         
-        httpStatus = HTTPStatus.PROXY_AUTHENTICATION_REQUIRED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+        super().__init__(event_object)
 
+        if max_payload_size is not ...:
+            self.max_payload_size = max_payload_size
 
-class HttpRequestTimeoutError(HttpClientError):
-    """
-    Error that represents a HTTP response status 408 "Request timeout".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+        self._headers: typing.Optional[typing.Dict[str, str]] = None
+        self._payload: typing.Any = ...
+        self._query: typing.Optional[QueryIndex] = None
+        self._queryString: typing.Optional[str] = None
+        self._multiValueHeaders: typing.Optional[typing.Dict[str, typing.List[str]]] = None
+        self._form: typing.Optional[typing.Tuple[typing.Dict[str, typing.List[str]], typing.Dict[str, typing.List[UploadedFile]]]] = None
+        self._negotiation: typing.Optional[typing.Tuple[typing.Any, typing.Any, NegotiationResult]] = None
+
+
+    def source_ip(self) -> typing.Union[ipaddress.IPv4Address, ipaddress.IPv6Address]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the source IP address of the API call.
+
+        Returns
+        -------
+        ipaddress.IPv4Address or ipaddress.IPv6Address
+            The IP address the API call comes from.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``requestContext.identity.sourceIp`` key is present in the event data or if the IP address is invalid.            
 
         Examples
         --------
-        >>> raise HttpRequestTimeoutError()            
+        >>> event.source_ip()
+        IPv4Address('93.184.216.34')
         """
+
+        try: 
+            sourceIp = ipaddress.ip_address(self._event["requestContext"]["identity"]["sourceIp"])
+
+        except KeyError as err:
+            LambdaEvent._raiseCannotReachError(str(err))
+
+        except ValueError as err:
+            raise AwsEventSpecificationError(f'Invalid IP address: {err}')
+
+        return sourceIp      
         
-        httpStatus = HTTPStatus.REQUEST_TIMEOUT
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)          
-        
-        
-class HttpConflictError(HttpClientError):
-    """
-    Error that represents a HTTP response status 409 "Conflict".
-    """
     
-    def __init__(self, msg: typing.Optional[str] = None):
+    def http_headers(self) -> typing.Dict[str, str]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns all HTTP headers of the API call.
+
+        Header names are always returned in lower case. Values of these headers are returned unparsed, as submitted.
+
+        The returned ``dict`` is a copy of the header index of the event: prefer :meth:`header` and :meth:`has_header` to look up
+        a few headers.
+
+        Returns
+        -------
+        dict
+            Keys: header names as ``str``. Values: corresponding raw values as ``str``.
+            
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``headers`` key is present in the event data.
 
         Examples
         --------
-        >>> raise HttpConflictError()                          
+        >>> event.http_headers()
+        {'accept': 'application/json', 'accept-encoding': 'gzip,identity'}                
         """
         
-        httpStatus = HTTPStatus.CONFLICT
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)    
+        return dict(self._header_index())
 
 
-class HttpGoneError(HttpClientError):
-    """
-    Error that represents a HTTP response status 410 "Gone".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+    def _header_index(self) -> typing.Dict[str, str]:
+        if self._headers is None:
+            try: 
+                headers = self._event["headers"]
+
+            except KeyError as err:
+                LambdaEvent._raiseCannotReachError(str(err))
+
+            self._headers = {} if headers is None else { k.lower(): v for k, v in headers.items() }
+
+        return self._headers
+
+
+    def header(self, name: str, default: typing.Optional[str] = None) -> typing.Optional[str]:
         """
+        Returns the raw value of the given HTTP header of the API call.
+
+        Header names are case-insensitive. The header index of the event is built once, on first use: lookups do not copy anything.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        name : str
+            The header name.
+        default : str
+            Optional value to return if the header was not submitted by the caller. ``None`` if omitted.
+
+        Returns
+        -------
+        str
+            The value of the header as submitted, or ``default`` if the header was not submitted.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``headers`` key is present in the event data.
 
         Examples
         --------
-        >>> raise HttpGoneError()                          
+        >>> event.header('Content-Type')
+        'application/json'
         """
-        
-        httpStatus = HTTPStatus.GONE
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)            
 
+        return self._header_index().get(name.lower(), default)
 
-class HttpLengthRequiredError(HttpClientError):
-    """
-    Error that represents a HTTP response status 411 "Length required".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def has_header(self, name: str) -> bool:
         """
+        Returns whether the given HTTP header was submitted by the caller.
+
+        Header names are case-insensitive.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        name : str
+            The header name.
+
+        Returns
+        -------
+        bool
+            Whether the header is present.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``headers`` key is present in the event data.
 
         Examples
         --------
-        >>> raise HttpLengthRequiredError()                     
+        >>> event.has_header('Authorization')
+        True
         """
-        
-        httpStatus = HTTPStatus.LENGTH_REQUIRED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)   
 
+        return name.lower() in self._header_index()
 
-class HttpPreconditionFailedError(HttpClientError):
-    """
-    Error that represents a HTTP response status 412 "Precondition failed".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def http_multi_value_headers(self) -> typing.Dict[str, typing.List[str]]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns all HTTP headers of the API call, including the values of the headers submitted several times.
+
+        Header names are always returned in lower case. Values are taken from ``multiValueHeaders`` if present in the event data,
+        from ``headers`` otherwise. They are returned unparsed, as submitted. The index is built once per event: the returned ``dict`` is a copy of it.
+
+        Returns
+        -------
+        dict
+            Keys: header names as ``str``. Values: corresponding raw values as ``list`` of ``str``, in the order they were submitted.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If neither ``multiValueHeaders`` nor ``headers`` key is present in the event data.
 
         Examples
         --------
-        >>> raise HttpPreconditionFailedError()                           
+        >>> event.http_multi_value_headers()
+        {'accept': ['application/json'], 'x-forwarded-for': ['93.184.216.34', '10.0.0.1']}
         """
-        
-        httpStatus = HTTPStatus.PRECONDITION_FAILED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
 
+        if self._multiValueHeaders is None:
+            multiValueHeaders = self._event.get('multiValueHeaders')
 
-class HttpRequestEntityTooLargeError(HttpClientError):
-    """
-    Error that represents a HTTP response status 413 "Request entity too large".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+            if multiValueHeaders is None:
+                self._multiValueHeaders = { name: [ value ] for name, value in self._header_index().items() }
+            else:
+                index: typing.Dict[str, typing.List[str]] = {}
+
+                for name, values in multiValueHeaders.items():
+                    index.setdefault(name.lower(), []).extend(values or ())
+
+                self._multiValueHeaders = index
+
+        return { name: list(values) for name, values in self._multiValueHeaders.items() }
+
+
+    def http_method(self) -> str:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the HTTP method of the API call.
+
+        The method verb is always returned in upper case. GET, PUT, POST, PATCH, DELETE are expected, but no verification is performed.
+
+        Returns
+        -------
+        str
+            HTTP method of the API call.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``requestContext.httpMethod`` key is present in the event data.            
 
         Examples
         --------
-        >>> raise HttpRequestEntityTooLargeError()                          
+        >>> event.http_method()
+        'GET'
         """
-        
-        httpStatus = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
 
-class HttpRequestUriTooLongError(HttpClientError):
-    """
-    Error that represents a HTTP response status 414 "Request URI too long".
-    """
+        try: 
+            method = self._event["requestContext"]["httpMethod"]
+
+        except KeyError as err:
+            LambdaEvent._raiseCannotReachError(str(err))
+
+        return method.upper()
     
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def http_protocol(self) -> str:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the HTTP protocol of the API call.
+
+        The protocol is always returned in upper case.
+
+        Returns
+        -------
+        str
+            HTTP protocol of the API call.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``requestContext.protocol`` key is present in the event data.            
 
         Examples
         --------
-        >>> raise HttpRequestUriTooLongError()                       
+        >>> event.http_protocol()
+        'HTTP/1.1'
         """
-        
-        httpStatus = HTTPStatus.REQUEST_URI_TOO_LONG
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
 
-class HttpUnsupportedMediaTypeError(HttpClientError):
-    """
-    Error that represents a HTTP response status 415 "Unsupported media type".
-    """
+        try: 
+            protocol = self._event["requestContext"]["protocol"]
+
+        except KeyError as err:
+            LambdaEvent._raiseCannotReachError(str(err))
+
+        return protocol.upper()    
     
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def http_user_agent(self) -> str:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the HTTP user-agent of the API call.
+
+        The user-agent is returned as transmitted by AWS API Gateway.
+
+        Returns
+        -------
+        str
+            HTTP user-agent of the API call.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``requestContext.identity.userAgent`` key is present in the event data.            
 
         Examples
         --------
-        >>> raise HttpUnsupportedMediaTypeError()                        
+        >>> event.http_user_agent()
+        'curl/7.83.1'
         """
-        
-        httpStatus = HTTPStatus.UNSUPPORTED_MEDIA_TYPE
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
 
-class HttpRequestRangeNotSatisfiableError(HttpClientError):
-    """
-    Error that represents a HTTP response status 416 "Request range not satisfiable".
-    """
+        try: 
+            userAgent = self._event["requestContext"]["identity"]["userAgent"]
+
+        except KeyError as err:
+            LambdaEvent._raiseCannotReachError(str(err))
+
+        return userAgent        
     
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def header_sorted_preferences(self, header: str) -> typing.Tuple[str, ...]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns all values assigned to the given header, sorted by decreasing preferences.
+
+        Preferences are determined according to the weighted quality value syntax (see :func:`parse_header_preferences`).
+        Values weighted ``q=0``, which means "not acceptable", are excluded. Parameters of the values are not returned.
+        An empty ``tuple`` is returned if the given header is not found among those submitted by the caller.
 
+        Returns
+        -------
+        tuple
+            Header values as ``str``, in decreasing preference order.
+            
         Examples
         --------
-        >>> raise HttpRequestRangeNotSatisfiableError()                          
+        Given the header ``Accept-Encoding: gzip;q=0.2,deflate,identity;q=0.9``: 
+
+        >>> event.header_sorted_preferences('Accept-Encoding')
+        ('deflate', 'identity', 'gzip')
         """
         
-        httpStatus = HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
+        value = self.header(header)
 
-class HttpExpectationFailedError(HttpClientError):
-    """
-    Error that represents a HTTP response status 417 "Expectation failed".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+        return () if value is None else _acceptable_values(value)
+
+
+    def query_domain_name(self) -> str:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns the domain name of the API call.
+
+        The domain name is always returned in lower case.
+
+        Returns
+        -------
+        str
+            Domain name of the API call.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``requestContext.domainName`` key is present in the event data.            
 
         Examples
         --------
-        >>> raise HttpExpectationFailedError()                         
+        >>> event.query_domain_name()
+        'example.com'
+        """
+
+        try: 
+            domainName = self._event["requestContext"]["domainName"]
+
+        except KeyError as err:
+            LambdaEvent._raiseCannotReachError(str(err))
+
+        return domainName.lower()   
+        
+        
+    def query_path(self) -> typing.Tuple[str, ...]:
+        """
+        Returns the path of the API call, broken down into elements.
+
+        Returns
+        -------
+        tuple
+            Path elements as ``str``.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``requestContext.path`` key is present in the event data.      
+
+        Examples
+        --------
+        Given the API call ``GET /projects/foobar/modules``
+         
+        >>> event.query_path()
+        ('projects', 'foobar', 'modules')              
         """
         
-        httpStatus = HTTPStatus.EXPECTATION_FAILED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        try: 
+            path = self._event["requestContext"]["path"].split('/')
+            path = path[1 if not len(path[0]) else 0 : -1 if len(path[-1]) == 0 else len(path)]
+
+        except KeyError as err:
+            LambdaEvent._raiseCannotReachError(str(err))
+
+        return tuple(path)
+
+
+    def query_string_parameters(self) -> typing.Dict[str, str]:
+        """
+        Returns all URL parameters of the API call.
+
+        Values of these parameters are returned as transmitted by AWS API Gateway.
+        An empty ``dict`` is returned if no parameters were submitted by the caller.
+
+        Returns
+        -------
+        dict
+            Keys: parameter names as ``str``. Values: corresponding raw values as ``str``.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``queryStringParameters`` key is present in the event data. No parameters is supposed to be represented as ``'queryStringParameters': None``.       
+
+        Examples
+        --------
+        Given the API call ``GET '/reports?from_date=2020-01-01&to_date=2023-03-01'``
+
+        >>> event.query_string_parameters()
+        {'from_date': '2020-01-01', 'to_date': '2023-03-01'}     
+        """
         
+        try:
+            params = self._event["queryStringParameters"]
 
-class HttpMisdirectedRequestError(HttpClientError):
-    """
-    Error that represents a HTTP response status 421 "Misdirected request".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+        except KeyError as err:
+            LambdaEvent._raiseCannotReachError(str(err))
+
+        return params or {}
+
+
+    def query_string_multi_value_parameters(self) -> typing.Dict[str, typing.List[str]]:
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        Returns all URL parameters of the API call, including the values of the parameters submitted several times.
+
+        Values are taken from ``multiValueQueryStringParameters`` if present in the event data, from ``queryStringParameters`` otherwise.
+        An empty ``dict`` is returned if no parameters were submitted by the caller.
+
+        Returns
+        -------
+        dict
+            Keys: parameter names as ``str``. Values: corresponding raw values as ``list`` of ``str``, in the order they were submitted.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If neither ``multiValueQueryStringParameters`` nor ``queryStringParameters`` key is present in the event data.
+
+        Examples
+        --------
+        Given the API call ``GET '/reports?tag=a&tag=b&limit=50'``
+
+        >>> event.query_string_multi_value_parameters()
+        {'tag': ['a', 'b'], 'limit': ['50']}
+        """
+
+        return { name: self.query_parameters().get_all(name) for name in self.query_parameters().names() }
+
+
+    def query_parameters(self) -> QueryIndex:
+        """
+        Returns the URL parameters of the API call as an index providing typed getters.
+
+        The index is built once per event from the same data as :meth:`query_string_multi_value_parameters`.
+
+        Returns
+        -------
+        QueryIndex
+            The parsed URL parameters.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If neither ``multiValueQueryStringParameters`` nor ``queryStringParameters`` key is present in the event data.
+
+        Examples
+        --------
+        Given the API call ``GET '/reports?limit=50'``
+
+        >>> event.query_parameters().get_int('limit', 100)
+        50
+        """
+
+        if self._query is None:
+            multiValueParams = self._event.get('multiValueQueryStringParameters')
+
+            if multiValueParams is None:
+                self._query = QueryIndex({ name: [ value ] for name, value in self.query_string_parameters().items() })
+            else:
+                self._query = QueryIndex({ name: list(values or ()) for name, values in multiValueParams.items() })
+
+        return self._query
+
+
+    def query_string(self) -> str:
+        """
+        Convenience function that returns the HTTP method of the call followed by the URL of the call.
+
+        The path and the URL parameters are percent-encoded. The result is built once per event.
+
+        Returns
+        -------
+        str
+            The query string of the API call, including URL parameters if any.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If at least one of the ``httpMethod``, ``query_domain``, ``query_path`` or ``query_string_parameters`` keys is not present in the event data.     
+
+        Examples
+        --------
+        Given the API call ``curl -X GET 'https://api.example.com/billing/reports?from_date=2020-01-01&to_date=2023-03-01'``
+
+        >>> event.query_string()
+        'GET https://api.example.com/billing/reports?from_date=2020-01-01&to_date=2023-03-01'                  
+        """
+
+        if self._queryString is None:
+            params = self.query_parameters()
+            paramsString = urllib.parse.urlencode([ (name, value) for name in params.names() for value in params.get_all(name) ], quote_via = urllib.parse.quote)
+            path = '/'.join(urllib.parse.quote(segment, safe = "!$&'()*+,;=:@") for segment in self.query_path())
+
+            self._queryString = f'{self.http_method()} https://{self.query_domain_name()}/{path}{"?" if len(paramsString) else ""}{paramsString}'
+
+        return self._queryString
+
+
+    def query_payload(self) -> typing.Dict[str, typing.Any]:
+        """
+        Returns the data sent as the body of the API call.
+
+        Data is expected to be valid JSON. Base64 encoded bodies are decoded transparently, as well as base64 encoded bodies compressed
+        according to a ``gzip`` or ``deflate`` ``Content-Encoding`` header. Data is decoded once per event: subsequent calls return the very same object.
+
+        Returns
+        -------
+        dict
+            Data sent as the body of the API call loaded as a ``dict``, ``None`` if body is null.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``body`` key is present in the event data.    
+        MalformedPayloadError
+            If the submitted data is not valid JSON, not valid base64 or not validly compressed.        
+        HttpRequestEntityTooLargeError
+            If the decoded body exceeds :attr:`max_payload_size`. This is checked before any parsing, and during decompression.
+        HttpUnsupportedMediaTypeError
+            If the body is compressed according to an unsupported ``Content-Encoding``.
+
+        Examples
+        --------
+        >>> event.query_payload()
+        {'some_key': 5, 'some_other_key': [1, 2, 3, 4, 5]}            
+        """
+
+        if self._payload is ...:
+            body = self._decoded_body()
+
+            try:
+                self._payload = None if body is None else json.loads(body)
+        
+            except (TypeError, ValueError) as err:
+                raise MalformedPayloadError(f"Payload is malformed. JSON cannot be decoded: {str(err)}.")
+
+        return self._payload
+    
+
+    def form(self) -> typing.Dict[str, typing.List[str]]:
+        """
+        Returns the form fields sent as the body of the API call.
+
+        Data is expected to be ``application/x-www-form-urlencoded`` or ``multipart/form-data``, possibly base64 encoded and compressed
+        as for :meth:`query_payload`. Files sent as ``multipart/form-data`` are returned by :meth:`files`. The body is parsed once per event.
+
+        Returns
+        -------
+        dict
+            Keys: field names as ``str``. Values: field values as ``list`` of ``str``, in the order they were submitted. Empty if body is null.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``body`` or ``headers`` key is present in the event data.
+        HttpUnsupportedMediaTypeError
+            If the ``Content-Type`` of the body is not a form.
+        MalformedPayloadError
+            If the submitted data cannot be parsed.
+        HttpRequestEntityTooLargeError
+            If the decoded body exceeds :attr:`max_payload_size`.
+
+        Examples
+        --------
+        >>> event.form()
+        {'first_name': ['Jane'], 'colors': ['red', 'blue']}
+        """
+
+        return self._parsed_form()[0]
+
+
+    def files(self) -> typing.Dict[str, typing.List[UploadedFile]]:
+        """
+        Returns the files sent as a ``multipart/form-data`` body of the API call.
+
+        Parts are sliced from the decoded body rather than copied. Files larger than :attr:`file_spill_threshold` are spilled to temporary files:
+        see :meth:`UploadedFile.discard`.
+
+        Returns
+        -------
+        dict
+            Keys: field names as ``str``. Values: the files as ``list`` of :class:`UploadedFile`. Empty if body is null or ``application/x-www-form-urlencoded``.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``body`` or ``headers`` key is present in the event data.
+        HttpUnsupportedMediaTypeError
+            If the ``Content-Type`` of the body is not a form.
+        MalformedPayloadError
+            If the submitted data cannot be parsed.
+        HttpRequestEntityTooLargeError
+            If the decoded body exceeds :attr:`max_payload_size`.
+
+        Examples
+        --------
+        >>> event.files()['picture'][0].filename
+        'cat.png'
+        """
+
+        return self._parsed_form()[1]
+
+
+    def _parsed_form(self) -> typing.Tuple[typing.Dict[str, typing.List[str]], typing.Dict[str, typing.List[UploadedFile]]]:
+        if self._form is None:
+            mediaType, contentTypeParameters = _parse_header_parameters(self.header('Content-Type', ''))
+
+            if mediaType not in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+                raise HttpUnsupportedMediaTypeError(f"Unsupported Content-Type: {mediaType or 'none'}. Expected a form.")
+
+            body = self._decoded_body()
+
+            if body is None:
+                self._form = ({}, {})
+
+            elif mediaType == 'multipart/form-data':
+                boundary = contentTypeParameters.get('boundary')
+
+                if not boundary:
+                    raise MalformedPayloadError("Payload is malformed. Multipart boundary is missing from the Content-Type header.")
+
+                self._form = _parse_multipart(body if isinstance(body, bytes) else body.encode('utf-8'), boundary, self.file_spill_threshold)
+
+            else:
+                try:
+                    text = body.decode('utf-8') if isinstance(body, bytes) else body
+
+                except UnicodeDecodeError as err:
+                    raise MalformedPayloadError(f"Payload is malformed. Form cannot be decoded: {str(err)}.")
+
+                self._form = (urllib.parse.parse_qs(text, keep_blank_values = True), {})
+
+        return self._form
+
+
+    def _decoded_body(self) -> typing.Optional[typing.Union[str, bytes]]:
+        try:
+            body = self._event['body']
+    
+        except KeyError as err:
+            LambdaEvent._raiseCannotReachError(str(err))
+
+        if body is None:
+            return None
+
+        # Events without headers are legitimate for bodies that are not compressed.
+        contentEncoding = self.header('Content-Encoding') if 'headers' in self._event else None
+        encodings = [ e.strip().lower() for e in (contentEncoding or '').split(',') ]
+        encodings = [ e for e in encodings if e and e != 'identity' ]
+
+        for encoding in encodings:
+            if encoding not in _content_decoders:
+                raise HttpUnsupportedMediaTypeError(f"Unsupported Content-Encoding: {encoding}.")
+
+        if self._event.get('isBase64Encoded') and isinstance(body, str):
+            # Decoded size is known from the encoded one: no need to spend the memory before rejecting too large bodies.
+            self._check_payload_size(len(body) * 3 // 4 - (len(body) - len(body.rstrip('='))))
+
+            try:
+                body = base64.b64decode(body)
+
+            except ValueError as err:
+                raise MalformedPayloadError(f"Payload is malformed. Base64 cannot be decoded: {str(err)}.")
+
+        elif isinstance(body, (str, bytes)):
+            self._check_payload_size(len(body))
+
+        if encodings:
+            if not isinstance(body, bytes):
+                raise MalformedPayloadError("Payload is malformed. Compressed payloads are expected to be base64 encoded.")
+
+            # Encodings are listed in the order they were applied.
+            for encoding in reversed(encodings):
+                body = self._decompress(body, _content_decoders[encoding])
+
+        return body
+
+
+    def _decompress(self, data: bytes, wbits: int) -> bytes:
+        members = []
+        size = 0
+
+        # Concatenated gzip members make a single payload: each of them is decompressed in turn, the size cap applying to the whole.
+        while True:
+            decompressor = zlib.decompressobj(wbits)
+
+            try:
+                # Output is capped so that decompression bombs are stopped before they spend the memory.
+                member = decompressor.decompress(data, 0 if self.max_payload_size is None else self.max_payload_size - size + 1)
+
+            except zlib.error as err:
+                raise MalformedPayloadError(f"Payload is malformed. Compressed data cannot be decoded: {str(err)}.")
+
+            size += len(member)
+
+            if self.max_payload_size is not None and (size > self.max_payload_size or decompressor.unconsumed_tail):
+                raise HttpRequestEntityTooLargeError(f"Payload exceeds the maximum size of {self.max_payload_size} bytes.")
+
+            if not decompressor.eof:
+                raise MalformedPayloadError("Payload is malformed. Compressed data cannot be decoded: data is truncated.")
+
+            members.append(member)
+
+            if not decompressor.unused_data:
+                break
+
+            data = decompressor.unused_data
+
+        return members[0] if len(members) == 1 else b''.join(members)
+
+
+    def _check_payload_size(self, size: int) -> None:
+        if self.max_payload_size is not None and size > self.max_payload_size:
+            raise HttpRequestEntityTooLargeError(f"Payload exceeds the maximum size of {self.max_payload_size} bytes.")
+
+
+    def authorizer_claims(self) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """
+        Returns the authenticated user details or ``None`` if this is an anonymous API call.
+
+        Returns
+        -------
+        dict
+            User details or ``None`` if this call is anonymous.
+
+        Raises
+        ------
+        awsmate.lambdafunction.AwsEventSpecificationError
+            If no ``requestContext`` key is present in the event data, or if claims is not ``None`` and not a ``dict``.  
+
+        Examples
+        --------
+        >>> event.authorizer_claims()
+        {'cognito:username': '192837645', 'email': 'jane@example.com', 'given_name': 'Jane', 'family_name': 'Doe'}
+        """
+
+        try:
+            claims = self._event['requestContext']['authorizer']['claims']
+    
+        except KeyError as err:
+            if str(err) == "'requestContext'":
+                LambdaEvent._raiseCannotReachError(str(err))
+            else:
+                claims = None
+
+        if claims and not isinstance(claims, dict):
+            raise AwsEventSpecificationError(f"Claims should be a dict, not a {type(claims)}.")
+
+        return claims
+    
+
+class HttpError(RuntimeError):
+    """
+    HTTP error response: status code and message.
+
+    Examples
+    --------
+    >>> raise HttpError(404, 'Not Found')    
+    """
+
+    def __init__(self, status: int, msg: str) -> None:
+        """
+        Parameters
+        ----------
+        status : int
+            The HTTP response status code. This value is taken as-is, there is no validation routine.
+        msg : str
+            The explanatory message.
+        """
+
+        super().__init__(msg)
+
+        self._status = status
+
+
+    @property
+    def status(self) -> int:
+        """
+        int : HTTP response status code. 
+
+        Examples
+        --------
+        Given ``e = HttpError(403, 'Forbidden')``
+
+        >>> e.status
+        403
+        """
+        
+        return self._status
+
+
+    @staticmethod
+    def for_status(status: int) -> typing.Type['HttpError']:
+        """
+        Returns the error class that represents the given HTTP status.
+
+        All 4XX and 5XX statuses known to ``http.HTTPStatus`` are supported. This module defines a class for each of them as of Python 3.13:
+        should later Python versions add statuses, their classes are generated once, at import time. They derive from :class:`HttpClientError`
+        or :class:`HttpServerError` as well, and are bound to this module under a name built from the status name, such as ``HttpSomeStatusError``
+        for ``HTTPStatus.SOME_STATUS``.
+
+        Parameters
+        ----------
+        status : int
+            The HTTP response status code.
+
+        Returns
+        -------
+        type
+            The error class. Its constructor takes an optional explanatory message.
+
+        Raises
+        ------
+        ValueError
+            If ``status`` is not a known HTTP error status.
+
+        Examples
+        --------
+        >>> HttpError.for_status(503)
+        <class 'awsmate.apigateway.HttpRServiceUnavailableError'>
+        >>> raise HttpError.for_status(upstream.status_code)('Upstream service failed.')
+        """
+
+        try:
+            return _http_errors[status]
+
+        except (KeyError, TypeError):
+            raise ValueError(f'Unknown HTTP error status: {status}.') from None
+
+
+class HttpClientError(HttpError):
+    """
+    Client HTTP error response.
+
+    Examples
+    --------
+    >>> raise HttpClientError(404, 'Not Found')    
+    """
+    pass
+
+
+class HttpServerError(HttpError):
+    """
+    Server-side HTTP error response.
+
+    Examples
+    --------
+    >>> raise HttpServerError(503, 'Service Unavailable')    
+    """
+    pass
+
+
+class HttpBadRequestError(HttpClientError):
+    """
+    Error that represents a HTTP response status 400 "Bad request".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpBadRequestError()  
+        """
+        
+        httpStatus = HTTPStatus.BAD_REQUEST
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)
+
+
+class HttpUnauthorizedError(HttpClientError):
+    """
+    Error that represents a HTTP response status 401 "Unauthorized".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpUnauthorizedError()  
+        """
+        
+        httpStatus = HTTPStatus.UNAUTHORIZED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)
+
+
+class HttpPaymentRequiredError(HttpClientError):
+    """
+    Error that represents a HTTP response status 402 "Payment required".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpPaymentRequiredError()       
+        """
+        
+        httpStatus = HTTPStatus.PAYMENT_REQUIRED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)        
+
+
+class HttpForbiddenError(HttpClientError):
+    """
+    Error that represents a HTTP response status 403 "Forbidden".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpForbiddenError()             
+        """
+        
+        httpStatus = HTTPStatus.FORBIDDEN
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)         
+
+
+class HttpNotFoundError(HttpClientError):
+    """
+    Error that represents a HTTP response status 404 "Not found".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpNotFoundError()             
+        """
+        
+        httpStatus = HTTPStatus.NOT_FOUND
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpMethodNotAllowedError(HttpClientError):
+    """
+    Error that represents a HTTP response status 405 "Method not allowed".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None, *, allowed_methods: typing.Optional[typing.Iterable[str]] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+        allowed_methods : iterable
+            Optional HTTP methods allowed for the requested resource, returned as the ``Allow`` header by :func:`build_http_client_error_response`.
+
+        Examples
+        --------
+        >>> raise HttpMethodNotAllowedError(allowed_methods=('GET', 'POST'))                
+        """
+        
+        httpStatus = HTTPStatus.METHOD_NOT_ALLOWED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)          
+
+        self.allowed_methods: typing.Tuple[str, ...] = tuple(allowed_methods) if allowed_methods else ()
+        """
+        tuple : The HTTP methods allowed for the requested resource, empty if unknown.
+        """
+
+
+class HttpNotAcceptableError(HttpClientError):
+    """
+    Error that represents a HTTP response status 406 "Not acceptable".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpNotAcceptableError()            
+        """
+        
+        httpStatus = HTTPStatus.NOT_ACCEPTABLE
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+        
+
+class HttpProxyAuthenticationRequiredError(HttpClientError):
+    """
+    Error that represents a HTTP response status 407 "Proxy authentication required".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpProxyAuthenticationRequiredError()                
+        """
+        
+        httpStatus = HTTPStatus.PROXY_AUTHENTICATION_REQUIRED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpRequestTimeoutError(HttpClientError):
+    """
+    Error that represents a HTTP response status 408 "Request timeout".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpRequestTimeoutError()            
+        """
+        
+        httpStatus = HTTPStatus.REQUEST_TIMEOUT
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)          
+        
+        
+class HttpConflictError(HttpClientError):
+    """
+    Error that represents a HTTP response status 409 "Conflict".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpConflictError()                          
+        """
+        
+        httpStatus = HTTPStatus.CONFLICT
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)    
+
+
+class HttpGoneError(HttpClientError):
+    """
+    Error that represents a HTTP response status 410 "Gone".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpGoneError()                          
+        """
+        
+        httpStatus = HTTPStatus.GONE
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)            
+
+
+class HttpLengthRequiredError(HttpClientError):
+    """
+    Error that represents a HTTP response status 411 "Length required".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpLengthRequiredError()                     
+        """
+        
+        httpStatus = HTTPStatus.LENGTH_REQUIRED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)   
+
+
+class HttpPreconditionFailedError(HttpClientError):
+    """
+    Error that represents a HTTP response status 412 "Precondition failed".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpPreconditionFailedError()                           
+        """
+        
+        httpStatus = HTTPStatus.PRECONDITION_FAILED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+
+
+class HttpRequestEntityTooLargeError(HttpClientError):
+    """
+    Error that represents a HTTP response status 413 "Request entity too large".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpRequestEntityTooLargeError()                          
+        """
+        
+        httpStatus = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpRequestUriTooLongError(HttpClientError):
+    """
+    Error that represents a HTTP response status 414 "Request URI too long".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpRequestUriTooLongError()                       
+        """
+        
+        httpStatus = HTTPStatus.REQUEST_URI_TOO_LONG
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpUnsupportedMediaTypeError(HttpClientError):
+    """
+    Error that represents a HTTP response status 415 "Unsupported media type".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpUnsupportedMediaTypeError()                        
+        """
+        
+        httpStatus = HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpRequestRangeNotSatisfiableError(HttpClientError):
+    """
+    Error that represents a HTTP response status 416 "Request range not satisfiable".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpRequestRangeNotSatisfiableError()                          
+        """
+        
+        httpStatus = HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpExpectationFailedError(HttpClientError):
+    """
+    Error that represents a HTTP response status 417 "Expectation failed".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpExpectationFailedError()                         
+        """
+        
+        httpStatus = HTTPStatus.EXPECTATION_FAILED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpImATeapotError(HttpClientError):
+    """
+    Error that represents a HTTP response status 418 "I'm a teapot".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpImATeapotError()
+        """
+        
+        # Not part of HTTPStatus before Python 3.9.
+        super().__init__(418, msg if msg else "I'm a Teapot")
+        
+
+class HttpMisdirectedRequestError(HttpClientError):
+    """
+    Error that represents a HTTP response status 421 "Misdirected request".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpMisdirectedRequestError()                        
+        """
+        
+        httpStatus = HTTPStatus.MISDIRECTED_REQUEST
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpUnprocessableEntityError(HttpClientError):
+    """
+    Error that represents a HTTP response status 422 "Unprocessable entity".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpUnprocessableEntityError()                         
+        """
+        
+        httpStatus = HTTPStatus.UNPROCESSABLE_ENTITY
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpLockedError(HttpClientError):
+    """
+    Error that represents a HTTP response status 423 "Locked".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpLockedError()                        
+        """
+        
+        httpStatus = HTTPStatus.LOCKED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpFailedDependencyError(HttpClientError):
+    """
+    Error that represents a HTTP response status 424 "Failed dependency".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpFailedDependencyError()                          
+        """
+        
+        httpStatus = HTTPStatus.FAILED_DEPENDENCY
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpTooEarlyError(HttpClientError):
+    """
+    Error that represents a HTTP response status 425 "Too early".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpTooEarlyError()
+        """
+        
+        # Not part of HTTPStatus before Python 3.9.
+        super().__init__(425, msg if msg else 'Too Early')
+        
+
+class HttpUpgradeRequiredError(HttpClientError):
+    """
+    Error that represents a HTTP response status 426 "Upgrade required".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpUpgradeRequiredError()                          
+        """
+        
+        httpStatus = HTTPStatus.UPGRADE_REQUIRED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpPreconditionRequiredError(HttpClientError):
+    """
+    Error that represents a HTTP response status 428 "Precondition required".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpPreconditionRequiredError()                     
+        """
+        
+        httpStatus = HTTPStatus.PRECONDITION_REQUIRED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpTooManyRequestsError(HttpClientError):
+    """
+    Error that represents a HTTP response status 429 "Too many requests".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpTooManyRequestsError()                        
+        """
+        
+        httpStatus = HTTPStatus.TOO_MANY_REQUESTS
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+        
+
+class HttpRequestHeaderFieldsTooLargeError(HttpClientError):
+    """
+    Error that represents a HTTP response status 431 "Request header fields too large".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpRequestHeaderFieldsTooLargeError()               
+        """
+        
+        httpStatus = HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
+
+
+class HttpUnavailableForLegalReasonsError(HttpClientError):
+    """
+    Error that represents a HTTP response status 451 "Unavailable for legal reasons".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpUnavailableForLegalReasonsError()
+        """
+        
+        httpStatus = HTTPStatus.UNAVAILABLE_FOR_LEGAL_REASONS
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)
+        
+
+class HttpInternalServerError(HttpServerError):
+    """
+    Error that represents a HTTP response status 500 "Internal server error".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpInternalServerError()               
+        """
+        
+        httpStatus = HTTPStatus.INTERNAL_SERVER_ERROR
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)       
+
+
+class HttpNotImplementedError(HttpServerError):
+    """
+    Error that represents a HTTP response status 501 "Not implemented".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpNotImplementedError()               
+        """
+        
+        httpStatus = HTTPStatus.NOT_IMPLEMENTED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpBadGatewayError(HttpServerError):
+    """
+    Error that represents a HTTP response status 502 "Bad gateway".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpBadGatewayError()               
+        """
+        
+        httpStatus = HTTPStatus.BAD_GATEWAY
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpRServiceUnavailableError(HttpServerError):
+    """
+    Error that represents a HTTP response status 503 "Service unavailable".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpRServiceUnavailableError()               
+        """
+        
+        httpStatus = HTTPStatus.SERVICE_UNAVAILABLE
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpGatewayTimeoutError(HttpServerError):
+    """
+    Error that represents a HTTP response status 504 "GatewayTimeout".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpGatewayTimeoutError()               
+        """
+        
+        httpStatus = HTTPStatus.GATEWAY_TIMEOUT
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpVersionNotSupportedError(HttpServerError):
+    """
+    Error that represents a HTTP response status 505 "HTTP version not supported".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpVersionNotSupportedError()               
+        """
+        
+        httpStatus = HTTPStatus.HTTP_VERSION_NOT_SUPPORTED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpVarianteAlsoNegociatesError(HttpServerError):
+    """
+    Error that represents a HTTP response status 506 "Variant also negociates".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpVarianteAlsoNegociatesError()               
+        """
+        
+        httpStatus = HTTPStatus.VARIANT_ALSO_NEGOTIATES
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpInsufficientStorageError(HttpServerError):
+    """
+    Error that represents a HTTP response status 507 "Insufficient storage".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpInsufficientStorageError()               
+        """
+        
+        httpStatus = HTTPStatus.INSUFFICIENT_STORAGE
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpLoopDetectedError(HttpServerError):
+    """
+    Error that represents a HTTP response status 508 "Loop detected"".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpLoopDetectedError()               
+        """
+        
+        httpStatus = HTTPStatus.LOOP_DETECTED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpNotExtendedError(HttpServerError):
+    """
+    Error that represents a HTTP response status 510 "Not extended".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpNotExtendedError()               
+        """
+        
+        httpStatus = HTTPStatus.NOT_EXTENDED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
+
+
+class HttpNetworkAuthenticationRequiredError(HttpServerError):
+    """
+    Error that represents a HTTP response status 511 "Network authentication required".
+    """
+    
+    def __init__(self, msg: typing.Optional[str] = None):
+        """
+        Parameters
+        ----------
+        msg : str
+            Explanatory message. A default message is used if omitted.
+
+        Examples
+        --------
+        >>> raise HttpNetworkAuthenticationRequiredError()               
+        """
+        
+        httpStatus = HTTPStatus.NETWORK_AUTHENTICATION_REQUIRED
+        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)         
+        
+
+def _http_error_class(httpStatus: HTTPStatus) -> typing.Type[HttpError]:
+    base: typing.Type[HttpError] = HttpClientError if httpStatus.value < 500 else HttpServerError
+
+    def __init__(self: HttpError, msg: typing.Optional[str] = None) -> None:
+        base.__init__(self, httpStatus.value, msg if msg else httpStatus.phrase)
+
+    return type(
+        'Http' + ''.join(w.capitalize() for w in httpStatus.name.split('_')) + 'Error',
+        (base,),
+        {
+            '__init__': __init__,
+            '__doc__': f'Error that represents a HTTP response status {httpStatus.value} "{httpStatus.phrase.capitalize()}".',
+            '__module__': __name__
+        }
+    )
+
+
+def _build_http_errors() -> typing.Dict[int, typing.Type[HttpError]]:
+    ret: typing.Dict[int, typing.Type[HttpError]] = {}
+
+    for errorClass in (*HttpClientError.__subclasses__(), *HttpServerError.__subclasses__()):
+        ret[errorClass().status] = errorClass
+
+    for httpStatus in HTTPStatus:
+        if httpStatus.value >= 400 and httpStatus.value not in ret:
+            # Statuses added by later Python versions get a generated class, bound to the module as the ones above.
+            errorClass = _http_error_class(httpStatus)
+            globals().setdefault(errorClass.__name__, errorClass)
+            ret[httpStatus.value] = errorClass
+
+    return ret
+
+
+_http_errors = _build_http_errors()
+
+
+def simple_message(message: str) -> typing.Dict[str, str]:
+    """
+    Turns a ``str`` into a ``dict`` payload having "Message" as a key and the passed string as a value.
+
+    :func:`build_http_response` uses this function to build response payloads from strings. 
+
+    There is no need to call :func:`simple_message` directly normally, although it may not cause any harm.
+
+    Parameters
+    ----------
+    message : str
+        The string to turn into a message payload.    
+
+    Returns
+    -------
+    dict
+        Payload built from the message string.     
+
+    Examples
+    --------
+    >>> simple_message("This is fine!")
+    {'Message': 'This is fine!'}
+    """
+
+    return {
+         "Message": message
+    }
+
+
+Transformer = typing.Callable[[dict], typing.Tuple[typing.Union[str, bytes, memoryview, typing.Iterator[typing.Union[str, bytes]]], str]]
+"""
+Type of the transformer functions: they take a payload and return (the content as ``Content-Type``, the ``Content-Type`` with encoding as ``str``).
+
+The content is a ``str``, ``bytes``, a ``memoryview``, or an iterator of ``str`` or ``bytes`` chunks, such as a generator. :func:`build_http_response`
+consumes it once, streaming the chunks through the compressor when the response is compressed. Raw bytes of binary types (see :func:`is_binary`) are
+base64 encoded by :func:`build_http_response`, whereas binary content returned as a ``str`` is expected to be base64 encoded already.
+Bytes of other types are expected to be UTF-8 encoded.
+"""
+
+
+class ContentNegotiator():
+    """
+    Content negotiator that selects the transformer to use according to the ``Accept`` header of the request.
+
+    The negotiator indexes the ``application/json`` transformers available by default and the given custom transformers once, 
+    by main type and subtype. It resolves ``Accept`` headers in a single pass:
+
+    * media ranges that are registered as such (``*/*`` and ``application/*`` by default, custom ranges such as ``text/*``) select their transformer,
+    * other media ranges (such as ``text/*``) select the first registered type they match (such as ``text/html``),
+    * types weighted ``q=0`` are never selected, even through a media range,
+    * preferences are handled according to quality values then specificity (see :func:`parse_header_preferences`).
+
+    Decisions are cached by ``Accept`` header value. It is a good idea to build negotiators once, at import time, and to pass them
+    to :func:`determine_content_type` and :func:`build_http_response` instead of ``dict`` of transformers.
+
+    Examples
+    --------
+    >>> negotiator = ContentNegotiator({ 'text/html': html_transformer, 'text/csv': csv_transformer })
+    >>>
+    >>> def lambda_handler(raw_event, context):
+    >>>     event = LambdaProxyEvent(raw_event)
+    >>>     determine_content_type(event, custom_transformers=negotiator)  # 'text/html' given 'Accept: text/*'
+    """
+
+    _maxDecisions = 256
+
+
+    def __init__(self, custom_transformers: typing.Optional[typing.Dict[str, Transformer]] = None) -> None:
+        """
+        Parameters
+        ----------
+        custom_transformers : dict
+            Optional mapping of ``Content-Type`` to transformer functions returning (the content as ``Content-Type``, the ``Content-Type`` with encoding as ``str``).
+            These transformers come in addition to the default ones, which they can override.
+        """
+
+        self._transformers: typing.Dict[str, typing.Tuple[str, Transformer]] = {}
+        self._byMainType: typing.Dict[str, typing.List[str]] = {}
+        self._concreteTypes: typing.List[str] = []
+
+        for mediaType, transformer in { **_basic_transformers, **(custom_transformers or {}) }.items():
+            key = mediaType.lower()
+
+            if key not in self._transformers:
+                mainType, _, subType = key.partition('/')
+
+                if not key.endswith('*'):
+                    self._concreteTypes.append(key)
+                    self._byMainType.setdefault(mainType, []).append(key)
+
+            self._transformers[key] = (mediaType, transformer)
+
+        self._availableFormats = tuple(sorted(self._transformers[k][0] for k in self._concreteTypes))
+        self._notAcceptableMessage = (
+            f"None of the formats specified in the Accept header are available. Available formats are: {', '.join(self._availableFormats)}."
+        )
+        self._decisions: typing.Dict[str, typing.Optional[str]] = {}
+
+
+    @property
+    def available_formats(self) -> typing.Tuple[str, ...]:
+        """
+        tuple : ``Content-Type`` values this negotiator can select, media ranges excluded, sorted alphabetically.
+
+        Examples
+        --------
+        >>> ContentNegotiator({ 'text/html': html_transformer }).available_formats
+        ('application/json', 'text/html')
+        """
+
+        return self._availableFormats
+
+
+    def transformer(self, media_type: str) -> Transformer:
+        """
+        Returns the transformer registered for the given ``Content-Type`` or media range.
+
+        Parameters
+        ----------
+        media_type : str
+            The ``Content-Type`` or media range, as returned by :meth:`negotiate`. Case-insensitive.
+
+        Returns
+        -------
+        callable
+            The transformer.
+
+        Raises
+        ------
+        KeyError
+            If no transformer is registered for ``media_type``.
+        """
+
+        return self._transformers[media_type.lower()][1]
+
+
+    def negotiate(self, accept: typing.Optional[str]) -> str:
+        """
+        Selects the ``Content-Type`` of the response according to the given ``Accept`` header value.
+
+        Parameters
+        ----------
+        accept : str
+            The raw value of the ``Accept`` header. ``*/*`` is assumed if ``None`` or empty.
+
+        Returns
+        -------
+        str
+            The ``Content-Type`` or media range as registered.
+
+        Raises
+        ------
+        HttpNotAcceptableError
+            If no transformer meets the criteria of the ``Accept`` header.
+
+        Examples
+        --------
+        >>> ContentNegotiator({ 'text/html': html_transformer }).negotiate('text/*, application/json;q=0.5')
+        'text/html'
+        """
+
+        accept = accept or '*/*'
+
+        try:
+            decision = self._decisions[accept]
+
+        except KeyError:
+            decision = self._resolve(parse_header_preferences(accept))
+
+            if len(self._decisions) >= self._maxDecisions:
+                self._decisions.clear()
+
+            self._decisions[accept] = decision
+
+        if decision is None:
+            raise HttpNotAcceptableError(self._notAcceptableMessage)
+
+        return decision
+
+
+    def _resolve(self, preferences: typing.Tuple[HeaderPreference, ...]) -> typing.Optional[str]:
+        excluded = { p.value.lower() for p in preferences if p.quality == 0 }
+
+        for preference in preferences:
+            if preference.quality == 0:
+                break
+
+            value = preference.value.lower()
+            registered = self._transformers.get(value)
+            mainType, _, subType = value.partition('/')
+
+            if subType != '*':
+                if registered is not None:
+                    return registered[0]
+
+                continue
+
+            candidates = self._concreteTypes if mainType == '*' else self._byMainType.get(mainType, ())
+            allowed = [ c for c in candidates if c not in excluded and f'{c.partition("/")[0]}/*' not in excluded ]
+
+            # A registered media range is only selected as such if none of the registered types it stands for is excluded.
+            if registered is not None and len(allowed) == len(candidates):
+                return registered[0]
+
+            if allowed:
+                return self._transformers[allowed[0]][0]
+
+        return None
+
+
+def _negotiator(custom_transformers: typing.Optional[typing.Union[typing.Dict[str, Transformer], ContentNegotiator]]) -> ContentNegotiator:
+    if custom_transformers is None:
+        return _basic_negotiator
+
+    if isinstance(custom_transformers, ContentNegotiator):
+        return custom_transformers
+
+    return ContentNegotiator(custom_transformers)
+
+
+class NegotiationResult(typing.NamedTuple):
+    """
+    Outcome of the content negotiation of an API call, as returned by :func:`negotiate`.
+
+    Examples
+    --------
+    Given an API call made with the ``Accept: application/json`` and ``Accept-Encoding: gzip`` headers:
+
+    >>> negotiate(event)
+    NegotiationResult(media_type='application/json', transformer=<function json_transformer at 0x7f55fd4d3e20>, encoding='gzip')
+    """
+
+    media_type: str
+    """
+    str : The selected ``Content-Type`` or media range, as registered.
+    """
+
+    transformer: Transformer
+    """
+    callable : The transformer registered for ``media_type``.
+    """
+
+    encoding: str
+    """
+    str : The ``Content-Encoding`` preferred by the client according to the ``Accept-Encoding`` quality values: ``gzip``, ``deflate`` or ``identity``,
+    among the encodings of the :class:`CompressionPolicy` passed to :func:`negotiate` if any. Whether the response is actually compressed also depends
+    on the size and the type of its body.
+    """
+
+
+_supported_encodings = ('gzip', 'deflate')
+
+
+@functools.lru_cache(maxsize = 256)
+def _negotiate_encoding(accept_encoding: str, encodings: typing.Tuple[str, ...] = _supported_encodings) -> str:
+    preferences = parse_header_preferences(accept_encoding)
+    refused = { p.value.lower() for p in preferences if p.quality <= 0 }
+
+    # Preferences are sorted by quality value: ties are broken by their order in the header.
+    for pref in preferences:
+        value = pref.value.lower()
+
+        if pref.quality <= 0:
+            continue
+
+        if value == 'identity':
+            break
+
+        if value in encodings:
+            return value
+
+        if value == '*':
+            return next((e for e in encodings if e not in refused), 'identity')
+
+    return 'identity'
+
+
+def _compression_encoding(encoding: str, event: typing.Optional[LambdaProxyEvent], policy: 'CompressionPolicy') -> str:
+    # Encodings negotiated without knowing the policy are negotiated again among the ones it allows.
+    if encoding == 'identity' or encoding in policy.encodings:
+        return encoding
+
+    acceptEncoding = event.header('Accept-Encoding') if event and 'headers' in event._event else None
+
+    return _negotiate_encoding(acceptEncoding, policy._orderedEncodings) if acceptEncoding else 'identity'
+
+
+def negotiate(
+        event: LambdaProxyEvent, *,
+        custom_transformers: typing.Optional[typing.Union[typing.Dict[str, Transformer], ContentNegotiator]] = None,
+        compression: typing.Optional['CompressionPolicy'] = None
+    ) -> NegotiationResult:
+    """
+    Negotiates the ``Content-Type`` and the ``Content-Encoding`` of the response to be sent based on the ``Accept`` and ``Accept-Encoding`` headers of the request.
+
+    The result is cached on the event for the given ``custom_transformers`` and ``compression``: :func:`determine_content_type` and
+    :func:`build_http_response` reuse it instead of parsing the headers again, provided they are passed the same objects.
+
+    Parameters
+    ----------
+    event : LambdaProxyEvent
+        The API call event.    
+    custom_transformers : dict or ContentNegotiator
+        Optional mapping of ``Content-Type`` to transformer functions returning (the content as ``Content-Type``, the ``Content-Type`` with encoding as ``str``),
+        or negotiator built from such a mapping.
+    compression : CompressionPolicy
+        Optional compression settings: the ``Content-Encoding`` is selected among their ``encodings``. Among ``gzip`` and ``deflate`` if omitted.
+
+    Returns
+    -------
+    NegotiationResult
+        The selected ``Content-Type``, its transformer and the selected ``Content-Encoding``.
+
+    Raises
+    ------
+    HttpNotAcceptableError
+        If no transformer meets the criteria of the ``Accept`` header.
+
+    Examples
+    --------
+    >>> negotiation = negotiate(event, custom_transformers=negotiator)
+    >>> # ...
+    >>> build_http_response(200, payload, event=event, negotiation=negotiation)
+
+    See Also
+    --------
+    determine_content_type : more details on the use of the optional parameter ``custom_transformers``.
+    """
+
+    if event._negotiation is not None and event._negotiation[0] is custom_transformers and event._negotiation[1] is compression:
+        return event._negotiation[2]
+
+    negotiator = _negotiator(custom_transformers)
+    mediaType = negotiator.negotiate(event.header('Accept'))
+    acceptEncoding = event.header('Accept-Encoding')
+
+    result = NegotiationResult(
+        mediaType, 
+        negotiator.transformer(mediaType), 
+        'identity' if acceptEncoding is None else _negotiate_encoding(acceptEncoding, compression._orderedEncodings if compression else _supported_encodings)
+    )
+
+    event._negotiation = (custom_transformers, compression, result)
+
+    return result
+
+
+def determine_content_type(
+        event: LambdaProxyEvent, *, 
+        custom_transformers: typing.Optional[typing.Union[typing.Dict[str, Transformer], 'ContentNegotiator']] = None
+    ) -> str:
+    """
+    Determines the ``Content-Type`` of the response to be sent based on the ``Accept`` header of the request.
+
+    ``application/json`` is the only ``Content-Type`` transformer available by default. It is mapped to the ``Accept`` values
+    ``*/*``, ``application/*`` and ``application/json``. Any other ``Accept`` value leads to a :exc:`HttpNotAcceptableError` unless
+    ``custom_transformers`` map this ``Accept`` value to an appropriate transformer.
+
+    Preferences, media ranges and specificity are handled by :class:`ContentNegotiator`. Should no ``Accept`` header be given, ``*/*`` is assumed.
+    The negotiation result is cached on the event (see :func:`negotiate`), so that :func:`build_http_response` does not negotiate again.
+
+    Parameters
+    ----------
+    event : LambdaProxyEvent
+        The API call event.    
+    custom_transformers : dict or ContentNegotiator
+        Optional mapping of ``Content-Type`` to transformer functions returning (the content as ``Content-Type``, the ``Content-Type`` with encoding as ``str``),
+        or negotiator built from such a mapping. Passing a negotiator built once saves indexing the transformers at each call.
+
+    Returns
+    -------
+    str
+        The ``Content-Type`` of the response.     
+
+    Raises
+    ------
+    HttpNotAcceptableError
+        If no transformer meets the criteria of the ``Accept`` header.
+            
+    Examples
+    --------
+    Given an API call that was made with a ``Accept: */*`` header, with no custom format handled by the application:
+
+    >>> determine_content_type(event)
+    'application/json'
+
+    Given an API call that was made with a ``Accept: text/csv`` header, with an application handling ``text/csv`` and 
+    ``application/xml`` on top of the default ``application/json``:
+
+    >>> def csv_transformer(payload: dict) -> typing.Tuple[str, str]:
+    >>>     # ... code that converts the json payload to csv and stores it into a variable called csvContent ...
+    >>>     return csvContent, 'text/csv; charset=utf-8'
+    >>>    
+    >>> def xml_transformer(payload: dict) -> typing.Tuple[str, str]:
+    >>>     # ... code that converts the json payload to xml and stores it into a variable called xmlContent ...
+    >>>     return xmlContent, 'application/xml; charset=utf-8'
+    >>> 
+    >>> custom_transformers = {
+    >>>     'text/csv': csv_transformer,
+    >>>     'application/xml': xml_transformer
+    >>> }
+    >>>
+    >>> determine_content_type(event, custom_transformers=custom_transformers)
+    'text/csv'
+
+    Notes
+    -----
+    It is a good idea to call this function at the very beginning of your Lambda handler. This way you can make sure that
+    the accepted ``Content-Type`` matches what your API is capable of returning, and return an :exc:`~HttpNotAcceptableError` 
+    response without doing any unnecessary processing otherwise.
+
+    The example below only accepts ``*/*``, ``application/*`` and ``application/json``, all mapped to ``application/json`` by default. 
+
+    >>> def lambda_handler(raw_event, context):
+    >>>     import awsmate.apigateway as amag
+    >>>
+    >>>     event = amag.LambdaProxyEvent(raw_event) 
+    >>>
+    >>>     try:
+    >>>         amag.determine_content_type(event)
+    >>>
+    >>>         # Everything you need to do
+    >>>
+    >>>         return amag.build_http_response(200, "OK", event=event)
+    >>>
+    >>>     except amag.HttpClientError as err:
+    >>>         return amag.build_http_client_error_response(err, event=event) # We will end up here should HttpNotAcceptableError be raised by determine_content_type()
+    >>>     except Exception:
+    >>>         return amag.build_http_server_error_response(amag.HttpInternalServerError(), event=event)
+    """
+
+    return negotiate(event, custom_transformers = custom_transformers).media_type
+
+
+def is_binary(content_type: str) -> bool:
+    """
+    Determines whether the given ``Content-Type`` is binary. 
+
+    :func:`build_http_response` uses this function to determine if the API Gateway requires a ``base64`` encoding prior returning the content,
+    which it performs itself for transformers returning ``bytes`` or a ``memoryview``. 
+    All types but ``text/*``, ``application/xml``, ``application/json`` and their ``+xml`` and ``+json`` variants (such as ``application/problem+json``),
+    ``application/javascript`` and ``application/x-ndjson`` are considered binary. 
+
+    There is no need to call :func:`is_binary` directly normally, although it may not cause any harm.    
+
+    Parameters
+    ----------
+    content_type : str
+        The ``Content-Type`` to assess.    
+
+    Returns
+    -------
+    bool
+        Whether the ``Content-Type`` is binary.     
+        
+    Examples
+    --------
+    >>> is_binary('image/jpeg')
+    True
+    """
+     
+    splitted = content_type.split('/')
+
+    if len(splitted) == 1:
+        splitted.append('*')
+
+    mainType = splitted[0]
+    subType = splitted[1].split(';')[0]
+
+    return (
+        mainType not in ('text', 'application')
+        or (mainType == 'application' and subType not in ('json', 'xml', 'javascript', 'x-ndjson') and not subType.endswith(('+json', '+xml')))
+    )
+
+
+def _json_default(obj: typing.Any) -> typing.Any:
+    # Checks are ordered by expected frequency. Returned containers are walked by the encoder, which calls this hook again if needed.
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+
+    if isinstance(obj, decimal.Decimal):
+        return int(obj) if obj.is_finite() and obj == obj.to_integral_value() else float(obj)
+
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return { field.name: getattr(obj, field.name) for field in dataclasses.fields(obj) }
+
+    if isinstance(obj, enum.Enum):
+        return obj.value
+
+    if isinstance(obj, (set, frozenset, collections.abc.Iterator)):
+        return list(obj)
+
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class JsonTransformer():
+    """
+    Configurable ``application/json`` transformer.
+
+    Besides the types natively supported by the ``json`` module, it serializes dataclasses as objects, ``datetime``, ``date`` and ``time`` as ISO 8601 strings,
+    ``Decimal`` as numbers, ``UUID`` as strings, ``Enum`` as their values, and sets and iterators as arrays. The encoder is built once.
+
+    Examples
+    --------
+    >>> pretty = JsonTransformer(compact=False)
+    >>> build_http_response(200, payload, event=event, custom_transformers={ 'application/json': pretty })
+    """
+
+    def __init__(
+            self, *,
+            compact: bool = True,
+            ensure_ascii: bool = False,
+            indent: int = 2,
+            sort_keys: bool = False,
+            default: typing.Optional[typing.Callable[[typing.Any], typing.Any]] = None
+        ) -> None:
+        """
+        Parameters
+        ----------
+        compact : bool
+            Optional flag that defines whether the output should be written without any whitespace. ``True`` if omitted.
+        ensure_ascii : bool
+            Optional flag that defines whether non-ASCII characters should be escaped. ``False`` if omitted.
+        indent : int
+            Optional indentation of the output if not ``compact``. ``2`` if omitted.
+        sort_keys : bool
+            Optional flag that defines whether the keys of the objects should be sorted. ``False`` if omitted.
+        default : callable
+            Optional function returning a serializable version of the objects the built-in hook does not support, or raising ``TypeError``.
+        """
+
+        self._default = default
+
+        self._encoder = json.JSONEncoder(
+            ensure_ascii = ensure_ascii,
+            indent = None if compact else indent,
+            separators = (',', ':') if compact else (',', ': '),
+            sort_keys = sort_keys,
+            default = self._fallback if default else _json_default
+        )
+
+
+    def __call__(self, payload: typing.Any) -> typing.Tuple[str, str]:
+        """
+        Parameters
+        ----------
+        payload : any
+            The payload to convert to ``application/json``.
+
+        Returns
+        -------
+        tuple
+            The ``application/json`` payload as a ``str``, the ``Content-Type`` with its encoding specifier.
+
+        Raises
+        ------
+        TypeError
+            If the payload contains objects that cannot be serialized.
+        """
+
+        return self._encoder.encode(payload), 'application/json; charset=utf-8'
+
+
+    def _fallback(self, obj: typing.Any) -> typing.Any:
+        try:
+            return _json_default(obj)
+
+        except TypeError:
+            return typing.cast(typing.Callable[[typing.Any], typing.Any], self._default)(obj)
+
+
+_compact_json_transformer = JsonTransformer()
+
+
+def json_transformer(payload: dict) -> typing.Tuple[str, str]:
+    """
+    Transformer used by :func:`build_http_response` to build ``application/json`` responses.
+
+    Output is compact and not ASCII-escaped. Dataclasses, datetimes, Decimals and UUIDs are supported: see :class:`JsonTransformer`,
+    which also makes indented output possible.
+
+    There is no need to this function directly normally, although it may not cause any harm.    
+
+    Parameters
+    ----------
+    payload : dict
+        The payload to convert to ``application/json``.    
+
+    Returns
+    -------
+    tuple
+        The ``application/json`` payload as a ``str``, the ``Content-Type`` with its encoding specifier.      
+        
+    Examples
+    --------
+    >>> json_transformer({'TopThreeBibs': (751,25,372)})
+    ('{"TopThreeBibs":[751,25,372]}', 'application/json; charset=utf-8')
+    """
+    
+    return _compact_json_transformer(payload)
+
+
+def problem_payload(
+        error: HttpError, *,
+        detail: typing.Optional[str] = None,
+        type: str = 'about:blank',
+        instance: typing.Optional[str] = None
+    ) -> typing.Dict[str, typing.Any]:
+    """
+    Builds the `RFC 7807 <https://www.rfc-editor.org/rfc/rfc7807>`_ problem details of an error.
+
+    Parameters
+    ----------
+    error : HttpError
+        The error.
+    detail : str
+        Optional explanation of the problem. The message of the error if omitted.
+    type : str
+        Optional URI reference identifying the problem type. ``about:blank`` if omitted, the title being the HTTP status phrase then.
+    instance : str
+        Optional URI reference identifying the occurrence of the problem.
+
+    Returns
+    -------
+    dict
+        The problem details, to be serialized by :func:`problem_transformer`.
+
+    Examples
+    --------
+    >>> problem_payload(HttpNotFoundError('No such report: 42.'))
+    {'type': 'about:blank', 'title': 'Not Found', 'status': 404, 'detail': 'No such report: 42.'}
+    """
+
+    try:
+        title = HTTPStatus(error.status).phrase
+
+    except ValueError:
+        title = str(error)
+
+    ret: typing.Dict[str, typing.Any] = {
+        'type': type,
+        'title': title,
+        'status': error.status,
+        'detail': detail if detail is not None else str(error)
+    }
+
+    if instance is not None:
+        ret['instance'] = instance
+
+    return ret
+
+
+_problem_content_type = 'application/problem+json; charset=utf-8'
+
+
+def problem_transformer(payload: typing.Dict[str, typing.Any]) -> typing.Tuple[str, str]:
+    """
+    Transformer used by the error responses builders to build ``application/problem+json`` responses.
+
+    Parameters
+    ----------
+    payload : dict
+        The problem details to convert to ``application/problem+json``.
+
+    Returns
+    -------
+    tuple
+        The ``application/problem+json`` payload as a ``str``, the ``Content-Type`` with its encoding specifier.
+
+    Examples
+    --------
+    >>> problem_transformer(problem_payload(HttpNotFoundError()))
+    ('{"type":"about:blank","title":"Not Found","status":404,"detail":"Not Found"}', 'application/problem+json; charset=utf-8')
+    """
+
+    return _compact_json_transformer(payload)[0], _problem_content_type
+
+
+def _rows(payload: typing.Any) -> typing.Iterable[typing.Any]:
+    # A mapping, such as a simple message, is a single row.
+    return [ payload ] if isinstance(payload, collections.abc.Mapping) else payload
+
+
+def ndjson_transformer(payload: typing.Iterable[typing.Any]) -> typing.Tuple[typing.Iterator[str], str]:
+    """
+    Transformer that builds ``application/x-ndjson`` responses from an iterable of rows, one JSON document per line.
+
+    Rows are consumed lazily while :func:`build_http_response` writes the body: memory stays proportional to a few rows rather than to the result set.
+    Rows are serialized as :func:`json_transformer` does. A ``dict`` payload is a single row. See :data:`tabular_transformers`.
+
+    Parameters
+    ----------
+    payload : iterable
+        The rows, such as a generator of ``dict``.
+
+    Returns
+    -------
+    tuple
+        An iterator of chunks of lines as ``str``, the ``Content-Type`` with its encoding specifier.
+
+    Examples
+    --------
+    >>> chunks, contentType = ndjson_transformer(({ 'id': i } for i in range(3)))
+    >>> ''.join(chunks), contentType
+    ('{"id":0}\\n{"id":1}\\n{"id":2}\\n', 'application/x-ndjson; charset=utf-8')
+    """
+
+    def chunks() -> typing.Iterator[str]:
+        encode = _compact_json_transformer._encoder.encode
+        lines: typing.List[str] = []
+        size = 0
+
+        for row in _rows(payload):
+            line = encode(row)
+            lines.append(line)
+            lines.append('\n')
+            size += len(line) + 1
+
+            if size >= _tabular_batch_size:
+                yield ''.join(lines)
+                lines.clear()
+                size = 0
+
+        if lines:
+            yield ''.join(lines)
+
+    return chunks(), 'application/x-ndjson; charset=utf-8'
+
+
+def csv_transformer(payload: typing.Iterable[typing.Any]) -> typing.Tuple[typing.Iterator[str], str]:
+    """
+    Transformer that builds ``text/csv`` responses from an iterable of rows.
+
+    Rows are either ``dict``, in which case the keys of the first row are written as a header line and define the columns, or sequences of values.
+    They are consumed lazily while :func:`build_http_response` writes the body: memory stays proportional to a few rows rather than to the result set.
+    A ``dict`` payload is a single row. See :data:`tabular_transformers`.
+
+    Parameters
+    ----------
+    payload : iterable
+        The rows, such as a generator of ``dict`` or of ``tuple``.
+
+    Returns
+    -------
+    tuple
+        An iterator of chunks of lines as ``str``, the ``Content-Type`` with its encoding specifier.
+
+    Examples
+    --------
+    >>> chunks, contentType = csv_transformer([ { 'id': 1, 'name': 'Jane' }, { 'id': 2, 'name': 'John' } ])
+    >>> ''.join(chunks), contentType
+    ('id,name\\r\\n1,Jane\\r\\n2,John\\r\\n', 'text/csv; charset=utf-8; header=present')
+    """
+
+    iterator = iter(_rows(payload))
+    first = next(iterator, None)
+    isMapping = isinstance(first, collections.abc.Mapping)
+
+    def chunks() -> typing.Iterator[str]:
+        if first is None:
+            return
+
+        buffer = io.StringIO()
+
+        if isMapping:
+            writer: typing.Any = csv.DictWriter(buffer, fieldnames = list(first.keys()), extrasaction = 'ignore')
+            writer.writeheader()
+        else:
+            writer = csv.writer(buffer)
+
+        for row in itertools.chain((first,), iterator):
+            writer.writerow(row)
+
+            if buffer.tell() >= _tabular_batch_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    return chunks(), f'text/csv; charset=utf-8; header={"present" if isMapping else "absent"}'
+
+
+_tabular_batch_size = 16 * 1024
+
+tabular_transformers: typing.Dict[str, Transformer] = {
+    'application/x-ndjson': ndjson_transformer,
+    'text/csv': csv_transformer
+}
+"""
+dict : Opt-in transformers of tabular payloads, to merge into the ``custom_transformers`` of :func:`build_http_response`.
+
+Examples
+--------
+>>> def rows():
+>>>     for item in query_items():
+>>>         yield { 'id': item.id, 'name': item.name }
+>>>
+>>> build_http_response(200, rows(), event=event, custom_transformers=tabular_transformers)
+"""
+
+
+_basic_transformers = {
+    '*/*': json_transformer,
+    'application/*': json_transformer,
+    'application/json': json_transformer
+}
+
+_basic_negotiator = ContentNegotiator()
+
+
+_response_hooks: typing.List[typing.Callable[[dict, int], None]] = []
+
+
+class CompressionPolicy():
+    """
+    Settings :func:`build_http_response` relies on to decide whether and how to compress the responses.
+
+    Responses are compressed with the encoding negotiated with the client provided it is one of ``encodings``, their ``Content-Type``
+    is compressible and their body is at least ``min_size`` bytes long. Small bodies are left uncompressed as compressing them, plus the base64
+    encoding compressed bodies require, makes them bigger.
+
+    Examples
+    --------
+    >>> fast = CompressionPolicy(level=4, min_size=2048)
+    >>> build_http_response(200, payload, event=event, compression=fast)
+    """
+
+    def __init__(
+            self, *,
+            min_size: int = 1024,
+            level: int = 6,
+            compressible_types: typing.Iterable[str] = (
+                'text/*',
+                'application/json',
+                'application/*+json',
+                'application/xml',
+                'application/*+xml',
+                'application/javascript',
+                'application/x-ndjson',
+                'image/svg+xml'
+            ),
+            encodings: typing.Iterable[str] = _supported_encodings
+        ) -> None:
+        """
+        Parameters
+        ----------
+        min_size : int
+            Optional minimum size in bytes of the bodies to compress. ``1024`` if omitted.
+        level : int
+            Optional compression level, from ``1`` (fastest) to ``9`` (smallest). ``6`` if omitted.
+        compressible_types : iterable
+            Optional media types worth compressing. Media ranges ``type/*`` and structured syntax suffixes ``type/*+suffix`` are accepted.
+            Textual types if omitted.
+        encodings : iterable
+            Optional encodings responses can be compressed with, among ``gzip`` and ``deflate``. Both if omitted, empty to disable compression.
+
+        Raises
+        ------
+        ValueError
+            If ``level`` is out of range or if an encoding is not supported.
+        """
+
+        if not 1 <= level <= 9:
+            raise ValueError(f'Compression level is out of range: {level}.')
+
+        self.min_size = min_size
+        self.level = level
+        self.encodings: typing.FrozenSet[str] = frozenset(e.lower() for e in encodings)
+        self._orderedEncodings = tuple(e for e in _supported_encodings if e in self.encodings)
+
+        for encoding in self.encodings:
+            if encoding not in _supported_encodings:
+                raise ValueError(f'Unsupported compression encoding: {encoding}.')
+
+        self._exactTypes = set()
+        self._mainTypes = set()
+        self._suffixes = set()
+
+        for mediaType in compressible_types:
+            mainType, _, subType = mediaType.lower().partition('/')
+
+            if subType == '*':
+                self._mainTypes.add(mainType)
+            elif subType.startswith('*+'):
+                self._suffixes.add((mainType, subType[1:]))
+            else:
+                self._exactTypes.add(f'{mainType}/{subType}')
+
+        self._decisions: typing.Dict[str, bool] = {}
+
+
+    def is_compressible(self, content_type: str) -> bool:
+        """
+        Determines whether the given ``Content-Type`` is worth compressing.
+
+        Parameters
+        ----------
+        content_type : str
+            The ``Content-Type`` to assess, parameters included or not.
+
+        Returns
+        -------
+        bool
+            Whether the ``Content-Type`` is one of the compressible types.
+        """
+
+        try:
+            return self._decisions[content_type]
+
+        except KeyError:
+            mediaType = content_type.split(';')[0].strip().lower()
+            mainType, _, subType = mediaType.partition('/')
+            plus = subType.rfind('+')
+
+            decision = (
+                mediaType in self._exactTypes
+                or mainType in self._mainTypes
+                or (plus >= 0 and (mainType, subType[plus:]) in self._suffixes)
+            )
+
+            if len(self._decisions) >= 256:
+                self._decisions.clear()
+
+            self._decisions[content_type] = decision
+
+            return decision
+
+
+    def select(self, encoding: str, content_type: str, size: int) -> str:
+        """
+        Determines the encoding of a response.
+
+        Parameters
+        ----------
+        encoding : str
+            The encoding negotiated with the client (see :attr:`NegotiationResult.encoding`).
+        content_type : str
+            The ``Content-Type`` of the response.
+        size : int
+            The size in bytes of the uncompressed body.
+
+        Returns
+        -------
+        str
+            ``encoding`` if the response should be compressed with it, ``identity`` otherwise.
+        """
+
+        if encoding in self.encodings and size >= self.min_size and self.is_compressible(content_type):
+            return encoding
+
+        return 'identity'
+
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        """
+        Compresses data.
+
+        Parameters
+        ----------
+        data : bytes
+            The data to compress.
+        encoding : str
+            ``gzip`` or ``deflate``.
+
+        Returns
+        -------
+        bytes
+            The compressed data. ``gzip`` output does not depend on the time it is produced at.
+        """
+
+        compressor = self._compressor(encoding)
+
+        return compressor.compress(data) + compressor.flush()
+
+
+    def _compressor(self, encoding: str) -> typing.Any:
+        return zlib.compressobj(self.level, zlib.DEFLATED, (16 + zlib.MAX_WBITS) if encoding == 'gzip' else zlib.MAX_WBITS)
+
+
+_default_compression = CompressionPolicy()
+
+_chunk_size = 64 * 1024
+
+
+def _byte_chunks(content: typing.Any) -> typing.Iterator[typing.Union[bytes, memoryview]]:
+    if isinstance(content, str):
+        for i in range(0, len(content), _chunk_size):
+            yield content[i:i + _chunk_size].encode('utf-8')
+
+    elif isinstance(content, (bytes, bytearray, memoryview)):
+        view = memoryview(content).cast('B')
+
+        for i in range(0, len(view), _chunk_size):
+            yield view[i:i + _chunk_size]
+
+    else:
+        for chunk in content:
+            yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+class _Base64Writer():
+    # Encodes written data as it comes, 3-byte aligned, so that only the base64 output is held in full.
+
+    def __init__(self) -> None:
+        self._pending = bytearray()
+        self._parts: typing.List[bytes] = []
+
+
+    def write(self, data: typing.Union[bytes, memoryview]) -> None:
+        self._pending += data
+
+        if len(self._pending) >= _chunk_size:
+            aligned = len(self._pending) - len(self._pending) % 3
+
+            with memoryview(self._pending) as view, view[:aligned] as head:
+                self._parts.append(binascii.b2a_base64(head, newline = False))
+
+            del self._pending[:aligned]
+
+
+    def getvalue(self) -> str:
+        self._parts.append(binascii.b2a_base64(self._pending, newline = False))
+        self._pending = bytearray()
+
+        return b''.join(self._parts).decode('ascii')
+
+
+def _size(data: typing.Union[bytes, bytearray, memoryview]) -> int:
+    return data.nbytes if isinstance(data, memoryview) else len(data)
+
+
+def _read_ahead(iterator: typing.Iterator[typing.Union[bytes, memoryview]], min_size: int) -> typing.Tuple[typing.List[typing.Union[bytes, memoryview]], int]:
+    # Chunks are read ahead until the threshold is reached, so that small streamed bodies are not compressed either.
+    head = []
+    headSize = 0
+
+    for chunk in iterator:
+        head.append(chunk)
+        headSize += _size(chunk)
+
+        if headSize >= min_size:
+            break
+
+    return head, headSize
+
+
+def _utf8_size(text: str) -> int:
+    # ASCII strings are flagged as such by the interpreter: their size is known without encoding them.
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def _encode_body(
+        content: typing.Any,
+        content_type: str,
+        encoding: str,
+        policy: CompressionPolicy,
+        measure: bool = False
+    ) -> typing.Tuple[str, str, typing.Optional[int]]:
+
+    # Returns the body, the actual encoding and the uncompressed size in bytes if it was computed on the way or if measure is set.
+    if not isinstance(content, (str, bytes, bytearray, memoryview, collections.abc.Iterator)):
+        return content, 'identity', 0 if measure else None
+
+    if encoding != 'identity' and (encoding not in policy.encodings or not policy.is_compressible(content_type)):
+        encoding = 'identity'
+
+    chunks: typing.Optional[typing.Iterator[typing.Union[bytes, memoryview]]] = None
+
+    if encoding != 'identity':
+        if isinstance(content, str) and len(content) < policy.min_size:
+            # Characters are counted rather than bytes: below the threshold, the exact size is worth encoding for.
+            content = content.encode('utf-8')
+
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            if _size(content) < policy.min_size:
+                encoding = 'identity'
+            else:
+                chunks = _byte_chunks(content)
+
+        elif isinstance(content, str):
+            chunks = _byte_chunks(content)
+
+        else:
+            iterator = _byte_chunks(content)
+            head, headSize = _read_ahead(iterator, policy.min_size)
+
+            if headSize < policy.min_size:
+                encoding = 'identity'
+                content = b''.join(head)
+            else:
+                chunks = itertools.chain(head, iterator)
+
+    if chunks is not None:
+        compressor = policy._compressor(encoding)
+        writer = _Base64Writer()
+        size = 0
+
+        for chunk in chunks:
+            size += _size(chunk)
+            writer.write(compressor.compress(chunk))
+
+        writer.write(compressor.flush())
+
+        return writer.getvalue(), encoding, size
+
+    if isinstance(content, str):
+        # Binary content returned as a str is expected to be base64 encoded already.
+        return content, 'identity', _utf8_size(content) if measure else None
+
+    if is_binary(content_type):
+        # Binary content is base64 encoded once, as it comes.
+        if not isinstance(content, collections.abc.Iterator):
+            return binascii.b2a_base64(content, newline = False).decode('ascii'), 'identity', _size(content)
+
+        writer = _Base64Writer()
+        size = 0
+
+        for chunk in _byte_chunks(content):
+            size += _size(chunk)
+            writer.write(chunk)
+
+        return writer.getvalue(), 'identity', size
+
+    if isinstance(content, collections.abc.Iterator):
+        content = b''.join(_byte_chunks(content))
+
+    return str(content, 'utf-8'), 'identity', _size(content)
+
+
+def register_response_hook(hook: typing.Callable[[dict, int], None]) -> None:
+    """
+    Registers a function to be called with each response built by :func:`build_http_response`.
+
+    Hooks receive the response to return to API Gateway and the size in bytes of its body before compression. They are called in
+    their registration order and should not modify the response.
+
+    Parameters
+    ----------
+    hook : callable
+        The function to call, taking the response as a ``dict`` and the uncompressed body size as an ``int``.
+
+    Examples
+    --------
+    >>> def log_status(response: dict, body_size: int) -> None:
+    >>>     logger.info('Returned %d (%d bytes)', response['statusCode'], body_size)
+    >>>
+    >>> register_response_hook(log_status)
+
+    See Also
+    --------
+    awsmate.metrics.MetricsAggregator.record_http_responses : hook that records status codes and body sizes as metrics.
+    """
+
+    if hook not in _response_hooks:
+        _response_hooks.append(hook)
+
+
+def unregister_response_hook(hook: typing.Callable[[dict, int], None]) -> None:
+    """
+    Unregisters a function registered by :func:`register_response_hook`. Unknown functions are ignored.
+
+    Parameters
+    ----------
+    hook : callable
+        The function to unregister.
+    """
+
+    if hook in _response_hooks:
+        _response_hooks.remove(hook)
+
+
+def _utc(date: datetime.datetime) -> datetime.datetime:
+    return date.replace(tzinfo = datetime.timezone.utc) if date.tzinfo is None else date.astimezone(datetime.timezone.utc)
+
+
+def _digest(content: typing.Any) -> typing.Tuple[typing.Any, str, int]:
+    # Returns the content, materialized if it was an iterator, the hash of its serialized form and its size in bytes.
+    hasher = hashlib.blake2b(digest_size = 16)
+    size = 0
+
+    if isinstance(content, collections.abc.Iterator):
+        content = list(_byte_chunks(content))
+        chunks: typing.Iterable[typing.Union[bytes, memoryview]] = content
+        ret = iter(content)
+    else:
+        chunks = _byte_chunks(content)
+        ret = content
+
+    for chunk in chunks:
+        hasher.update(chunk)
+        size += len(chunk)
+
+    return ret, hasher.hexdigest(), size
+
+
+_etag_suffixes = tuple(f'-{e}"' for e in _supported_encodings)
+
+
+def _opaque_tag(tag: str) -> str:
+    # Weak comparison, that ignores the weakness indicator and the encoding suffix.
+    tag = tag.strip()
+
+    if tag.startswith('W/'):
+        tag = tag[2:]
+
+    for suffix in _etag_suffixes:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+
+    return tag
+
+
+def _is_not_modified(event: LambdaProxyEvent, digest: typing.Optional[str], last_modified: typing.Optional[datetime.datetime]) -> bool:
+    ifNoneMatch = event.header('If-None-Match') if 'headers' in event._event else None
+    ifModifiedSince = event.header('If-Modified-Since') if 'headers' in event._event else None
+
+    if ifNoneMatch is None and ifModifiedSince is None:
+        return False
+
+    if event.http_method() not in ('GET', 'HEAD'):
+        return False
+
+    if ifNoneMatch is not None:
+        # If-Modified-Since is ignored when If-None-Match is present.
+        if digest is None:
+            return False
+
+        return ifNoneMatch.strip() == '*' or f'"{digest}"' in { _opaque_tag(t) for t in _split_unquoted(ifNoneMatch, ',') }
+
+    if last_modified is None:
+        return False
+
+    try:
+        since = email.utils.parsedate_to_datetime(ifModifiedSince)
+
+    except (TypeError, ValueError, IndexError):
+        return False
+
+    return _utc(last_modified).replace(microsecond = 0) <= _utc(since)
+
+
+def build_http_response(
+        status: int, 
+        payload: typing.Union[dict, str], *, 
+        event: typing.Optional[LambdaProxyEvent] = None, 
+        custom_transformers: typing.Optional[typing.Union[typing.Dict[str, Transformer], ContentNegotiator]] = None,
+        extra_headers: typing.Optional[typing.Dict[str, str]] = None,
+        negotiation: typing.Optional[NegotiationResult] = None,
+        compression: typing.Optional[CompressionPolicy] = None,
+        etag: typing.Optional[str] = None,
+        last_modified: typing.Optional[datetime.datetime] = None
+    ) -> dict:
+    """
+    Builds the HTTP response the Lambda handler has to return to API Gateway.
+
+    Should the ``Accept`` header of the API call lead to a :exc:`HttpNotAcceptableError`, an error message is returned instead
+    of the passed payload and the status code is set accordingly. 
+    
+    This function handles the ``Accept-Encoding`` header of the API call for you, compressing the response with ``gzip`` or ``deflate`` according to
+    the :class:`CompressionPolicy` in use. It also sets the base-64 flag of the response to ``True`` if the returned ``Content-Type`` is binary.
+
+    Parameters
+    ----------
+    status : int
+        The HTTP status code.  
+    payload : dict or str
+        The payload that constitutes the body of the response. Should it be a ``str``, it will first be transformed by :func:`simple_message`.
+    event : LambdaProxyEvent
+        Optional wrapper of the event the Lambda handler receives from the API Gateway.
+    custom_transformers : dict or ContentNegotiator
+        Optional mapping of ``Content-Type`` to transformer functions returning (the content as ``Content-Type``, the ``Content-Type`` with encoding as ``str``),
+        or negotiator built from such a mapping.
+    extra_headers : dict
+        Optional extra headers to return. For example : ``{ 'Access-Control-Allow-Origin': '*' }`` to handle CORS.   
+    negotiation : NegotiationResult
+        Optional result of a former negotiation (see :func:`negotiate`). The headers of ``event`` are not parsed again if given.
+        Otherwise, the negotiation result cached on ``event`` for ``custom_transformers`` is reused, if any.
+    compression : CompressionPolicy
+        Optional compression settings. Bodies of textual types of at least 1 KiB are compressed at level 6 if omitted.
+    etag : str
+        Optional kind of ``ETag`` header to return: ``strong`` or ``weak``. It is computed over the uncompressed body.
+        The strong ``ETag`` of a compressed response is suffixed by its encoding.
+    last_modified : datetime.datetime
+        Optional last modification date of the resource, returned as the ``Last-Modified`` header. Naive dates are assumed to be UTC.
+
+    Returns
+    -------
+    dict
+        The HTTP response to return to API Gateway.     
+      
+    Examples
+    --------
+    >>> payload = { 
+    >>>     'someKey': 'someVal' 
+    >>> }
+    >>>
+    >>> event = None # Use defaults: no specific headers ('Accept: */*' assumed), no body, no URL parameters
+    >>>
+    >>> custom_transformers = None # 'application/json' transformer is built-in and is bound to 'Accept: */*'. We don't need anything else here.
+    >>>
+    >>> extra_headers = {
+    >>>     'Access-Control-Allow-Origin': '*' # Deals with CORS provided HTTP OPTIONS is dealt with on API Gateway side.
+    >>> }
+    >>>
+    >>> build_http_response(200, payload, event=event, custom_transformers=custom_transformers, extra_headers=extra_headers)
+    {'isBase64Encoded': False, 'statusCode': 200, 'body': '{"someKey":"someVal"}', 'headers': {'Content-Type': 'application/json; charset=utf-8', 'Access-Control-Allow-Origin': '*'}}
+
+    See Also
+    --------
+    determine_content_type : more details on the use of the optional parameter ``custom_transformers``.
+
+    Notes
+    -----
+    Should ``etag`` or ``last_modified`` be given, the ``If-None-Match`` and ``If-Modified-Since`` headers of ``GET`` and ``HEAD`` API calls
+    are evaluated for responses of status 200. A body-less 304 response is returned if they match, without compressing the body.
+    Bodies returned as iterators are held in memory to compute their ``ETag``.
+    """
+
+    if isinstance(payload, str):
+        payload = simple_message(payload)
+
+    if etag not in (None, 'strong', 'weak'):
+        raise ValueError(f'Unknown ETag kind: {etag}.')
+
+    encoding = 'identity'
+
+    policy = compression or _default_compression
+
+    if negotiation is None and event:
+        try:
+            negotiation = negotiate(event, custom_transformers = custom_transformers, compression = compression)
+
+        except HttpNotAcceptableError as err:
+            status = err.status
+
+            stringifiedPayload, contentType = _negotiator(custom_transformers).transformer('*/*')(
+                simple_message(str(err))
+            )
+
+    if negotiation is not None:
+        encoding = _compression_encoding(negotiation.encoding, event, policy)
+        stringifiedPayload, contentType = negotiation.transformer(payload)
+
+    elif not event:
+        stringifiedPayload, contentType = _negotiator(custom_transformers).transformer('*/*')(payload)
+
+    validators: typing.Dict[str, str] = {}
+    digest = None
+
+    if etag is not None and isinstance(stringifiedPayload, (str, bytes, bytearray, memoryview, collections.abc.Iterator)):
+        stringifiedPayload, digest, size = _digest(stringifiedPayload)
+
+    if last_modified is not None:
+        validators['Last-Modified'] = email.utils.format_datetime(_utc(last_modified).replace(microsecond = 0), usegmt = True)
+
+    if digest is not None:
+        validators['ETag'] = f'W/"{digest}"' if etag == 'weak' else f'"{digest}"'
+
+    if validators and status == 200 and event and _is_not_modified(event, digest, last_modified):
+        if etag == 'strong' and digest is not None and encoding in policy.encodings and policy.is_compressible(contentType) and size >= policy.min_size:
+            # The validator of the representation that would have been sent.
+            validators['ETag'] = f'"{digest}-{encoding}"'
+
+        ret = {
+            'isBase64Encoded': False,
+            'statusCode': HTTPStatus.NOT_MODIFIED.value,
+            'body': '',
+            'headers': {
+                **(extra_headers if extra_headers else {}),
+                **validators
+            }
+        }
+
+        for hook in _response_hooks:
+            hook(ret, 0)
+
+        return ret
+
+    body, encoding, bodySize = _encode_body(stringifiedPayload, contentType, encoding, policy, bool(_response_hooks))
+
+    ret = {
+        'isBase64Encoded': encoding != 'identity' or is_binary(contentType),
+        'statusCode': status,
+        'body': body,
+        'headers': {     
+            'Content-Type': contentType,
+            **(extra_headers if extra_headers else {}),
+            **validators
+        }
+    }
+
+    if encoding != 'identity':
+        ret['headers']['Content-Encoding'] = encoding
+
+        if etag == 'strong' and digest is not None:
+            # Strong validators have to differ between the representations of a resource.
+            ret['headers']['ETag'] = f'"{digest}-{encoding}"'
+
+    for hook in _response_hooks:
+        hook(ret, typing.cast(int, bodySize))
+
+    return ret
+
+
+_canned_responses: 'collections.OrderedDict[typing.Hashable, typing.Tuple[dict, int]]' = collections.OrderedDict()
+
+_max_canned_responses = 256
+
+_canned_options = frozenset(('event', 'custom_transformers', 'extra_headers', 'negotiation', 'compression'))
+
+
+def _problem_negotiation(negotiation: typing.Optional[NegotiationResult], event: typing.Optional[LambdaProxyEvent]) -> NegotiationResult:
+    # Problem details are returned whatever the Accept header, only the encoding is negotiated.
+    if negotiation is not None:
+        encoding = negotiation.encoding
+    elif event and 'headers' in event._event and event.has_header('Accept-Encoding'):
+        encoding = _negotiate_encoding(typing.cast(str, event.header('Accept-Encoding')))
+    else:
+        encoding = 'identity'
+
+    return NegotiationResult(_problem_content_type, problem_transformer, encoding)
+
+
+def _canned_response(status: int, payload: typing.Union[str, dict], **kwargs: typing.Any) -> dict:
+    # Error responses only depend on the status, the payload and the negotiation: they are built once per combination of those.
+    key = None
+    customTransformers = kwargs.get('custom_transformers')
+
+    if kwargs.keys() <= _canned_options and (customTransformers is None or isinstance(customTransformers, ContentNegotiator)):
+        negotiation = kwargs.get('negotiation')
+        event = kwargs.get('event')
+
+        try:
+            if negotiation is None and event:
+                # Cached on the event, so that build_http_response() does not negotiate again on misses.
+                negotiation = negotiate(event, custom_transformers = customTransformers, compression = kwargs.get('compression'))
+
+            key = (
+                status,
+                payload if isinstance(payload, str) else tuple(payload.items()),
+                customTransformers,
+                negotiation,
+                _compression_encoding(negotiation.encoding, event, kwargs.get('compression') or _default_compression) if negotiation else None,
+                tuple((kwargs.get('extra_headers') or {}).items()),
+                kwargs.get('compression')
+            )
+
+            hash(key)
+
+        except (HttpNotAcceptableError, AwsEventSpecificationError, TypeError):
+            key = None
+
+    if key is None:
+        return build_http_response(status, payload, **kwargs)
+
+    entry = _canned_responses.get(key)
+
+    if entry is not None:
+        response = { **entry[0], 'headers': dict(entry[0]['headers']) }
+
+        for hook in _response_hooks:
+            hook(response, entry[1])
+
+        return response
+
+    # The body size build_http_response() computes on the way is collected as a response hook would.
+    bodySizes: typing.List[int] = []
+    collector = lambda response, body_size: bodySizes.append(body_size)
+
+    _response_hooks.append(collector)
+
+    try:
+        response = build_http_response(status, payload, **kwargs)
+
+    finally:
+        _response_hooks.remove(collector)
+
+    if isinstance(response, dict) and bodySizes:
+        _canned_responses[key] = ({ **response, 'headers': dict(response['headers']) }, bodySizes[0])
+
+        if len(_canned_responses) > _max_canned_responses:
+            _canned_responses.popitem(last = False)
+
+    return response
+
+
+def build_http_server_error_response(
+        error: HttpServerError, *,
+        client_message: typing.Optional[str] = None,
+        log: bool = True,
+        problem: bool = False,
+        **kwargs: typing.Any
+    ) -> dict:
+    """
+    Convenience function that builds an HTTP error 5XX response to be returned to API Gateway by the Lambda handler.
+
+    Unless specified otherwise, calling this function logs a stack trace of the error showing the status and the actual error message. 
+    This message is replaced by a client-oriented message in the HTTP response. The debug buffer of the logger is dumped in any case
+    (see :func:`awsmate.logger.set_debug_buffer`).
+
+    Parameters
+    ----------
+    error : HttpServerError
+        Object representing the error. 
+    client_message : str
+        Optional client-oriented message. An english canned message is used if omitted.
+    log : bool
+        Optional flag that defines whether a stack trace should be logged. ``True`` if omitted.
+    problem : bool
+        Optional flag that defines whether an ``application/problem+json`` response should be returned whatever the ``Accept`` header,
+        the client-oriented message being the problem detail (see :func:`problem_payload`). ``False`` if omitted.
+    **kwarg : any
+        Optional arguments to pass to :func:`build_http_response`
+
+    Returns
+    -------
+    dict
+        The HTTP error 5XX response to return to API Gateway.        
+      
+    Examples
+    --------
+    >>> build_http_server_error_response(HttpInsufficientStorageError(), client_message='Sorry, we have an issue.')
+    {'isBase64Encoded': False, 'statusCode': 507, 'body': '{"Message":"Sorry, we have an issue."}', 'headers': {'Content-Type': 'application/json; charset=utf-8'}}
+
+    Notes
+    -----
+    This function calls 
+    
+    >>> build_http_response(error.status, client_message, **kwargs)
+
+    once per combination of status, message, negotiated format and encoding, extra headers and compression settings: later responses are
+    copies of the first one. Responses are built each time should ``custom_transformers`` be a ``dict`` rather than a :class:`ContentNegotiator`.
+        
+    It is a good idea to make your Lambda handler to catch all unexpected errors to return a clean user-oriented error message should anything go wrong.
+
+    >>> def lambda_handler(raw_event, context):
+    >>>     import awsmate.apigateway as amag
+    >>>
+    >>>     event = amag.LambdaProxyEvent(raw_event) 
+    >>>
+    >>>     try:
+    >>>         # Everything you need to do
+    >>>
+    >>>         return amag.build_http_response(200, "OK", event=event)
+    >>>
+    >>>     except amag.HttpClientError as err:
+    >>>         return amag.build_http_client_error_response(err, event=event) 
+    >>>     except Exception:
+    >>>         # We will end up here should any unexpected error occur
+    >>>         return amag.build_http_server_error_response(amag.HttpInternalServerError(), event=event) 
+    """
+    
+    if log:
+        log_internal_error('%s - %s', error.status, error)
+    else:
+        dump_debug_buffer()
+
+    message = client_message if client_message else 'Sorry, an error occured. Please contact the API administrator to have this sorted out.'
+
+    if problem:
+        kwargs['negotiation'] = _problem_negotiation(kwargs.get('negotiation'), kwargs.get('event'))
+
+        return _canned_response(error.status, problem_payload(error, detail = message), **kwargs)
+
+    return _canned_response(error.status, message, **kwargs)
+
+
+def build_http_client_error_response(
+        error: HttpClientError, *,
+        log: bool = True,
+        problem: bool = False,
+        **kwargs: typing.Any
+    ) -> dict:
+    """
+    Convenience function that builds an HTTP error 4XX response to be returned to API Gateway by the Lambda handler.
+
+    Unless specified otherwise, calling this function logs an error showing the status and message. 
+    :class:`HttpMethodNotAllowedError` specifying its allowed methods adds an ``Allow`` header to ``extra_headers``.
+
+    Parameters
+    ----------
+    error : HttpClientError
+        Object representing the error. 
+    log : bool
+        Optional flag that defines whether a stack trace should be logged. ``True`` if omitted.
+    problem : bool
+        Optional flag that defines whether an ``application/problem+json`` response should be returned whatever the ``Accept`` header
+        (see :func:`problem_payload`). ``False`` if omitted.
+    **kwarg : any
+        Optional arguments to pass to :func:`build_http_response`
+
+    Returns
+    -------
+    dict
+        The HTTP error 4XX response to return to API Gateway.      
+
+    Examples
+    --------
+    >>> build_http_client_error_response(HttpNotFoundError())
+    {'isBase64Encoded': False, 'statusCode': 404, 'body': '{"Message":"Not Found"}', 'headers': {'Content-Type': 'application/json; charset=utf-8'}}
+    
+    Notes
+    -----
+    This function calls 
+    
+    >>> build_http_response(error.status, str(error), **kwargs)
+
+    once per combination of status, message, negotiated format and encoding, extra headers and compression settings, as
+    :func:`build_http_server_error_response` does.
+
+    It is a good idea to make your Lambda handler to catch all HttpClientError to return a clean error message should there be any problem with the request.
+
+    >>> def lambda_handler(raw_event, context):
+    >>>     import awsmate.apigateway as amag
+    >>>
+    >>>     event = amag.LambdaProxyEvent(raw_event) 
+    >>>
+    >>>     try:
+    >>>         # Everything you need to do
+    >>>
+    >>>         return amag.build_http_response(200, "OK", event=event)
+    >>>
+    >>>     except amag.HttpClientError as err:
+    >>>         return amag.build_http_client_error_response(err, event=event) # We will end up here should anything be wrong in the client's request
+    >>>     except Exception:
+    >>>         return amag.build_http_server_error_response(amag.HttpInternalServerError(), event=event) 
+    """
+
+    if log:
+        logger.error('%s - %s', error.status, error)
+
+    allowedMethods = getattr(error, 'allowed_methods', None)
+
+    if allowedMethods:
+        kwargs['extra_headers'] = { 'Allow': ', '.join(allowedMethods), **(kwargs.get('extra_headers') or {}) }
+
+    if problem:
+        kwargs['negotiation'] = _problem_negotiation(kwargs.get('negotiation'), kwargs.get('event'))
+
+        return _canned_response(error.status, problem_payload(error), **kwargs)
+
+    return _canned_response(error.status, str(error), **kwargs)
+
+
+class StreamWriter(abc.ABC):
+    """
+    Interface of the response streams :func:`stream_http_response` writes to.
+
+    Implementations wrap the response stream a Lambda function invoked in ``RESPONSE_STREAM`` mode writes to. The managed Python runtimes
+    provide no such stream: it is up to a custom runtime, or to an adapter such as the Lambda Web Adapter, to provide one. This module ships
+    no implementation for them, only :class:`LocalStreamWriter`, a stand-in collecting what is written, for tests and local runs.
+
+    Examples
+    --------
+    >>> class RuntimeStreamWriter(StreamWriter):
+    >>>     def __init__(self, stream):
+    >>>         self._stream = stream  # Writable binary stream provided by the custom runtime
+    >>>
+    >>>     def write(self, data):
+    >>>         self._stream.write(data)
+    >>>         self._stream.flush()
+    >>>
+    >>>     def close(self):
+    >>>         self._stream.close()
+    """
+
+    @abc.abstractmethod
+    def write(self, data: bytes) -> None:
+        """
+        Writes data to the stream, sending it as soon as possible.
+
+        Parameters
+        ----------
+        data : bytes
+            The data to write.
+        """
+
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        """
+        Ends the response.
+        """
+
+
+class LocalStreamWriter(StreamWriter):
+    """
+    :class:`StreamWriter` keeping what is written in memory.
+
+    Examples
+    --------
+    >>> writer = LocalStreamWriter()
+    >>> stream_http_response(writer, 200, rows(), event=event, custom_transformers=tabular_transformers)
+    >>> writer.prelude()['statusCode'], len(writer.body())
+    (200, 1843)
+    """
+
+    def __init__(self) -> None:
+        self.chunks: typing.List[bytes] = []
+        """
+        list : The data written so far, one ``bytes`` per call to :meth:`write`.
+        """
+
+        self.closed = False
+        """
+        bool : Whether :meth:`close` was called.
+        """
+
+
+    def write(self, data: bytes) -> None:
+        if self.closed:
+            raise ValueError('Write to a closed stream.')
+
+        self.chunks.append(bytes(data))
+
+
+    def close(self) -> None:
+        self.closed = True
+
+
+    def getvalue(self) -> bytes:
+        """
+        Returns all data written so far.
+
+        Returns
+        -------
+        bytes
+            The data, prelude and delimiter included.
+        """
+
+        return b''.join(self.chunks)
+
+
+    def prelude(self) -> typing.Dict[str, typing.Any]:
+        """
+        Returns the HTTP prelude written so far.
+
+        Returns
+        -------
+        dict
+            The status code and the headers of the response.
+
+        Raises
+        ------
+        ValueError
+            If no complete prelude was written.
+        """
+
+        prelude, separator, _ = self.getvalue().partition(_stream_delimiter)
+
+        if not separator:
+            raise ValueError('No complete prelude was written.')
+
+        return json.loads(prelude)
+
+
+    def body(self) -> bytes:
+        """
+        Returns the body written so far, as it would be received by the client.
+
+        Returns
+        -------
+        bytes
+            The body, compressed if the response is.
+        """
+
+        return self.getvalue().partition(_stream_delimiter)[2]
+
+
+_stream_delimiter = b'\x00' * 8
+
+
+def stream_http_response(
+        writer: StreamWriter,
+        status: int,
+        payload: typing.Any, *,
+        event: typing.Optional[LambdaProxyEvent] = None,
+        content_type: typing.Optional[str] = None,
+        custom_transformers: typing.Optional[typing.Union[typing.Dict[str, Transformer], ContentNegotiator]] = None,
+        extra_headers: typing.Optional[typing.Dict[str, str]] = None,
+        negotiation: typing.Optional[NegotiationResult] = None,
+        compression: typing.Optional[CompressionPolicy] = None
+    ) -> None:
+    """
+    Streaming counterpart of :func:`build_http_response`, for Lambda functions invoked through a function URL in ``RESPONSE_STREAM`` mode.
+
+    The HTTP prelude (status and headers, as JSON) is written first, followed by 8 null bytes and the body as it is produced, so that clients
+    receive the first bytes before the whole body is built and the body is not limited to the 6 MB of buffered responses. The body is compressed
+    on the fly according to the ``Accept-Encoding`` header and the :class:`CompressionPolicy` in use, each chunk being flushed to the client.
+    It is not base64 encoded. The writer is closed in any case. Response hooks are not called.
+
+    The managed Python runtimes do not support response streaming: running this function in production requires a custom runtime
+    providing the response stream, wrapped by a :class:`StreamWriter` of yours.
+
+    Parameters
+    ----------
+    writer : StreamWriter
+        The response stream.
+    status : int
+        The HTTP status code.
+    payload : any
+        The payload, transformed as :func:`build_http_response` does. Should ``content_type`` be given, the content itself:
+        a ``str``, ``bytes`` or an iterator of ``str`` or ``bytes`` chunks such as a generator.
+    event : LambdaProxyEvent
+        Optional wrapper of the event the Lambda handler receives.
+    content_type : str
+        Optional ``Content-Type`` of ``payload``, which is then not transformed.
+    custom_transformers : dict or ContentNegotiator
+        Optional transformers, as for :func:`build_http_response`. Ignored if ``content_type`` is given.
+    extra_headers : dict
+        Optional extra headers to return.
+    negotiation : NegotiationResult
+        Optional result of a former negotiation (see :func:`negotiate`).
+    compression : CompressionPolicy
+        Optional compression settings. :func:`build_http_response` defaults if omitted.
+
+    Raises
+    ------
+    Exception
+        Whatever the payload iterator raises. The response is then truncated, as its status was already sent.
+
+    Examples
+    --------
+    >>> def export(event, writer):
+    >>>     def lines():
+    >>>         for item in query_items():
+    >>>             yield f'{item.id},{item.name}\\n'
+    >>>
+    >>>     stream_http_response(writer, 200, lines(), event=event, content_type='text/csv; charset=utf-8')
+    """
+
+    try:
+        if isinstance(payload, str) and content_type is None:
+            payload = simple_message(payload)
+
+        encoding = 'identity'
+        policy = compression or _default_compression
+
+        if content_type is not None:
+            # The format is imposed: only the encoding is negotiated.
+            acceptEncoding = event.header('Accept-Encoding') if negotiation is None and event else None
+
+            if negotiation is not None:
+                encoding = _compression_encoding(negotiation.encoding, event, policy)
+            elif acceptEncoding:
+                encoding = _negotiate_encoding(acceptEncoding, policy._orderedEncodings)
+
+            content, contentType = payload, content_type
+
+        else:
+            if negotiation is None and event:
+                try:
+                    negotiation = negotiate(event, custom_transformers = custom_transformers, compression = compression)
+
+                except HttpNotAcceptableError as err:
+                    status = err.status
+                    payload = simple_message(str(err))
+                    custom_transformers = None
+
+            if negotiation is not None:
+                encoding = _compression_encoding(negotiation.encoding, event, policy)
+                content, contentType = negotiation.transformer(payload)
+            else:
+                content, contentType = _negotiator(custom_transformers).transformer('*/*')(payload)
+
+        chunks = _byte_chunks([ content ] if isinstance(content, (str, bytes, bytearray, memoryview)) else content)
+
+        if encoding != 'identity' and (encoding not in policy.encodings or not policy.is_compressible(contentType)):
+            encoding = 'identity'
+
+        head: typing.List[typing.Union[bytes, memoryview]] = []
+
+        if encoding != 'identity':
+            head, headSize = _read_ahead(chunks, policy.min_size)
+
+            if headSize < policy.min_size:
+                encoding = 'identity'
+
+        headers = {
+            'Content-Type': contentType,
+            **(extra_headers if extra_headers else {})
+        }
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        writer.write(json.dumps({ 'statusCode': status, 'headers': headers }, separators = (',', ':')).encode('utf-8'))
+        writer.write(_stream_delimiter)
+
+        if encoding == 'identity':
+            for chunk in itertools.chain(head, chunks):
+                if _size(chunk):
+                    writer.write(chunk)
+        else:
+            compressor = policy._compressor(encoding)
+
+            for chunk in itertools.chain(head, chunks):
+                # Flushing makes each chunk reach the client as soon as it is produced, at the expense of a slightly lower compression ratio.
+                compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+                if compressed:
+                    writer.write(compressed)
+
+            writer.write(compressor.flush())
+
+    finally:
+        writer.close()
+
 
-        Examples
-        --------
-        >>> raise HttpMisdirectedRequestError()                        
-        """
-        
-        httpStatus = HTTPStatus.MISDIRECTED_REQUEST
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
+class _RouteNode():
+    __slots__ = ('static', 'parameters', 'handlers')
 
-class HttpUnprocessableEntityError(HttpClientError):
-    """
-    Error that represents a HTTP response status 422 "Unprocessable entity".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
-        """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+    def __init__(self) -> None:
+        self.static: typing.Dict[str, _RouteNode] = {}
+        self.parameters: typing.List[typing.Tuple[str, str, _RouteNode]] = []
+        self.handlers: typing.Dict[str, typing.Callable[..., typing.Any]] = {}
 
-        Examples
-        --------
-        >>> raise HttpUnprocessableEntityError()                         
-        """
-        
-        httpStatus = HTTPStatus.UNPROCESSABLE_ENTITY
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
 
-class HttpLockedError(HttpClientError):
+class Router():
     """
-    Error that represents a HTTP response status 423 "Locked".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
-        """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+    Dispatcher of API calls to handlers according to their HTTP method and path.
 
-        Examples
-        --------
-        >>> raise HttpLockedError()                        
-        """
-        
-        httpStatus = HTTPStatus.LOCKED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
+    Route templates are made of static segments and of parameters segments ``{name}`` or ``{name:type}``, the type being one of
+    :attr:`converters`. Templates are compiled into a segment trie when routes are added, usually at import time: resolving a path
+    costs a lookup per segment whatever the number of routes. Static segments take precedence over parameters.
 
-class HttpFailedDependencyError(HttpClientError):
-    """
-    Error that represents a HTTP response status 424 "Failed dependency".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
-        """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+    Route handlers return the payload of the response, so that :meth:`dispatch` can be wrapped by :meth:`Pipeline.wrap` as well.
 
-        Examples
-        --------
-        >>> raise HttpFailedDependencyError()                          
-        """
-        
-        httpStatus = HTTPStatus.FAILED_DEPENDENCY
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
+    Examples
+    --------
+    >>> router = Router()
+    >>>
+    >>> @router.route('/projects/{project_id:int}/modules', methods=('GET',))
+    >>> def list_modules(event, project_id):
+    >>>     return list_project_modules(project_id)
+    >>>
+    >>> def lambda_handler(raw_event, context):
+    >>>     event = LambdaProxyEvent(raw_event)
+    >>>
+    >>>     try:
+    >>>         return build_http_response(200, router.dispatch(event), event=event)
+    >>>
+    >>>     except HttpClientError as err:
+    >>>         return build_http_client_error_response(err, event=event) # 404 and 405 (with Allow header) end up here
+    """
 
-class HttpUpgradeRequiredError(HttpClientError):
+    converters: typing.Dict[str, typing.Callable[[str], typing.Any]] = {
+        'str': str,
+        'int': int,
+        'float': float
+    }
     """
-    Error that represents a HTTP response status 426 "Upgrade required".
+    dict : The types path parameters can be converted to. Keys: type names as used in templates. Values: conversion functions raising ``ValueError`` on bad input.
     """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
-        """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
 
-        Examples
-        --------
-        >>> raise HttpUpgradeRequiredError()                          
-        """
-        
-        httpStatus = HTTPStatus.UPGRADE_REQUIRED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
+    _parameterPattern = re.compile(r'^\{([A-Za-z_][A-Za-z0-9_]*)(?::([A-Za-z_][A-Za-z0-9_]*))?\}$')
 
-class HttpPreconditionRequiredError(HttpClientError):
-    """
-    Error that represents a HTTP response status 428 "Precondition required".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+    def __init__(self) -> None:
+        self._root = _RouteNode()
+
+
+    def add(self, methods: typing.Union[str, typing.Iterable[str]], template: str, handler: typing.Callable[..., typing.Any]) -> None:
         """
+        Adds a route.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        methods : str or iterable
+            The HTTP method or methods handled by ``handler``.
+        template : str
+            The route template, such as ``/projects/{project_id:int}/modules``.
+        handler : callable
+            The function called by :meth:`dispatch` with the event and the path parameters as keyword arguments, returning the payload of the response.
+
+        Raises
+        ------
+        ValueError
+            If the template is malformed, refers to an unknown type, or if the route is already defined for one of the methods.
 
         Examples
         --------
-        >>> raise HttpPreconditionRequiredError()                     
+        >>> router.add(('PUT', 'PATCH'), '/projects/{project_id:int}', update_project)
         """
-        
-        httpStatus = HTTPStatus.PRECONDITION_REQUIRED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
 
-class HttpTooManyRequestsError(HttpClientError):
-    """
-    Error that represents a HTTP response status 429 "Too many requests".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+        node = self._root
+        names = set()
+
+        for segment in _split_path(template):
+            match = Router._parameterPattern.match(segment)
+
+            if match is None:
+                if '{' in segment or '}' in segment:
+                    raise ValueError(f'Malformed route template segment: {segment}.')
+
+                node = node.static.setdefault(segment, _RouteNode())
+                continue
+
+            name, converter = match.group(1), match.group(2) or 'str'
+
+            if converter not in self.converters:
+                raise ValueError(f'Unknown route parameter type: {converter}.')
+
+            if name in names:
+                raise ValueError(f'Duplicate route parameter: {name}.')
+
+            names.add(name)
+
+            child = next((c for n, t, c in node.parameters if n == name and t == converter), None)
+
+            if child is None:
+                child = _RouteNode()
+                node.parameters.append((name, converter, child))
+
+            node = child
+
+        for method in ([ methods ] if isinstance(methods, str) else methods):
+            if method.upper() in node.handlers:
+                raise ValueError(f'Route already defined: {method.upper()} {template}.')
+
+            node.handlers[method.upper()] = handler
+
+
+    def route(self, template: str, methods: typing.Iterable[str] = ('GET',)) -> typing.Callable[[typing.Callable[..., typing.Any]], typing.Callable[..., typing.Any]]:
         """
+        Decorator that adds a route to the decorated handler. 
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        template : str
+            The route template, such as ``/projects/{project_id:int}/modules``.
+        methods : iterable
+            Optional HTTP methods handled by the decorated function. ``('GET',)`` if omitted.
 
-        Examples
-        --------
-        >>> raise HttpTooManyRequestsError()                        
+        Returns
+        -------
+        callable
+            The decorator, that returns the decorated handler unchanged.
+
+        Raises
+        ------
+        ValueError
+            As :meth:`add` does.
         """
-        
-        httpStatus = HTTPStatus.TOO_MANY_REQUESTS
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
-        
 
-class HttpRequestHeaderFieldsTooLargeError(HttpClientError):
-    """
-    Error that represents a HTTP response status 431 "Request header fields too large".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+        def decorator(handler: typing.Callable[..., typing.Any]) -> typing.Callable[..., typing.Any]:
+            self.add(methods, template, handler)
+            return handler
+
+        return decorator
+
+
+    def resolve(self, method: str, path: typing.Sequence[str]) -> typing.Tuple[typing.Callable[..., typing.Any], typing.Dict[str, typing.Any]]:
         """
+        Returns the handler of the route matching the given method and path, along with the converted path parameters.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        method : str
+            The HTTP method.
+        path : sequence
+            The path segments, as returned by :meth:`LambdaProxyEvent.query_path`.
 
-        Examples
-        --------
-        >>> raise HttpRequestHeaderFieldsTooLargeError()               
+        Returns
+        -------
+        tuple
+            The handler and the path parameters as a ``dict``.
+
+        Raises
+        ------
+        HttpNotFoundError
+            If no route matches the path.
+        HttpMethodNotAllowedError
+            If routes match the path but none of them for this method. Their methods are given as ``allowed_methods``.
         """
-        
-        httpStatus = HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)           
 
+        method = method.upper()
+        allowed: typing.Set[str] = set()
+        found = self._resolve(self._root, path, 0, method, {}, allowed)
 
-class HttpInternalServerError(HttpServerError):
-    """
-    Error that represents a HTTP response status 500 "Internal server error".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+        if found is not None:
+            return found
+
+        if allowed:
+            raise HttpMethodNotAllowedError(allowed_methods = sorted(allowed))
+
+        raise HttpNotFoundError()
+
+
+    def dispatch(self, event: LambdaProxyEvent) -> typing.Any:
         """
+        Calls the handler of the route matching the API call with the event and the path parameters as keyword arguments.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        event : LambdaProxyEvent
+            The API call event.
 
-        Examples
-        --------
-        >>> raise HttpInternalServerError()               
+        Returns
+        -------
+        any
+            Whatever the handler returns, normally the payload of the response.
+
+        Raises
+        ------
+        HttpNotFoundError
+            If no route matches the path.
+        HttpMethodNotAllowedError
+            If routes match the path but none of them for this method.
         """
-        
-        httpStatus = HTTPStatus.INTERNAL_SERVER_ERROR
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)       
 
+        handler, parameters = self.resolve(event.http_method(), event.query_path())
 
-class HttpNotImplementedError(HttpServerError):
+        return handler(event, **parameters)
+
+
+    def _resolve(
+            self,
+            node: _RouteNode,
+            path: typing.Sequence[str],
+            depth: int,
+            method: str,
+            parameters: typing.Dict[str, typing.Any],
+            allowed: typing.Set[str]
+        ) -> typing.Optional[typing.Tuple[typing.Callable[..., typing.Any], typing.Dict[str, typing.Any]]]:
+
+        if depth == len(path):
+            if method in node.handlers:
+                return node.handlers[method], dict(parameters)
+
+            allowed.update(node.handlers.keys())
+            return None
+
+        segment = path[depth]
+        child = node.static.get(segment)
+
+        if child is not None:
+            found = self._resolve(child, path, depth + 1, method, parameters, allowed)
+
+            if found is not None:
+                return found
+
+        for name, converter, child in node.parameters:
+            try:
+                parameters[name] = self.converters[converter](segment)
+
+            except ValueError:
+                continue
+
+            found = self._resolve(child, path, depth + 1, method, parameters, allowed)
+            del parameters[name]
+
+            if found is not None:
+                return found
+
+        return None
+
+
+def _split_path(path: str) -> typing.Tuple[str, ...]:
+    return tuple(segment for segment in path.split('/') if segment)
+
+
+class RequestState():
     """
-    Error that represents a HTTP response status 501 "Not implemented".
+    State of an API call going through a :class:`Pipeline`, shared by its stages.
     """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    __slots__ = ('event', 'context', 'status', 'options', 'values')
+
+    def __init__(self, event: LambdaProxyEvent, context: typing.Any, status: int) -> None:
         """
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        event : LambdaProxyEvent
+            The API call event.
+        context : any
+            The parameter ``context`` received by the AWS Lambda function handler.
+        status : int
+            The HTTP status of the response to build from the payload returned by the handler.
+        """
 
-        Examples
-        --------
-        >>> raise HttpNotImplementedError()               
+        self.event = event
+        """
+        LambdaProxyEvent : The API call event.
         """
-        
-        httpStatus = HTTPStatus.NOT_IMPLEMENTED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        self.context = context
+        """
+        any : The parameter ``context`` received by the AWS Lambda function handler.
+        """
 
-class HttpBadGatewayError(HttpServerError):
-    """
-    Error that represents a HTTP response status 502 "Bad gateway".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+        self.status = status
+        """
+        int : The HTTP status of the response to build from the payload returned by the handler.
         """
-        Parameters
-        ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
 
-        Examples
-        --------
-        >>> raise HttpBadGatewayError()               
+        self.options: typing.Dict[str, typing.Any] = { 'event': event }
+        """
+        dict : The keyword arguments passed to :func:`build_http_response` and to the error responses builders.
+        """
+
+        self.values: typing.Dict[str, typing.Any] = {}
+        """
+        dict : Free storage for the stages.
         """
-        
-        httpStatus = HTTPStatus.BAD_GATEWAY
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
 
-class HttpRServiceUnavailableError(HttpServerError):
+class Stage():
     """
-    Error that represents a HTTP response status 503 "Service unavailable".
+    Base class of the stages of a :class:`Pipeline`.
+
+    Stages override any of the :meth:`before`, :meth:`after` and :meth:`on_error` hooks. Hooks that are not overridden are not called at all.
     """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def before(self, state: RequestState) -> typing.Optional[dict]:
         """
+        Called before the handler, in the order of the stages.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        state : RequestState
+            The state of the API call.
 
-        Examples
-        --------
-        >>> raise HttpRServiceUnavailableError()               
+        Returns
+        -------
+        dict
+            ``None`` to go on, or a response to return without calling the handler nor the hooks of the following stages.
         """
-        
-        httpStatus = HTTPStatus.SERVICE_UNAVAILABLE
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        return None
 
-class HttpGatewayTimeoutError(HttpServerError):
-    """
-    Error that represents a HTTP response status 504 "GatewayTimeout".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def after(self, state: RequestState, response: dict) -> dict:
         """
+        Called with the response, in the reverse order of the stages whose ``before`` hook was reached.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        state : RequestState
+            The state of the API call.
+        response : dict
+            The response built so far.
 
-        Examples
-        --------
-        >>> raise HttpGatewayTimeoutError()               
+        Returns
+        -------
+        dict
+            The response to pass to the next hook.
         """
-        
-        httpStatus = HTTPStatus.GATEWAY_TIMEOUT
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        return response
 
-class HttpVersionNotSupportedError(HttpServerError):
-    """
-    Error that represents a HTTP response status 505 "HTTP version not supported".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def on_error(self, state: RequestState, error: Exception) -> typing.Optional[dict]:
         """
+        Called should a ``before`` hook or the handler raise, in the reverse order of the stages.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        state : RequestState
+            The state of the API call.
+        error : Exception
+            The raised exception.
 
-        Examples
-        --------
-        >>> raise HttpVersionNotSupportedError()               
+        Returns
+        -------
+        dict
+            ``None`` to let the following hooks handle the error, or the response to return. The error is raised again if no hook handles it.
         """
-        
-        httpStatus = HTTPStatus.HTTP_VERSION_NOT_SUPPORTED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        return None
 
-class HttpVarianteAlsoNegociatesError(HttpServerError):
+
+class Pipeline():
     """
-    Error that represents a HTTP response status 506 "Variant also negociates".
+    Chain of stages around the handlers of API calls.
+
+    The hooks of the stages are flattened into call sequences when the pipeline is built, usually at import time: nothing is created
+    per API call but the :class:`RequestState`. Handlers wrapped by :meth:`wrap` take a :class:`LambdaProxyEvent` and return the payload
+    of the response, or raise :class:`HttpError`. They can be :meth:`Router.dispatch`, the route handlers returning payloads as well.
+
+    Examples
+    --------
+    >>> pipeline = Pipeline(
+    >>>     TimingStage(),
+    >>>     CorsStage(allow_origin='*'),
+    >>>     ErrorMappingStage(),
+    >>>     NegotiationStage(custom_transformers=negotiator),
+    >>>     CompressionStage()
+    >>> )
+    >>>
+    >>> def get_report(event):
+    >>>     return load_report(event.query_parameters().get_int('id', required=True))
+    >>>
+    >>> lambda_handler = pipeline.wrap(get_report)
     """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def __init__(self, *stages: Stage) -> None:
         """
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        *stages : Stage
+            The stages, outermost first.
+        """
 
-        Examples
-        --------
-        >>> raise HttpVarianteAlsoNegociatesError()               
+        self.stages: typing.Tuple[Stage, ...] = stages
+        """
+        tuple : The stages, outermost first.
         """
-        
-        httpStatus = HTTPStatus.VARIANT_ALSO_NEGOTIATES
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        self._befores = tuple((i, s.before) for i, s in enumerate(stages) if type(s).before is not Stage.before)
+        self._afters = tuple((i, s.after) for i, s in reversed(tuple(enumerate(stages))) if type(s).after is not Stage.after)
+        self._onErrors = tuple(s.on_error for s in reversed(stages) if type(s).on_error is not Stage.on_error)
 
-class HttpInsufficientStorageError(HttpServerError):
-    """
-    Error that represents a HTTP response status 507 "Insufficient storage".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def wrap(self, handler: typing.Callable[[LambdaProxyEvent], typing.Any], status: int = 200) -> typing.Callable[[typing.Any, typing.Any], dict]:
         """
+        Returns a Lambda handler running the API calls through the pipeline.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        handler : callable
+            Function taking a :class:`LambdaProxyEvent` and returning the payload of the response.
+        status : int
+            Optional HTTP status of the responses built from the payloads. ``200`` if omitted.
 
-        Examples
-        --------
-        >>> raise HttpInsufficientStorageError()               
+        Returns
+        -------
+        callable
+            The Lambda handler, taking the ``event`` and ``context`` parameters.
         """
-        
-        httpStatus = HTTPStatus.INSUFFICIENT_STORAGE
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        @functools.wraps(handler)
+        def lambda_handler(raw_event: typing.Any, context: typing.Any) -> dict:
+            return self.run(handler, raw_event, context, status)
 
-class HttpLoopDetectedError(HttpServerError):
-    """
-    Error that represents a HTTP response status 508 "Loop detected"".
-    """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+        return lambda_handler
+
+
+    def run(self, handler: typing.Callable[[LambdaProxyEvent], typing.Any], raw_event: typing.Any, context: typing.Any = None, status: int = 200) -> dict:
         """
+        Runs an API call through the pipeline.
+
+        There is no need to call this method directly normally: the Lambda handler returned by :meth:`wrap` does it for you.
+
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
+        handler : callable
+            Function taking a :class:`LambdaProxyEvent` and returning the payload of the response.
+        raw_event : dict or LambdaProxyEvent
+            The parameter ``event`` received by the AWS Lambda function handler.
+        context : any
+            Optional parameter ``context`` received by the AWS Lambda function handler.
+        status : int
+            Optional HTTP status of the response built from the payload. ``200`` if omitted.
 
-        Examples
-        --------
-        >>> raise HttpLoopDetectedError()               
+        Returns
+        -------
+        dict
+            The response to return to API Gateway.
         """
-        
-        httpStatus = HTTPStatus.LOOP_DETECTED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        state = RequestState(raw_event if isinstance(raw_event, LambdaProxyEvent) else LambdaProxyEvent(raw_event), context, status)
+        response = None
+        reached = len(self.stages)
 
-class HttpNotExtendedError(HttpServerError):
+        try:
+            # Only the stages reached by the call get their after hook: a response returned by a before hook skips the inner stages.
+            for index, before in self._befores:
+                reached = index + 1
+                response = before(state)
+
+                if response is not None:
+                    break
+
+            else:
+                reached = len(self.stages)
+
+            if response is None:
+                response = build_http_response(state.status, handler(state.event), **state.options)
+
+        except Exception as err:
+            for onError in self._onErrors:
+                response = onError(state, err)
+
+                if response is not None:
+                    break
+
+            if response is None:
+                raise
+
+        for index, after in self._afters:
+            if index < reached:
+                response = after(state, response)
+
+        return response
+
+
+class NegotiationStage(Stage):
     """
-    Error that represents a HTTP response status 510 "Not extended".
+    Stage negotiating the response format before the handler is called (see :func:`negotiate`).
+
+    Handlers can read the result from ``event`` with :func:`negotiate` at no cost. :class:`HttpNotAcceptableError` is raised before the handler is called.
     """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def __init__(self, custom_transformers: typing.Optional[typing.Union[typing.Dict[str, Transformer], ContentNegotiator]] = None) -> None:
         """
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
-
-        Examples
-        --------
-        >>> raise HttpNotExtendedError()               
+        custom_transformers : dict or ContentNegotiator
+            Optional transformers, as for :func:`determine_content_type`. A ``dict`` is compiled into a :class:`ContentNegotiator` once.
         """
-        
-        httpStatus = HTTPStatus.NOT_EXTENDED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)  
 
+        self._customTransformers = _negotiator(custom_transformers) if custom_transformers is not None else None
 
-class HttpNetworkAuthenticationRequiredError(HttpServerError):
+
+    def before(self, state: RequestState) -> typing.Optional[dict]:
+        state.options['custom_transformers'] = self._customTransformers
+        state.options['negotiation'] = negotiate(state.event, custom_transformers = self._customTransformers)
+
+        return None
+
+
+class CompressionStage(Stage):
     """
-    Error that represents a HTTP response status 511 "Network authentication required".
+    Stage applying a :class:`CompressionPolicy` to the responses, including the error responses.
     """
-    
-    def __init__(self, msg: typing.Optional[str] = None):
+
+    def __init__(self, policy: typing.Optional[CompressionPolicy] = None) -> None:
         """
         Parameters
         ----------
-        msg : str
-            Explanatory message. A default message is used if omitted.
-
-        Examples
-        --------
-        >>> raise HttpNetworkAuthenticationRequiredError()               
+        policy : CompressionPolicy
+            Optional compression settings. Default settings of :func:`build_http_response` if omitted.
         """
-        
-        httpStatus = HTTPStatus.NETWORK_AUTHENTICATION_REQUIRED
-        super().__init__(httpStatus.value, msg if msg else httpStatus.phrase)         
-        
 
-def simple_message(message: str) -> typing.Dict[str, str]:
-    """
-    Turns a ``str`` into a ``dict`` payload having "Message" as a key and the passed string as a value.
+        self._policy = policy or _default_compression
 
-    :func:`build_http_response` uses this function to build response payloads from strings. 
 
-    There is no need to call :func:`simple_message` directly normally, although it may not cause any harm.
+    def before(self, state: RequestState) -> typing.Optional[dict]:
+        state.options['compression'] = self._policy
 
-    Parameters
-    ----------
-    message : str
-        The string to turn into a message payload.    
+        return None
 
-    Returns
-    -------
-    dict
-        Payload built from the message string.     
 
-    Examples
-    --------
-    >>> simple_message("This is fine!")
-    {'Message': 'This is fine!'}
+class ErrorMappingStage(Stage):
     """
+    Stage turning errors into responses with :func:`build_http_client_error_response` and :func:`build_http_server_error_response`.
 
-    return {
-         "Message": message
-    }
+    Errors that are not :class:`HttpError` are answered as :class:`HttpInternalServerError`, their stack trace being logged.
+    """
 
+    def __init__(self, *, log_client_errors: bool = True, log_server_errors: bool = True, problem: bool = False) -> None:
+        """
+        Parameters
+        ----------
+        log_client_errors : bool
+            Optional flag that defines whether client errors should be logged. ``True`` if omitted.
+        log_server_errors : bool
+            Optional flag that defines whether server errors should be logged. ``True`` if omitted.
+        problem : bool
+            Optional flag that defines whether errors should be answered as ``application/problem+json``. ``False`` if omitted.
+        """
 
-def determine_content_type(event: LambdaProxyEvent, *, custom_transformers: typing.Optional[typing.Dict[str, typing.Callable[[dict], typing.Tuple[str, str]]]] = None) -> str:
-    """
-    Determines the ``Content-Type`` of the response to be sent based on the ``Accept`` header of the request.
+        self._logClientErrors = log_client_errors
+        self._logServerErrors = log_server_errors
+        self._problem = problem
 
-    ``application/json`` is the only ``Content-Type`` transformer available by default. It is mapped to the ``Accept`` values
-    ``*/*``, ``application/*`` and ``application/json``. Any other ``Accept`` value leads to a :exc:`HttpNotAcceptableError` unless
-    ``custom_transformers`` map this ``Accept`` value to an appropriate transformer.
 
-    Preferences are handled by :func:`LambdaProxyEvent.header_sorted_preferences`. Should no ``Accept`` header be given, ``*/*`` is assumed.
+    def on_error(self, state: RequestState, error: Exception) -> typing.Optional[dict]:
+        if isinstance(error, HttpClientError):
+            return build_http_client_error_response(error, log = self._logClientErrors, problem = self._problem, **state.options)
 
-    Parameters
-    ----------
-    event : LambdaProxyEvent
-        The API call event.    
-    custom_transformers : dict
-        Optional mapping of ``Content-Type`` to transformer functions returning (the content as ``Content-Type``, the ``Content-Type`` with encoding as ``str``).
+        if isinstance(error, HttpServerError):
+            return build_http_server_error_response(error, log = self._logServerErrors, problem = self._problem, **state.options)
 
-    Returns
-    -------
-    str
-        The ``Content-Type`` of the response.     
+        return build_http_server_error_response(HttpInternalServerError(), log = self._logServerErrors, problem = self._problem, **state.options)
 
-    Raises
-    ------
-    HttpNotAcceptableError
-        If no transformer meets the criteria of the ``Accept`` header.
-            
-    Examples
-    --------
-    Given an API call that was made with a ``Accept: */*`` header, with no custom format handled by the application:
 
-    >>> determine_content_type(event)
-    'application/json'
+class CorsStage(Stage):
+    """
+    Stage adding the `CORS <https://developer.mozilla.org/en-US/docs/Web/HTTP/CORS>`_ headers to the responses, and answering preflight requests.
+    """
 
-    Given an API call that was made with a ``Accept: text/csv`` header, with an application handling ``text/csv`` and 
-    ``application/xml`` on top of the default ``application/json``:
+    def __init__(
+            self, *,
+            allow_origin: typing.Union[str, typing.Iterable[str]] = '*',
+            allow_methods: typing.Iterable[str] = ('GET', 'HEAD', 'PUT', 'PATCH', 'POST', 'DELETE'),
+            allow_headers: typing.Iterable[str] = (),
+            expose_headers: typing.Iterable[str] = (),
+            allow_credentials: bool = False,
+            max_age: typing.Optional[int] = None
+        ) -> None:
+        """
+        Parameters
+        ----------
+        allow_origin : str or iterable
+            Optional origin allowed to call the API, or origins among which the one of the caller is echoed. ``*`` if omitted.
+        allow_methods : iterable
+            Optional methods returned to preflight requests.
+        allow_headers : iterable
+            Optional headers returned to preflight requests. The requested ones are echoed if empty.
+        expose_headers : iterable
+            Optional response headers exposed to the caller.
+        allow_credentials : bool
+            Optional flag that defines whether credentials are allowed. ``False`` if omitted.
+        max_age : int
+            Optional duration in seconds preflight requests results can be cached for.
+        """
 
-    >>> def csv_transformer(payload: dict) -> typing.Tuple[str, str]:
-    >>>     # ... code that converts the json payload to csv and stores it into a variable called csvContent ...
-    >>>     return csvContent, 'text/csv; charset=utf-8'
-    >>>    
-    >>> def xml_transformer(payload: dict) -> typing.Tuple[str, str]:
-    >>>     # ... code that converts the json payload to xml and stores it into a variable called xmlContent ...
-    >>>     return xmlContent, 'application/xml; charset=utf-8'
-    >>> 
-    >>> custom_transformers = {
-    >>>     'text/csv': csv_transformer,
-    >>>     'application/xml': xml_transformer
-    >>> }
-    >>>
-    >>> determine_content_type(event, custom_transformers=custom_transformers)
-    'text/csv'
+        self._origins = None if isinstance(allow_origin, str) else frozenset(allow_origin)
+        self._headers = {}
 
-    Notes
-    -----
-    It is a good idea to call this function at the very beginning of your Lambda handler. This way you can make sure that
-    the accepted ``Content-Type`` matches what your API is capable of returning, and return an :exc:`~HttpNotAcceptableError` 
-    response without doing any unnecessary processing otherwise.
+        if isinstance(allow_origin, str):
+            self._headers['Access-Control-Allow-Origin'] = allow_origin
 
-    The example below only accepts ``*/*``, ``application/*`` and ``application/json``, all mapped to ``application/json`` by default. 
+        if allow_credentials:
+            self._headers['Access-Control-Allow-Credentials'] = 'true'
 
-    >>> def lambda_handler(raw_event, context):
-    >>>     import awsmate.apigateway as amag
-    >>>
-    >>>     event = amag.LambdaProxyEvent(raw_event) 
-    >>>
-    >>>     try:
-    >>>         amag.determine_content_type(event)
-    >>>
-    >>>         # Everything you need to do
-    >>>
-    >>>         return amag.build_http_response(200, "OK", event=event)
-    >>>
-    >>>     except amag.HttpClientError as err:
-    >>>         return amag.build_http_client_error_response(err, event=event) # We will end up here should HttpNotAcceptableError be raised by determine_content_type()
-    >>>     except Exception:
-    >>>         return amag.build_http_server_error_response(amag.HttpInternalServerError(), event=event)
-    """
+        if expose_headers:
+            self._headers['Access-Control-Expose-Headers'] = ', '.join(expose_headers)
+
+        self._preflightHeaders = { 'Access-Control-Allow-Methods': ', '.join(allow_methods) }
+
+        if allow_headers:
+            self._preflightHeaders['Access-Control-Allow-Headers'] = ', '.join(allow_headers)
+
+        if max_age is not None:
+            self._preflightHeaders['Access-Control-Max-Age'] = str(max_age)
 
-    acceptedMimeTypes = event.header_sorted_preferences('Accept')
 
-    if len(acceptedMimeTypes) == 0:
-        acceptedMimeTypes = ( '*/*', None )
+    def before(self, state: RequestState) -> typing.Optional[dict]:
+        headers = dict(self._headers)
 
-    contentType = None
+        if self._origins is not None:
+            origin = state.event.header('Origin')
+            headers['Vary'] = 'Origin'
 
-    if custom_transformers is None:
-        custom_transformers = {}
-        
-    for pref in acceptedMimeTypes:
-        if pref in _basic_transformers or pref in custom_transformers:
-            contentType = pref
-            break
+            if origin in self._origins:
+                headers['Access-Control-Allow-Origin'] = origin
 
-    if contentType is None:
-        availableFormats = ', '.join(
-            ( k for k in sorted(set(list(_basic_transformers.keys()) + list(custom_transformers.keys()))) if not k.endswith('*') )
-        )
+        state.options['extra_headers'] = { **headers, **(state.options.get('extra_headers') or {}) }
 
-        raise HttpNotAcceptableError(
-            f"None of the formats specified in the Accept header are available. Available formats are: {availableFormats}."
-        )
+        if state.event.http_method().upper() == 'OPTIONS' and state.event.has_header('Access-Control-Request-Method'):
+            preflightHeaders = { **state.options['extra_headers'], **self._preflightHeaders }
+
+            if 'Access-Control-Allow-Headers' not in preflightHeaders and state.event.has_header('Access-Control-Request-Headers'):
+                preflightHeaders['Access-Control-Allow-Headers'] = state.event.header('Access-Control-Request-Headers')
 
-    return contentType
+            return {
+                'isBase64Encoded': False,
+                'statusCode': HTTPStatus.NO_CONTENT.value,
+                'body': '',
+                'headers': preflightHeaders
+            }
 
+        return None
 
-def is_binary(content_type: str) -> bool:
+
+class TimingStage(Stage):
+    """
+    Stage measuring the processing duration of the API calls, returned as the ``Server-Timing`` header and optionally observed as a metric.
     """
-    Determines whether the given ``Content-Type`` is binary. 
 
-    :func:`build_http_response` uses this function to determine if the API Gateway requires a ``base64`` encoding prior returning the content. 
-    All types but ``text/*``, ``application/xml`` and ``application/json`` are considered binary. 
+    def __init__(self, *, metrics: typing.Any = None, metric_name: str = 'HandlerLatency', header: bool = True) -> None:
+        """
+        Parameters
+        ----------
+        metrics : awsmate.metrics.MetricsAggregator
+            Optional aggregator the durations are observed by, in milliseconds.
+        metric_name : str
+            Optional metric name. ``HandlerLatency`` if omitted.
+        header : bool
+            Optional flag that defines whether the ``Server-Timing`` header should be returned. ``True`` if omitted.
+        """
 
-    There is no need to call :func:`is_binary` directly normally, although it may not cause any harm.    
+        self._metrics = metrics
+        self._metricName = metric_name
+        self._header = header
 
-    Parameters
-    ----------
-    content_type : str
-        The ``Content-Type`` to assess.    
 
-    Returns
-    -------
-    bool
-        Whether the ``Content-Type`` is binary.     
-        
-    Examples
-    --------
-    >>> is_binary('image/jpeg')
-    True
-    """
-     
-    splitted = content_type.split('/')
+    def before(self, state: RequestState) -> typing.Optional[dict]:
+        state.values['timing.start'] = time.perf_counter()
 
-    if len(splitted) == 1:
-        splitted.append('*')
+        return None
 
-    mainType = splitted[0]
-    subType = splitted[1].split(';')[0]
 
-    return (
-        mainType not in ('text', 'application') or (mainType == 'application' and subType not in ('json', 'xml'))
-    )
+    def after(self, state: RequestState, response: dict) -> dict:
+        start = state.values.get('timing.start')
 
+        if start is not None:
+            duration = (time.perf_counter() - start) * 1000
 
-def json_transformer(payload: dict) -> typing.Tuple[str, str]:
-    """
-    Transformer used by :func:`build_http_response` to build ``application/json`` responses.
+            if self._header:
+                response['headers']['Server-Timing'] = f'app;dur={duration:.1f}'
 
-    There is no need to this function directly normally, although it may not cause any harm.    
+            if self._metrics is not None:
+                self._metrics.observe(self._metricName, duration, 'Milliseconds')
 
-    Parameters
-    ----------
-    payload : dict
-        The payload to convert to ``application/json``.    
+        return response
 
-    Returns
-    -------
-    tuple
-        The ``application/json`` payload as a ``str``, the ``Content-Type`` with its encoding specifier.      
-        
-    Examples
-    --------
-    >>> json_transformer({'TopThreeBibs': (751,25,372)})
-    ('{\\n  "TopThreeBibs": [\\n    751,\\n    25,\\n    372\\n  ]\\n}', 'application/json; charset=utf-8')
+
+class ResponseCache():
     """
-    
-    return json.dumps(payload, indent = 2), 'application/json; charset=utf-8'
+    Bounded least recently used cache of responses, living as long as the Lambda execution environment.
 
+    Responses are stored as built, compressed bodies included, and expire after a time to live. Both storing and reading copy the response
+    ``dict`` and its headers, so that later stages can modify the response they are given. Bodies are never copied.
+    """
 
-_basic_transformers = {
-    '*/*': json_transformer,
-    'application/*': json_transformer,
-    'application/json': json_transformer
-}
+    def __init__(self, max_entries: int = 256, ttl: float = 60) -> None:
+        """
+        Parameters
+        ----------
+        max_entries : int
+            Optional maximum number of cached responses. ``256`` if omitted.
+        ttl : float
+            Optional time to live of the cached responses, in seconds. ``60`` if omitted.
 
+        Raises
+        ------
+        ValueError
+            If ``max_entries`` is not positive.
+        """
 
-def build_http_response(
-        status: int, 
-        payload: typing.Union[dict, str], *, 
-        event: typing.Optional[LambdaProxyEvent] = None, 
-        custom_transformers: typing.Optional[typing.Dict[str, typing.Callable[[dict], typing.Tuple[str, str]]]] = None,
-        extra_headers: typing.Optional[typing.Dict[str, str]] = None
-    ) -> dict:
-    """
-    Builds the HTTP response the Lambda handler has to return to API Gateway.
+        if max_entries < 1:
+            raise ValueError(f'Invalid maximum number of entries: {max_entries}.')
 
-    Should the ``Accept`` header of the API call lead to a :exc:`HttpNotAcceptableError`, an error message is returned instead
-    of the passed payload and the status code is set accordingly. 
-    
-    This function handles the ``Accept-Encoding: gzip`` header of the API call for you. It also sets the base-64 flag of the response to ``True`` if
-    the returned ``Content-Type`` is binary.
+        self._maxEntries = max_entries
+        self._ttl = ttl
+        self._entries: 'collections.OrderedDict[typing.Hashable, typing.Tuple[float, dict]]' = collections.OrderedDict()
 
-    Parameters
-    ----------
-    status : int
-        The HTTP status code.  
-    payload : dict or str
-        The payload that constitutes the body of the response. Should it be a ``str``, it will first be transformed by :func:`simple_message`.
-    event : LambdaProxyEvent
-        Optional wrapper of the event the Lambda handler receives from the API Gateway.
-    custom_transformers : dict
-        Optional mapping of ``Content-Type`` to transformer functions returning (the content as ``Content-Type``, the ``Content-Type`` with encoding as ``str``).
-    extra_headers : dict
-        Optional extra headers to return. For example : ``{ 'Access-Control-Allow-Origin': '*' }`` to handle CORS.   
 
-    Returns
-    -------
-    dict
-        The HTTP response to return to API Gateway.     
-      
-    Examples
-    --------
-    >>> payload = { 
-    >>>     'someKey': 'someVal' 
-    >>> }
-    >>>
-    >>> event = None # Use defaults: no specific headers ('Accept: */*' assumed), no body, no URL parameters
-    >>>
-    >>> custom_transformers = None # 'application/json' transformer is built-in and is bound to 'Accept: */*'. We don't need anything else here.
-    >>>
-    >>> extra_headers = {
-    >>>     'Access-Control-Allow-Origin': '*' # Deals with CORS provided HTTP OPTIONS is dealt with on API Gateway side.
-    >>> }
-    >>>
-    >>> build_http_response(200, payload, event=event, custom_transformers=custom_transformers, extra_headers=extra_headers)
-    {'isBase64Encoded': False, 'statusCode': 200, 'body': '{\\n  "someKey": "someVal"\\n}', 'headers': {'Content-Type': 'application/json; charset=utf-8', 'Access-Control-Allow-Origin': '*'}}
+    def __len__(self) -> int:
+        return len(self._entries)
 
-    See Also
-    --------
-    determine_content_type : more details on the use of the optional parameter ``custom_transformers``.
-    """
 
-    if isinstance(payload, str):
-        payload = simple_message(payload)
+    def get(self, key: typing.Hashable) -> typing.Optional[dict]:
+        """
+        Returns a copy of the response cached under the given key.
 
-    useGzip = False
-    contentTypeTransformers = _basic_transformers
+        Parameters
+        ----------
+        key : hashable
+            The cache key.
 
-    if event:
-        for pref in event.header_sorted_preferences('Accept-Encoding'):
-            if pref == 'gzip':
-                useGzip = True
-                break
-            elif pref == 'identity':
-                break
+        Returns
+        -------
+        dict
+            The response, or ``None`` if no response is cached under the key or if it expired.
+        """
 
-        if custom_transformers is not None:
-            contentTypeTransformers = {
-                **contentTypeTransformers,
-                **custom_transformers
-            }
+        entry = self._entries.get(key)
 
-        try:
-            selectedMimeType = determine_content_type(event, custom_transformers = custom_transformers)
-            stringifiedPayload, contentType = contentTypeTransformers[selectedMimeType](payload)
+        if entry is None:
+            return None
 
-        except HttpNotAcceptableError as err:
-            status = err.status
-            useGzip = False
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
 
-            stringifiedPayload, contentType = contentTypeTransformers['*/*'](
-                simple_message(str(err))
-            )
+        self._entries.move_to_end(key)
 
-    else:
-        stringifiedPayload, contentType = contentTypeTransformers['*/*'](payload)
+        return { **entry[1], 'headers': dict(entry[1]['headers']) }
 
-    ret = {
-        'isBase64Encoded': useGzip or is_binary(contentType),
-        'statusCode': status,
-        'body': stringifiedPayload if not useGzip else base64.b64encode(gzip.compress(stringifiedPayload.encode('utf-8'))).decode('utf-8'),
-        'headers': {     
-            'Content-Type': contentType,
-            **(extra_headers if extra_headers else {})
-        }
-    }
 
-    if useGzip:
-        ret['headers']['Content-Encoding'] = 'gzip'
+    def put(self, key: typing.Hashable, response: dict) -> None:
+        """
+        Caches a copy of a response, evicting the least recently used one if the cache is full.
 
-    return ret
+        Parameters
+        ----------
+        key : hashable
+            The cache key.
+        response : dict
+            The response.
+        """
 
+        self._entries[key] = (time.monotonic() + self._ttl, { **response, 'headers': dict(response['headers']) })
+        self._entries.move_to_end(key)
 
-def build_http_server_error_response(
-        error: HttpServerError, *,
-        client_message: typing.Optional[str] = None,
-        log: bool = True,
-        **kwargs: typing.Any
-    ) -> dict:
+        if len(self._entries) > self._maxEntries:
+            self._entries.popitem(last = False)
+
+
+    def clear(self) -> None:
+        """
+        Removes all cached responses.
+        """
+
+        self._entries.clear()
+
+
+class CacheStage(Stage):
     """
-    Convenience function that builds an HTTP error 5XX response to be returned to API Gateway by the Lambda handler.
+    Stage answering the API calls from a :class:`ResponseCache`, without calling the handler, when an identical call was answered recently.
 
-    Unless specified otherwise, calling this function logs a stack trace of the error showing the status and the actual error message. 
-    This message is replaced by a client-oriented message in the HTTP response.
+    Calls are identical when they share the method, the path, the URL parameters, the negotiated media type and encoding, and the extra headers
+    set by the outer stages. Only responses of status 200 are cached. Calls sent with ``Cache-Control: no-cache`` are not answered from the cache,
+    but their response is cached.
 
-    Parameters
-    ----------
-    error : HttpServerError
-        Object representing the error. 
-    client_message : str
-        Optional client-oriented message. An english canned message is used if omitted.
-    log : bool
-        Optional flag that defines whether a stack trace should be logged. ``True`` if omitted.
-    **kwarg : any
-        Optional arguments to pass to :func:`build_http_response`
+    The stage must follow :class:`NegotiationStage` and :class:`CompressionStage` if any, and precede the stages whose ``after`` hook should not
+    be applied to cached responses. It is meant for handlers whose response only depends on what makes the cache key.
 
-    Returns
-    -------
-    dict
-        The HTTP error 5XX response to return to API Gateway.        
-      
     Examples
     --------
-    >>> build_http_server_error_response(HttpInsufficientStorageError(), client_message='Sorry, we have an issue.')
-    {'isBase64Encoded': False, 'statusCode': 507, 'body': '{\\n  "Message": "Sorry, we have an issue."\\n}', 'headers': {'Content-Type': 'application/json; charset=utf-8'}}
+    >>> pipeline = Pipeline(
+    >>>     TimingStage(),
+    >>>     ErrorMappingStage(),
+    >>>     NegotiationStage(),
+    >>>     CompressionStage(),
+    >>>     CacheStage(ResponseCache(max_entries=100, ttl=300))
+    >>> )
+    """
 
-    Notes
-    -----
-    This function simply calls 
-    
-    >>> build_http_response(error.status, client_message, **kwargs)
-        
-    It is a good idea to make your Lambda handler to catch all unexpected errors to return a clean user-oriented error message should anything go wrong.
+    def __init__(self, cache: typing.Optional[ResponseCache] = None, *, methods: typing.Iterable[str] = ('GET', 'HEAD')) -> None:
+        """
+        Parameters
+        ----------
+        cache : ResponseCache
+            Optional cache. A cache with default settings if omitted.
+        methods : iterable
+            Optional methods of the API calls to cache. ``GET`` and ``HEAD`` if omitted.
+        """
 
-    >>> def lambda_handler(raw_event, context):
-    >>>     import awsmate.apigateway as amag
-    >>>
-    >>>     event = amag.LambdaProxyEvent(raw_event) 
-    >>>
-    >>>     try:
-    >>>         # Everything you need to do
-    >>>
-    >>>         return amag.build_http_response(200, "OK", event=event)
-    >>>
-    >>>     except amag.HttpClientError as err:
-    >>>         return amag.build_http_client_error_response(err, event=event) 
-    >>>     except Exception:
-    >>>         # We will end up here should any unexpected error occur
-    >>>         return amag.build_http_server_error_response(amag.HttpInternalServerError(), event=event) 
-    """
-    
-    if log:
-        log_internal_error(f'{error.status} - {error}')
+        self.cache: ResponseCache = cache if cache is not None else ResponseCache()
+        """
+        ResponseCache : The cache of the responses.
+        """
 
-    return build_http_response(
-        error.status, 
-        client_message if client_message else 'Sorry, an error occured. Please contact the API administrator to have this sorted out.',
-        **kwargs
-    )
+        self._methods = frozenset(m.upper() for m in methods)
 
 
-def build_http_client_error_response(
-        error: HttpClientError, *,
-        log: bool = True,
-        **kwargs: typing.Any
-    ) -> dict:
-    """
-    Convenience function that builds an HTTP error 4XX response to be returned to API Gateway by the Lambda handler.
+    def before(self, state: RequestState) -> typing.Optional[dict]:
+        method = state.event.http_method()
 
-    Unless specified otherwise, calling this function logs an error showing the status and message. 
+        if method not in self._methods:
+            return None
 
-    Parameters
-    ----------
-    error : HttpClientError
-        Object representing the error. 
-    log : bool
-        Optional flag that defines whether a stack trace should be logged. ``True`` if omitted.
-    **kwarg : any
-        Optional arguments to pass to :func:`build_http_response`
+        negotiation = state.options.get('negotiation') or negotiate(state.event, custom_transformers = state.options.get('custom_transformers'))
+        query = state.event.query_parameters()
 
-    Returns
-    -------
-    dict
-        The HTTP error 4XX response to return to API Gateway.      
+        key = (
+            method,
+            state.event._event.get('requestContext', {}).get('path'),
+            tuple((name, tuple(query.get_all(name))) for name in sorted(query.names())),
+            negotiation.media_type,
+            _compression_encoding(negotiation.encoding, state.event, state.options.get('compression') or _default_compression),
+            tuple(sorted((state.options.get('extra_headers') or {}).items()))
+        )
 
-    Examples
-    --------
-    >>> build_http_client_error_response(HttpNotFoundError())
-    {'isBase64Encoded': False, 'statusCode': 404, 'body': '{\\n  "Message": "Not Found"\\n}', 'headers': {'Content-Type': 'application/json; charset=utf-8'}}
-    
-    Notes
-    -----
-    This function simply calls 
-    
-    >>> build_http_response(error.status, str(error), **kwargs)
+        cacheControl = state.event.header('Cache-Control') if 'headers' in state.event._event else None
 
-    It is a good idea to make your Lambda handler to catch all HttpClientError to return a clean error message should there be any problem with the request.
+        if cacheControl is None or 'no-cache' not in cacheControl.lower():
+            response = self.cache.get(key)
 
-    >>> def lambda_handler(raw_event, context):
-    >>>     import awsmate.apigateway as amag
-    >>>
-    >>>     event = amag.LambdaProxyEvent(raw_event) 
-    >>>
-    >>>     try:
-    >>>         # Everything you need to do
-    >>>
-    >>>         return amag.build_http_response(200, "OK", event=event)
-    >>>
-    >>>     except amag.HttpClientError as err:
-    >>>         return amag.build_http_client_error_response(err, event=event) # We will end up here should anything be wrong in the client's request
-    >>>     except Exception:
-    >>>         return amag.build_http_server_error_response(amag.HttpInternalServerError(), event=event) 
-    """
+            if response is not None:
+                return response
 
-    if log:
-        logger.error(f'{error.status} - {error}')
+        state.values['cache.key'] = key
 
-    return build_http_response(
-        error.status, 
-        str(error),
-        **kwargs
-    )
+        return None
+
+
+    def after(self, state: RequestState, response: dict) -> dict:
+        key = state.values.get('cache.key')
+
+        if key is not None and response['statusCode'] == HTTPStatus.OK.value:
+            self.cache.put(key, response)
+
+        return response
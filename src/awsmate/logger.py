@@ -1,4 +1,14 @@
+import collections
+import copy
+import functools
+import hashlib
+import json
 import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
 import traceback
 import typing
 
@@ -18,29 +28,676 @@ Examples
 logger.setLevel(defaultLevel)
 
 
-def log_internal_error(msg: typing.Optional[str] = None) -> None:
+_plainFormat = '%(message)s'
+
+_rawRecordAttribute = 'awsmate_raw'
+
+_standardRecordAttributes = frozenset(logging.LogRecord('', 0, '', 0, '', None, None).__dict__.keys()) | { 'message', 'asctime' }
+
+_invocationContext: typing.Dict[str, typing.Any] = {}
+
+_coldStart = True
+
+_queueListener: typing.Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter that renders each log record as a single-line JSON object.
+
+    Each object contains the ``timestamp`` (milliseconds since epoch), ``level``, ``logger`` and ``message`` fields, the ``exception``
+    field if a stack trace is attached to the record, the per-invocation context fields set by :func:`begin_invocation` and any
+    field passed through the ``extra`` parameter of the logging calls.
+
+    This format lets CloudWatch Logs Insights query these fields directly instead of parsing messages.
+
+    There is no need to instantiate this class directly normally: see :func:`set_json_format`.
+
+    Examples
+    --------
+    >>> set_json_format()
+    >>> logger.info('Order %s processed', 1234, extra={ 'amount': 25 })
+    {"timestamp":1700000000000,"level":"INFO","logger":"root","message":"Order 1234 processed","amount":25}
+    """
+
+    _encoder = json.JSONEncoder(ensure_ascii = False, separators = (',', ':'), default = str)
+
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Formats the given record as JSON.
+
+        Parameters
+        ----------
+        record : logging.LogRecord
+            The record to format.
+
+        Returns
+        -------
+        str
+            The JSON representation of the record.
+        """
+
+        if getattr(record, _rawRecordAttribute, False):
+            return record.getMessage()
+
+        entry = {
+            'timestamp': int(record.created * 1000),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+
+        for key, value in record.__dict__.items():
+            if key not in _standardRecordAttributes:
+                entry[key] = value
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+
+        return self._encoder.encode(entry)
+
+
+class _AwsmateFilter(logging.Filter):
+    pass
+
+
+class _InvocationContextFilter(_AwsmateFilter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _invocationContext.items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+
+        return True
+
+
+_contextFilter = _InvocationContextFilter()
+
+
+class _DebugBufferFilter(_AwsmateFilter):
+    def __init__(self, capacity: int, threshold: int) -> None:
+        super().__init__()
+
+        self.records: typing.Deque[logging.LogRecord] = collections.deque(maxlen = capacity)
+        self.threshold = threshold
+        self.dumping = False
+        self.previousLevels: typing.Dict[logging.Logger, int] = {}
+
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.dumping or record.levelno >= self.threshold:
+            return True
+
+        # The same record goes through this filter once per handler: it is only buffered once.
+        if not self.records or self.records[-1] is not record:
+            self.records.append(record)
+
+        return False
+
+
+_debugBuffer: typing.Optional[_DebugBufferFilter] = None
+
+_libraryLoggers = ('boto3', 'botocore', 's3transfer', 'urllib3')
+
+
+class _SamplingFilter(_AwsmateFilter):
+    def __init__(self, rates: typing.Dict[int, float]) -> None:
+        super().__init__()
+
+        self.rates = dict(rates)
+        self._lastRecord: typing.Optional[logging.LogRecord] = None
+        self._lastDecision = True
+
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # The same record goes through this filter once per handler: the decision is only made once.
+        if record is not self._lastRecord:
+            rate = self.rates.get(record.levelno, 1.0)
+
+            self._lastRecord = record
+            self._lastDecision = rate >= 1.0 or getattr(record, _rawRecordAttribute, False) or random.random() < rate
+
+        return self._lastDecision
+
+
+_samplingFilter: typing.Optional[_SamplingFilter] = None
+
+_deduplicationWindow: typing.Optional[float] = None
+
+_maxFingerprints = 1024
+
+_errorFingerprints: typing.Dict[str, typing.List[typing.Any]] = {}
+
+
+def set_json_format(enabled: bool = True) -> None:
+    """
+    Switches the output of :data:`logger` to structured JSON, or back to plain messages.
+
+    In JSON mode, each record is written as a single-line JSON object by :class:`JsonFormatter`, with the context fields of the current
+    invocation (see :func:`begin_invocation`).
+
+    Parameters
+    ----------
+    enabled : bool
+        Optional flag that defines whether JSON output should be used. ``True`` if omitted.
+
+    Examples
+    --------
+    >>> set_json_format()
+    >>> logger.info('Hello')
+    {"timestamp":1700000000000,"level":"INFO","logger":"root","message":"Hello","aws_request_id":"c6af9ac6-7b61-11e6-9a41-93e812345678","function_name":"my-function","cold_start":true}
+    """
+
+    formatter = JsonFormatter() if enabled else logging.Formatter(_plainFormat)
+
+    for handler in _output_handlers():
+        handler.setFormatter(formatter)
+
+    for handler in logger.handlers:
+        if enabled:
+            handler.addFilter(_contextFilter)
+        else:
+            handler.removeFilter(_contextFilter)
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, records: queue.Queue) -> None:
+        super().__init__(records)
+
+        self._debugCapacity = records.maxsize // 2
+        self.dropped = 0
+
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the default implementation, the record is not formatted here: formatting is left to the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        return record
+
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno >= logging.ERROR:
+            self.queue.put(record)
+
+        elif record.levelno <= logging.DEBUG and self.queue.qsize() >= self._debugCapacity:
+            self.dropped += 1
+
+        else:
+            try:
+                self.queue.put_nowait(record)
+
+            except queue.Full:
+                self.dropped += 1
+
+
+def _output_handlers() -> typing.Tuple[logging.Handler, ...]:
+    return tuple(_queueListener.handlers) if _queueListener else tuple(logger.handlers)
+
+
+def _move_filters(sources: typing.Iterable[logging.Handler], destinations: typing.Iterable[logging.Handler]) -> None:
+    for source in sources:
+        for f in list(source.filters):
+            if isinstance(f, _AwsmateFilter):
+                source.removeFilter(f)
+
+                for destination in destinations:
+                    destination.addFilter(f)
+
+
+def set_queued_emission(enabled: bool = True, *, max_size: int = 10000) -> None:
+    """
+    Makes :data:`logger` hand its records over to a background thread instead of writing them synchronously, or back to synchronous writing.
+
+    In queued mode, records go through a bounded queue to a ``logging.handlers.QueueListener`` that writes them using the handlers
+    :data:`logger` had before. Should the queue overflow, ``DEBUG`` records are dropped first (as soon as the queue is half full), then
+    ``INFO`` and ``WARNING`` records (once it is full). ``ERROR`` and ``CRITICAL`` records are never dropped: logging them waits for room instead.
+    The number of dropped records is logged by :func:`flush`.
+
+    The queue has to be flushed at the end of each invocation so that no record is lost when the container is frozen. :func:`end_invocation`
+    does it for you.
+
+    Parameters
+    ----------
+    enabled : bool
+        Optional flag that defines whether records should be queued. ``True`` if omitted.
+    max_size : int
+        Optional maximum number of records waiting in the queue. ``10000`` if omitted.
+
+    Examples
+    --------
+    >>> set_queued_emission(max_size=1000)
+    >>>
+    >>> @logged_handler
+    >>> def lambda_handler(raw_event, context):
+    >>>     logger.info('Handled')  # Written by a background thread, flushed before returning
+    """
+
+    global _queueListener
+
+    if _queueListener is not None:
+        listener = _queueListener
+        listener.stop()
+
+        _queueListener = None
+
+        queueHandlers = [ h for h in logger.handlers if isinstance(h, _BoundedQueueHandler) ]
+
+        for handler in queueHandlers:
+            logger.removeHandler(handler)
+
+        _move_filters(queueHandlers, listener.handlers)
+
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+
+    if enabled:
+        outputHandlers = tuple(logger.handlers)
+        queueHandler = _BoundedQueueHandler(queue.Queue(max_size))
+
+        _move_filters(outputHandlers, (queueHandler,))
+
+        for handler in outputHandlers:
+            logger.removeHandler(handler)
+
+        logger.addHandler(queueHandler)
+
+        _queueListener = logging.handlers.QueueListener(queueHandler.queue, *outputHandlers, respect_handler_level = True)
+        _queueListener.start()
+
+
+def flush() -> None:
+    """
+    Waits until all records logged so far are written, then flushes the output handlers of :data:`logger`.
+
+    This function is only useful in queued mode (see :func:`set_queued_emission`) and is called by :func:`end_invocation`. Should records
+    have been dropped because of a queue overflow, a ``WARNING`` reporting their number is written.
+    """
+
+    if _queueListener is not None:
+        _queueListener.queue.join()
+
+        for handler in logger.handlers:
+            if isinstance(handler, _BoundedQueueHandler) and handler.dropped:
+                record = logging.LogRecord(
+                    logger.name, logging.WARNING, __file__, 0, '%d log records were dropped because the log queue was full.', (handler.dropped,), None
+                )
+                handler.dropped = 0
+
+                for outputHandler in _queueListener.handlers:
+                    if record.levelno >= outputHandler.level:
+                        outputHandler.handle(record)
+
+    for handler in _output_handlers():
+        handler.flush()
+
+
+def set_debug_buffer(enabled: bool = True, *, capacity: int = 500, logger_names: typing.Optional[typing.Iterable[str]] = None) -> None:
+    """
+    Makes the given loggers capture their records below the current level of :data:`logger` into a per-invocation ring buffer, or stops doing so.
+
+    Once enabled, the level of the loggers is lowered to ``DEBUG`` but records below the former level of :data:`logger` are not written: the last
+    ``capacity`` of them are kept in memory instead. They are written by :func:`dump_debug_buffer` should anything go wrong during the invocation,
+    and discarded otherwise. This gives full diagnostics on failure without paying their I/O and ingestion cost on success.
+
+    Only the given loggers are lowered: records of the other ones below their level are not even created. Should :data:`logger` itself be
+    buffered, which is the default, the loggers of the AWS SDK and of ``urllib3`` whose level is not set are kept at its former level.
+    Levels are restored once disabled.
+
+    The buffer is dumped by :func:`log_internal_error`, by :func:`awsmate.apigateway.build_http_server_error_response` and by
+    :func:`logged_handler` if the handler raises. It is discarded by :func:`begin_invocation` and :func:`end_invocation`.
+
+    Parameters
+    ----------
+    enabled : bool
+        Optional flag that defines whether records should be buffered. ``True`` if omitted.
+    capacity : int
+        Optional maximum number of records kept in the buffer. Oldest records are dropped first. ``500`` if omitted.
+    logger_names : iterable
+        Optional names of the loggers to buffer the records of, such as the ones of the application modules. Records of :data:`logger` are
+        buffered if omitted.
+
+    Examples
+    --------
+    >>> set_debug_buffer()
+    >>>
+    >>> @logged_handler
+    >>> def lambda_handler(raw_event, context):
+    >>>     logger.debug('Written only if this invocation fails')
+
+    >>> set_debug_buffer(logger_names=('myapp',))  # Records of logging.getLogger('myapp.reports') are buffered, not the ones of logger
+    """
+
+    global _debugBuffer
+
+    if _debugBuffer is not None:
+        for handler in logger.handlers:
+            handler.removeFilter(_debugBuffer)
+
+        for bufferedLogger, level in _debugBuffer.previousLevels.items():
+            bufferedLogger.setLevel(level)
+
+        _debugBuffer = None
+
+    if enabled:
+        buffer = _DebugBufferFilter(capacity, logger.getEffectiveLevel())
+        bufferedLoggers = [ logging.getLogger(n) for n in logger_names ] if logger_names is not None else [ logger ]
+
+        if logger in bufferedLoggers:
+            for name in _libraryLoggers:
+                libraryLogger = logging.getLogger(name)
+
+                if libraryLogger.level == logging.NOTSET:
+                    buffer.previousLevels[libraryLogger] = logging.NOTSET
+                    libraryLogger.setLevel(buffer.threshold)
+
+        for bufferedLogger in bufferedLoggers:
+            buffer.previousLevels[bufferedLogger] = bufferedLogger.level
+            bufferedLogger.setLevel(logging.DEBUG)
+
+        for handler in logger.handlers:
+            handler.addFilter(buffer)
+
+        _debugBuffer = buffer
+
+
+def dump_debug_buffer() -> None:
+    """
+    Writes the records captured by the debug buffer of the current invocation, then empties it.
+
+    This function does nothing unless the debug buffer is enabled (see :func:`set_debug_buffer`).
+    """
+
+    if _debugBuffer is None:
+        return
+
+    _debugBuffer.dumping = True
+
+    try:
+        while _debugBuffer.records:
+            record = _debugBuffer.records.popleft()
+
+            for handler in logger.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    finally:
+        _debugBuffer.dumping = False
+
+
+def discard_debug_buffer() -> None:
     """
-    Logs an error explanatory message followed by a stack trace. 
-    
-    This function is very useful if you redirect your Lambda function outputs to AWS Cloudwatch, which is recommended. Logs issued by 
-    this function appear as ``CRITICAL``. 
+    Empties the debug buffer of the current invocation without writing it.
+
+    This function does nothing unless the debug buffer is enabled (see :func:`set_debug_buffer`).
+    """
+
+    if _debugBuffer is not None:
+        _debugBuffer.records.clear()
+
+
+def set_sampling_rates(rates: typing.Optional[typing.Dict[int, float]]) -> None:
+    """
+    Makes :data:`logger` write only a random sample of the records of the given levels, or all records again.
+
+    Sampling decisions are made before records are formatted. Documents logged by :func:`log_json` are never sampled out.
+
+    Parameters
+    ----------
+    rates : dict
+        Mapping of levels to the proportion of their records to write, between ``0.0`` (none) and ``1.0`` (all). Levels that are not
+        mentioned are not sampled. ``None`` disables sampling.
+
+    Examples
+    --------
+    >>> set_sampling_rates({ logging.DEBUG: 0.01, logging.INFO: 0.1 })  # 1% of DEBUG records and 10% of INFO records are written
+    """
+
+    global _samplingFilter
+
+    if _samplingFilter is not None:
+        for handler in logger.handlers:
+            handler.removeFilter(_samplingFilter)
+
+        _samplingFilter = None
+
+    if rates:
+        _samplingFilter = _SamplingFilter(rates)
+
+        for handler in logger.handlers:
+            handler.addFilter(_samplingFilter)
+
+
+def set_error_deduplication(enabled: bool = True, *, window: float = 60.0) -> None:
+    """
+    Makes :func:`log_internal_error` write each distinct stack trace only once per time window, or every time again.
+
+    Stack traces are identified by a fingerprint of the exception type and of the frames it went through. The first occurrence of
+    a stack trace is written in full. Its later occurrences within the window are logged as a single line mentioning the fingerprint 
+    and the number of occurrences since the stack trace was last written. This keeps logging cheap when a failing dependency makes
+    all requests fail the same way.
+
+    Parameters
+    ----------
+    enabled : bool
+        Optional flag that defines whether stack traces should be deduplicated. ``True`` if omitted.
+    window : float
+        Optional duration of the window in seconds. ``60.0`` if omitted.
+
+    Examples
+    --------
+    >>> set_error_deduplication(window=300)
+    """
+
+    global _deduplicationWindow
+
+    _deduplicationWindow = window if enabled else None
+    _errorFingerprints.clear()
+
+
+def _exception_fingerprint() -> typing.Optional[str]:
+    excType, _, excTraceback = sys.exc_info()
+
+    if excType is None:
+        return None
+
+    digest = hashlib.blake2b(f'{excType.__module__}.{excType.__qualname__}'.encode('utf-8'), digest_size = 8)
+
+    for frame, lineNumber in traceback.walk_tb(excTraceback):
+        digest.update(f'|{frame.f_code.co_filename}:{frame.f_code.co_name}:{lineNumber}'.encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def begin_invocation(context: typing.Any = None) -> None:
+    """
+    Declares the beginning of a Lambda invocation.
+
+    The request id and the function name are taken from the Lambda ``context`` object, if any. The first invocation served by the
+    container is flagged as a cold start. These fields are added to all records logged in JSON format until :func:`end_invocation` is called.
+
+    Parameters
+    ----------
+    context : object
+        Optional ``context`` parameter received by the AWS Lambda function handler.
+
+    Examples
+    --------
+    >>> def lambda_handler(raw_event, context):
+    >>>     begin_invocation(context)
+    >>>     try:
+    >>>         # Everything you need to do
+    >>>     finally:
+    >>>         end_invocation()
+
+    See Also
+    --------
+    logged_handler : decorator that calls this function for you.
+    """
+
+    global _coldStart
+
+    discard_debug_buffer()
+
+    _invocationContext.clear()
+
+    if context is not None:
+        for field in ('aws_request_id', 'function_name'):
+            value = getattr(context, field, None)
+
+            if value is not None:
+                _invocationContext[field] = value
+
+    _invocationContext['cold_start'] = _coldStart
+    _coldStart = False
+
+
+def end_invocation() -> None:
+    """
+    Declares the end of the current Lambda invocation.
+
+    The context fields set by :func:`begin_invocation` are cleared, the debug buffer is discarded (see :func:`set_debug_buffer`)
+    and the logged records are flushed (see :func:`flush`).
+
+    See Also
+    --------
+    begin_invocation : example of use.
+    """
+
+    discard_debug_buffer()
+    flush()
+
+    _invocationContext.clear()
+
+
+def logged_handler(handler: typing.Callable[[typing.Any, typing.Any], typing.Any]) -> typing.Callable[[typing.Any, typing.Any], typing.Any]:
+    """
+    Decorator that wraps a Lambda handler between :func:`begin_invocation` and :func:`end_invocation`.
+
+    Should the handler raise, the debug buffer is dumped (see :func:`set_debug_buffer`) before the exception is propagated.
+
+    Parameters
+    ----------
+    handler : callable
+        The Lambda handler, taking the ``event`` and ``context`` parameters.
+
+    Returns
+    -------
+    callable
+        The decorated Lambda handler.
+
+    Examples
+    --------
+    >>> @logged_handler
+    >>> def lambda_handler(raw_event, context):
+    >>>     logger.info('Handled')  # Logged with the request id, the function name and the cold start flag in JSON mode
+    """
+
+    @functools.wraps(handler)
+    def wrapper(event: typing.Any, context: typing.Any) -> typing.Any:
+        begin_invocation(context)
+
+        try:
+            return handler(event, context)
+
+        except Exception:
+            dump_debug_buffer()
+            raise
+
+        finally:
+            end_invocation()
+
+    return wrapper
+
+
+def log_json(document: typing.Dict[str, typing.Any], level: int = logging.INFO) -> None:
+    """
+    Logs a JSON document as a single line, as-is whatever the output format.
+
+    This function is meant for documents that are parsed by AWS services such as CloudWatch Embedded Metric Format documents. 
+    The document is serialized only if the given level is enabled.
+
+    Parameters
+    ----------
+    document : dict
+        The document to log.
+    level : int
+        Optional level of the record. ``logging.INFO`` if omitted.
+
+    Examples
+    --------
+    >>> log_json({ 'some_key': 'some_value' })
+    {"some_key":"some_value"}
+    """
+
+    if logger.isEnabledFor(level):
+        logger.log(level, JsonFormatter._encoder.encode(document), extra = { _rawRecordAttribute: True })
+
+
+def log_internal_error(msg: typing.Optional[str] = None, *args: typing.Any) -> None:
+    """
+    Logs an error explanatory message followed by a stack trace.
+
+    This function is very useful if you redirect your Lambda function outputs to AWS Cloudwatch, which is recommended. Logs issued by
+    this function appear as ``CRITICAL``.
+
+    The message and the stack trace are only formatted if the ``CRITICAL`` level is enabled. The debug buffer is dumped beforehand
+    (see :func:`set_debug_buffer`). Repeated stack traces can be deduplicated (see :func:`set_error_deduplication`).
 
     Parameters
     ----------
     msg : str
-        Optional explanatory message. 
+        Optional explanatory message. It may contain ``%`` placeholders, as usual with ``logging``.
+    *args : any
+        Optional arguments merged into ``msg``.
 
     Examples
     --------
     >>> try:
     >>>   raise RuntimeError('WOW!')
     >>> except Exception:
-    >>>   log_internal_error("This one is expected")
+    >>>   log_internal_error("This one is %s", "expected")
     INTERNAL ERROR: This one is expected.
     Traceback (most recent call last):
     File "<stdin>", line 2, in <module>
     RuntimeError: WOW!
     """
-    
-    logger.critical(f"INTERNAL ERROR: {msg}.")
-    logger.critical(traceback.format_exc())
+
+    dump_debug_buffer()
+
+    if not logger.isEnabledFor(logging.CRITICAL):
+        return
+
+    fingerprint = _exception_fingerprint() if _deduplicationWindow is not None else None
+
+    if fingerprint is not None:
+        now = time.monotonic()
+        occurrences = _errorFingerprints.get(fingerprint)
+
+        if occurrences is not None and now - occurrences[0] < _deduplicationWindow:
+            occurrences[1] += 1
+
+            logger.critical(
+                f"INTERNAL ERROR: {msg}. Repeated error {fingerprint}: {occurrences[1]} occurrence(s) since its stack trace was written.", *args,
+                extra = { 'error_fingerprint': fingerprint, 'error_occurrences': occurrences[1] }
+            )
+
+            return
+
+        if occurrences is None and len(_errorFingerprints) >= _maxFingerprints:
+            del _errorFingerprints[next(iter(_errorFingerprints))]
+
+        _errorFingerprints[fingerprint] = [ now, 0 ]
+
+        logger.critical(f"INTERNAL ERROR: {msg}.", *args, exc_info = True, extra = { 'error_fingerprint': fingerprint })
+
+    else:
+        logger.critical(f"INTERNAL ERROR: {msg}.", *args, exc_info = True)
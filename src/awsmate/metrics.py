@@ -0,0 +1,271 @@
+import contextlib
+import functools
+import time
+import typing
+
+from awsmate.logger import log_json
+
+
+MAX_METRICS_PER_DOCUMENT = 100
+"""
+int : Maximum number of metrics a CloudWatch Embedded Metric Format document can declare.
+"""
+
+MAX_VALUES_PER_METRIC = 100
+"""
+int : Maximum number of values a metric can have in a CloudWatch Embedded Metric Format document.
+"""
+
+
+class MetricsAggregator():
+    """
+    In-memory aggregator of metrics emitted as `CloudWatch Embedded Metric Format <https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html>`_
+    (EMF) documents through :mod:`awsmate.logger`.
+
+    Counters are summed and histogram values are collected during the invocation, then written at once by :meth:`emit`. CloudWatch
+    extracts the metrics from the logs: there is no synchronous ``PutMetricData`` call. Documents are automatically split so that none of them
+    declares more than :data:`MAX_METRICS_PER_DOCUMENT` metrics nor holds more than :data:`MAX_VALUES_PER_METRIC` values per metric.
+
+    Examples
+    --------
+    >>> metrics = MetricsAggregator('MyApplication', dimensions={ 'Service': 'billing' })
+    >>>
+    >>> @metrics.instrument
+    >>> def lambda_handler(raw_event, context):
+    >>>     metrics.increment('ReportsGenerated')
+    >>>     # Everything you need to do
+    """
+
+    def __init__(
+            self,
+            namespace: str, *,
+            dimensions: typing.Optional[typing.Dict[str, str]] = None,
+            dimension_sets: typing.Optional[typing.Sequence[typing.Sequence[str]]] = None
+        ) -> None:
+        """
+        Parameters
+        ----------
+        namespace : str
+            The CloudWatch namespace of the metrics.
+        dimensions : dict
+            Optional mapping of dimension names to their values, added to all documents.
+        dimension_sets : sequence
+            Optional dimension sets, each of them being a sequence of dimension names. A single set made of all dimension names is used if omitted.
+
+        Raises
+        ------
+        ValueError
+            If a dimension set refers to an unknown dimension.
+        """
+
+        self._namespace = namespace
+        self._dimensions = dict(dimensions) if dimensions else {}
+        self._dimensionSets = [ list(s) for s in dimension_sets ] if dimension_sets is not None else None
+
+        for dimensionSet in (self._dimensionSets or []):
+            for name in dimensionSet:
+                if name not in self._dimensions:
+                    raise ValueError(f'Dimension set refers to an unknown dimension: {name}.')
+
+        self._counters: typing.Dict[str, typing.List[typing.Any]] = {}
+        self._histograms: typing.Dict[str, typing.List[typing.Any]] = {}
+
+
+    def increment(self, name: str, value: float = 1, unit: str = 'Count') -> None:
+        """
+        Adds a value to a counter.
+
+        Parameters
+        ----------
+        name : str
+            The metric name.
+        value : float
+            Optional value to add. ``1`` if omitted.
+        unit : str
+            Optional CloudWatch unit of the metric. ``Count`` if omitted.
+
+        Examples
+        --------
+        >>> metrics.increment('RowsExported', 250)
+        """
+
+        counter = self._counters.get(name)
+
+        if counter is None:
+            self._counters[name] = [ unit, value ]
+        else:
+            counter[1] += value
+
+
+    def observe(self, name: str, value: float, unit: str = 'None') -> None:
+        """
+        Adds a value to a histogram.
+
+        Parameters
+        ----------
+        name : str
+            The metric name.
+        value : float
+            The observed value.
+        unit : str
+            Optional CloudWatch unit of the metric. ``None`` if omitted.
+
+        Examples
+        --------
+        >>> metrics.observe('PayloadSize', 1536, 'Bytes')
+        """
+
+        histogram = self._histograms.get(name)
+
+        if histogram is None:
+            self._histograms[name] = [ unit, [ value ] ]
+        else:
+            histogram[1].append(value)
+
+
+    @contextlib.contextmanager
+    def timer(self, name: str) -> typing.Iterator[None]:
+        """
+        Context manager that observes its duration in milliseconds.
+
+        Parameters
+        ----------
+        name : str
+            The metric name.
+
+        Examples
+        --------
+        >>> with metrics.timer('DatabaseLatency'):
+        >>>     run_query()
+        """
+
+        start = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000, 'Milliseconds')
+
+
+    def instrument(self, handler: typing.Callable[[typing.Any, typing.Any], typing.Any]) -> typing.Callable[[typing.Any, typing.Any], typing.Any]:
+        """
+        Decorator that observes the duration of a Lambda handler as ``Latency`` and calls :meth:`emit` once it returns or raises.
+
+        Parameters
+        ----------
+        handler : callable
+            The Lambda handler, taking the ``event`` and ``context`` parameters.
+
+        Returns
+        -------
+        callable
+            The decorated Lambda handler.
+        """
+
+        @functools.wraps(handler)
+        def wrapper(event: typing.Any, context: typing.Any) -> typing.Any:
+            try:
+                with self.timer('Latency'):
+                    return handler(event, context)
+
+            finally:
+                self.emit()
+
+        return wrapper
+
+
+    def record_http_responses(self, enabled: bool = True) -> None:
+        """
+        Makes this aggregator record the responses built by :func:`awsmate.apigateway.build_http_response`, or stops doing so.
+
+        Each response increments one of the ``Http1xx`` to ``Http5xx`` counters and adds its uncompressed body size to the ``ResponseBodySize``
+        histogram. Compressed responses also add their compressed to uncompressed size ratio to the ``CompressionRatio`` histogram.
+
+        Parameters
+        ----------
+        enabled : bool
+            Optional flag that defines whether responses should be recorded. ``True`` if omitted.
+        """
+
+        from awsmate.apigateway import register_response_hook, unregister_response_hook
+
+        if enabled:
+            register_response_hook(self._record_http_response)
+        else:
+            unregister_response_hook(self._record_http_response)
+
+
+    def _record_http_response(self, response: dict, body_size: int) -> None:
+        self.increment(f'Http{response["statusCode"] // 100}xx')
+        self.observe('ResponseBodySize', body_size, 'Bytes')
+
+        if body_size and 'Content-Encoding' in response['headers']:
+            body = response['body']
+            compressedSize = len(body) * 3 // 4 - (len(body) - len(body.rstrip('=')))
+
+            self.observe('CompressionRatio', compressedSize / body_size)
+
+
+    def documents(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        Returns the EMF documents representing the metrics aggregated so far.
+
+        There is no need to call this method directly normally: :meth:`emit` does it for you.
+
+        Returns
+        -------
+        list
+            The EMF documents as ``dict``. The list is empty if no metric was aggregated.
+        """
+
+        # Each round gathers the metrics values that can be held by a single document, before splitting at the metrics count limit.
+        rounds: typing.List[typing.List[typing.Tuple[str, str, typing.Any]]] = [ [ (name, unit, value) for name, (unit, value) in self._counters.items() ] ]
+
+        for name, (unit, values) in self._histograms.items():
+            for i in range(0, len(values), MAX_VALUES_PER_METRIC):
+                index = i // MAX_VALUES_PER_METRIC
+
+                if index == len(rounds):
+                    rounds.append([])
+
+                rounds[index].append((name, unit, values[i:i + MAX_VALUES_PER_METRIC]))
+
+        timestamp = int(time.time() * 1000)
+        dimensionSets = self._dimensionSets if self._dimensionSets is not None else [ list(self._dimensions.keys()) ]
+        ret = []
+
+        for metrics in rounds:
+            for i in range(0, len(metrics), MAX_METRICS_PER_DOCUMENT):
+                chunk = metrics[i:i + MAX_METRICS_PER_DOCUMENT]
+
+                ret.append({
+                    '_aws': {
+                        'Timestamp': timestamp,
+                        'CloudWatchMetrics': [
+                            {
+                                'Namespace': self._namespace,
+                                'Dimensions': dimensionSets,
+                                'Metrics': [ { 'Name': name, 'Unit': unit } for name, unit, _ in chunk ]
+                            }
+                        ]
+                    },
+                    **self._dimensions,
+                    **{ name: value for name, _, value in chunk }
+                })
+
+        return ret
+
+
+    def emit(self) -> None:
+        """
+        Logs the metrics aggregated so far as EMF documents, then resets the aggregator.
+
+        Nothing is logged if no metric was aggregated.
+        """
+
+        for document in self.documents():
+            log_json(document)
+
+        self._counters.clear()
+        self._histograms.clear()
@@ -1,13 +1,22 @@
 import pytest
 
+import base64
+import dataclasses
+import datetime
+import decimal
+import enum
+import gzip
 import ipaddress
 import json
+import os
 import random
 import re
+import uuid
+import zlib
 
 import awsmate.apigateway as ag
 
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from awsmate.lambdafunction import AwsEventSpecificationError
 
 
@@ -141,6 +150,77 @@ def test_LambdaProxyEvent_http_headers_raisesIfNoHeaderElementIsPresent():
     mcre.assert_called_once_with("'headers'")
 
 
+def test_LambdaProxyEvent_http_headers_returnsACopyOfTheIndex():
+    event = {
+        'headers': { "A-a": 'someValue' }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+    test.http_headers()['a-a'] = 'otherValue'
+
+    assert test.http_headers() == { "a-a": 'someValue' }
+
+
+def test_LambdaProxyEvent_header_returnsTheValueOfTheHeaderCaseInsensitively():
+    randString = str(random.randint(1000, 9999))
+
+    event = {
+        'headers': { "Content-Type": randString }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    assert test.header('cOnTeNt-TyPe') == randString
+
+
+def test_LambdaProxyEvent_header_returnsDefaultIfHeaderIsMissing():
+    event = {
+        'headers': None
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    assert test.header('Content-Type') is None
+    assert test.header('Content-Type', 'text/plain') == 'text/plain'
+
+
+def test_LambdaProxyEvent_header_raisesIfNoHeaderElementIsPresent():
+    event = {}
+
+    test = ag.LambdaProxyEvent(event)
+
+    with pytest.raises(AwsEventSpecificationError) as exceptionInfo:
+        with patch.object(ag.LambdaEvent, '_raiseCannotReachError', side_effect=ag.LambdaEvent._raiseCannotReachError) as mcre:
+            test.header('Content-Type')
+
+    mcre.assert_called_once_with("'headers'")
+
+
+def test_LambdaProxyEvent_header_buildsTheIndexOnlyOnce():
+    event = {
+        'headers': { "Content-Type": 'text/plain' }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+    test.header('Content-Type')
+
+    event['headers'] = { "Content-Type": 'application/json' }
+
+    assert test.header('Content-Type') == 'text/plain'
+    assert test.has_header('content-type') is True
+
+
+def test_LambdaProxyEvent_has_header_returnsWhetherTheHeaderIsPresent():
+    event = {
+        'headers': { "Authorization": 'Bearer xyz' }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    assert test.has_header('authorization') is True
+    assert test.has_header('Accept') is False
+
+
 def test_LambdaProxyEvent_http_method_returnsTheHttpMethodOfTheCallInUpperCase():
     event = {
         'requestContext' : { 
@@ -313,14 +393,44 @@ def test_LambdaProxyEvent_header_sorted_preferences_returnsPreferencesAccordingT
     assert test.header_sorted_preferences('accept-encoding') == ('deflate', 'other', 'gzip')
 
 
-def test_LambdaProxyEvent_header_sorted_preferences_considersBadlyFormattedWeightMeansHalf():
+def test_LambdaProxyEvent_header_sorted_preferences_ignoresBadlyFormattedParameters():
     event = { 
         "headers": { 'Accept-Encoding': 'gzip;q=0.4,deflate;q=0.6,other;garbage' }
     }
     
     test = ag.LambdaProxyEvent(event)
 
-    assert test.header_sorted_preferences('accept-encoding') == ('deflate', 'other', 'gzip')
+    assert test.header_sorted_preferences('accept-encoding') == ('other', 'deflate', 'gzip')
+
+
+def test_LambdaProxyEvent_header_sorted_preferences_considersBadlyFormattedWeightMeansOne():
+    event = { 
+        "headers": { 'Accept-Encoding': 'gzip;q=0.4,deflate;q=0.6,other;q=garbage' }
+    }
+    
+    test = ag.LambdaProxyEvent(event)
+
+    assert test.header_sorted_preferences('accept-encoding') == ('other', 'deflate', 'gzip')
+
+
+def test_LambdaProxyEvent_header_sorted_preferences_excludesZeroWeightedValues():
+    event = { 
+        "headers": { 'Accept-Encoding': 'gzip;q=0,deflate;q=0.6,identity' }
+    }
+    
+    test = ag.LambdaProxyEvent(event)
+
+    assert test.header_sorted_preferences('accept-encoding') == ('identity', 'deflate')
+
+
+def test_LambdaProxyEvent_header_sorted_preferences_omitsParameters():
+    event = { 
+        "headers": { 'Accept': 'text/html;level=1;q=0.5,application/json' }
+    }
+    
+    test = ag.LambdaProxyEvent(event)
+
+    assert test.header_sorted_preferences('accept') == ('application/json', 'text/html')
 
 
 def test_LambdaProxyEvent_header_sorted_preferences_silentelyIgnoresEmptyPreference():
@@ -373,6 +483,43 @@ def test_LambdaProxyEvent_header_sorted_preferences_isCaseUnsensitive():
     assert test.header_sorted_preferences('aCcEpT-eNcOdInG') == ('other', 'gzip', 'deflate')  
 
 
+def test_parse_header_preferences_returnsParsedElements():
+    assert ag.parse_header_preferences('text/html;level=1;q=0.8;ext=2') == (
+        ag.HeaderPreference('text/html', 0.8, (('level', '1'),)),
+    )
+
+
+def test_parse_header_preferences_sortsByQualityThenSpecificityThenOrder():
+    parsed = ag.parse_header_preferences('*/*, text/*, text/plain, text/html;level=1, application/json, image/png;q=0.5')
+
+    assert tuple(p.value for p in parsed) == ('text/html', 'text/plain', 'application/json', 'text/*', '*/*', 'image/png')
+
+
+def test_parse_header_preferences_keepsZeroWeightedElements():
+    assert ag.parse_header_preferences('gzip;q=0') == ( ag.HeaderPreference('gzip', 0.0, ()), )
+
+
+def test_parse_header_preferences_clampsQualityValues():
+    parsed = ag.parse_header_preferences('a;q=2,b;q=-1,c;q=nan')
+
+    assert tuple((p.value, p.quality) for p in parsed) == (('a', 1.0), ('c', 1.0), ('b', 0.0))
+
+
+def test_parse_header_preferences_handlesQuotedParameters():
+    parsed = ag.parse_header_preferences('text/plain;format="a,b;c",application/json')
+
+    assert parsed == (
+        ag.HeaderPreference('text/plain', 1.0, (('format', 'a,b;c'),)),
+        ag.HeaderPreference('application/json', 1.0, ()),
+    )
+
+
+def test_parse_header_preferences_cachesResults():
+    header = f'gzip;q=0.{random.randint(1, 9)},deflate'
+
+    assert ag.parse_header_preferences(header) is ag.parse_header_preferences(header)
+
+
 def test_LambdaProxyEvent_query_domain_name_returnsTheDomainNameOfTheCallInLowerCase():
     event = {
         'requestContext': {
@@ -635,6 +782,155 @@ def test_LambdaProxyEvent_query_string_reliesOnEventMethods():
     acqp.assert_called_once()
 
 
+def test_LambdaProxyEvent_query_string_encodesPathAndParameters():
+    event = {
+        'requestContext': {
+            'httpMethod': 'GET',
+            'path': '/files/my report.pdf',
+            'domainName': 'example.com'
+        },
+        'queryStringParameters': { 'q': 'b', 'tag': 'b' },
+        'multiValueQueryStringParameters': { 'q': ['a&b=c'], 'tag': ['a', 'b'] }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    assert test.query_string() == 'GET https://example.com/files/my%20report.pdf?q=a%26b%3Dc&tag=a&tag=b'
+
+
+def test_LambdaProxyEvent_query_string_isMemoized():
+    event = {
+        'requestContext': {
+            'httpMethod': 'GET',
+            'path': '/a',
+            'domainName': 'example.com'
+        },
+        'queryStringParameters': None
+    }
+
+    test = ag.LambdaProxyEvent(event)
+    expected = test.query_string()
+
+    with patch.object(ag.LambdaProxyEvent, 'http_method') as acm:
+        assert test.query_string() is expected
+
+    acm.assert_not_called()
+
+
+def test_LambdaProxyEvent_query_string_multi_value_parameters_returnsAllValues():
+    event = {
+        'queryStringParameters': { 'tag': 'b', 'limit': '50' },
+        'multiValueQueryStringParameters': { 'tag': ['a', 'b'], 'limit': ['50'] }
+    }
+
+    assert ag.LambdaProxyEvent(event).query_string_multi_value_parameters() == { 'tag': ['a', 'b'], 'limit': ['50'] }
+
+
+def test_LambdaProxyEvent_query_string_multi_value_parameters_fallsBackToSingleValues():
+    event = {
+        'queryStringParameters': { 'tag': 'b' }
+    }
+
+    assert ag.LambdaProxyEvent(event).query_string_multi_value_parameters() == { 'tag': ['b'] }
+    assert ag.LambdaProxyEvent({ 'queryStringParameters': None }).query_string_multi_value_parameters() == {}
+
+
+def test_LambdaProxyEvent_query_string_multi_value_parameters_raisesIfParametersFieldIsMissing():
+    test = ag.LambdaProxyEvent({})
+
+    with pytest.raises(AwsEventSpecificationError):
+        test.query_string_multi_value_parameters()
+
+
+def test_LambdaProxyEvent_query_parameters_isBuiltOnce():
+    test = ag.LambdaProxyEvent({ 'queryStringParameters': { 'a': '1' } })
+
+    assert test.query_parameters() is test.query_parameters()
+
+
+def test_LambdaProxyEvent_http_multi_value_headers_returnsAllValuesInLowerCase():
+    event = {
+        'headers': { 'X-Forwarded-For': '10.0.0.1' },
+        'multiValueHeaders': { 'X-Forwarded-For': ['93.184.216.34', '10.0.0.1'], 'Accept': ['application/json'] }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+    headers = test.http_multi_value_headers()
+
+    assert headers == { 'x-forwarded-for': ['93.184.216.34', '10.0.0.1'], 'accept': ['application/json'] }
+
+    headers['accept'].append('text/html')
+
+    assert test.http_multi_value_headers()['accept'] == ['application/json']
+
+
+def test_LambdaProxyEvent_http_multi_value_headers_fallsBackToSingleValues():
+    event = {
+        'headers': { 'Accept': 'application/json' }
+    }
+
+    assert ag.LambdaProxyEvent(event).http_multi_value_headers() == { 'accept': ['application/json'] }
+
+
+def test_QueryIndex_get_returnsLastValueOrDefault():
+    test = ag.QueryIndex({ 'tag': ['a', 'b'] })
+
+    assert test.get('tag') == 'b'
+    assert test.get('other') is None
+    assert test.get('other', 'x') == 'x'
+    assert test.get_all('tag') == ['a', 'b']
+    assert test.get_all('other') == []
+    assert 'tag' in test
+
+
+def test_QueryIndex_get_raisesIfRequiredParameterIsMissing():
+    test = ag.QueryIndex({})
+
+    with pytest.raises(ag.HttpBadRequestError) as exceptionInfo:
+        test.get_int('limit', required=True)
+
+    assert exceptionInfo.value.args[0] == "Missing parameter: limit."
+
+
+def test_QueryIndex_typedGetters_convertValues():
+    class Format(enum.Enum):
+        CSV = 'csv'
+        JSON = 'json'
+
+    test = ag.QueryIndex({
+        'limit': ['50'],
+        'ratio': ['0.5'],
+        'flag': ['Yes'],
+        'from': ['2020-01-01'],
+        'format': ['csv'],
+        'order': ['asc']
+    })
+
+    assert test.get_int('limit') == 50
+    assert test.get_int('missing', 100) == 100
+    assert test.get_float('ratio') == 0.5
+    assert test.get_bool('flag') is True
+    assert test.get_date('from') == datetime.date(2020, 1, 1)
+    assert test.get_enum('format', Format) is Format.CSV
+    assert test.get_enum('order', ('asc', 'desc')) == 'asc'
+
+
+@pytest.mark.parametrize('getter, args, value, expected', [
+    ('get_int', (), '5.5', 'an integer'),
+    ('get_float', (), 'nan', 'a number'),
+    ('get_bool', (), 'maybe', 'a boolean'),
+    ('get_date', (), '01/01/2020', 'an ISO 8601 date'),
+    ('get_enum', (('asc', 'desc'),), 'up', 'one of asc, desc')
+])
+def test_QueryIndex_typedGetters_raiseOnBadInput(getter, args, value, expected):
+    test = ag.QueryIndex({ 'p': [value] })
+
+    with pytest.raises(ag.HttpBadRequestError) as exceptionInfo:
+        getattr(test, getter)('p', *args)
+
+    assert exceptionInfo.value.args[0] == f"Invalid value for parameter p: expected {expected}."
+
+
 def test_LambdaProxyEvent_query_payload_returnsThePayloadAsItIs():
     randInt = random.randint(1000, 100000)
 
@@ -684,133 +980,590 @@ def test_LambdaProxyEvent_query_payload_raisesIfJsonIsIncorrect():
     assert exceptionInfo.value.args[0] == f"Payload is malformed. JSON cannot be decoded: Extra data: line 1 column 7 (char 6)."
 
 
+def test_LambdaProxyEvent_query_payload_decodesBase64Bodies():
+    randInt = random.randint(1000, 100000)
 
-def test_LambdaProxyEvent_authorizer_claims_returnsTheClaimsIfAny():
-    claims = {
-        'cognito:username': '192837645', 
-        'email': 'jane@example.com', 
-        'given_name': 'Jane', 
-        'family_name': 'Doe'
-    }
-    
     event = {
-        'requestContext': {
-            'authorizer': {
-                'claims': claims
-            }
-        }
+        "body": base64.b64encode(("{ \"key\": " + repr(randInt) + " }").encode()).decode(),
+        "isBase64Encoded": True
     }
 
     test = ag.LambdaProxyEvent(event)
 
-    assert  test.authorizer_claims() == claims
+    assert test.query_payload() == { 'key': randInt }
 
 
-def test_LambdaProxyEvent_authorizer_claims_returnsTheClaimsEvenIfNone():
+def test_LambdaProxyEvent_query_payload_raisesIfBase64IsIncorrect():
     event = {
-        'requestContext': {
-            'authorizer': {
-                'claims': None
-            }
-        }
+        "body": "e30",
+        "isBase64Encoded": True
     }
 
     test = ag.LambdaProxyEvent(event)
 
-    assert  test.authorizer_claims() is None    
+    with pytest.raises(ag.MalformedPayloadError) as exceptionInfo:
+        test.query_payload()
 
+    assert exceptionInfo.value.args[0].startswith("Payload is malformed. Base64 cannot be decoded: ")
 
-def test_LambdaProxyEvent_authorizer_claims_returnsNoneIfNoClaims():
+
+def test_LambdaProxyEvent_query_payload_decodesOnlyOnce():
     event = {
-        'requestContext': {
-            'authorizer': {}
-        }
+        "body": "{ \"key\": [1, 2, 3] }"
     }
 
     test = ag.LambdaProxyEvent(event)
+    payload = test.query_payload()
 
-    assert  test.authorizer_claims() is None
+    with patch('json.loads') as jl:
+        assert test.query_payload() is payload
+        jl.assert_not_called()
 
 
-def test_LambdaProxyEvent_authorizer_claims_returnsNoneIfNoAuthorizer():
+def test_LambdaProxyEvent_query_payload_raisesIfTooLargeBeforeParsing():
     event = {
-        'requestContext': {}
+        "body": "{ \"key\": \"" + 'x' * 100 + "\" }"
     }
 
-    test = ag.LambdaProxyEvent(event)
+    test = ag.LambdaProxyEvent(event, max_payload_size=100)
 
-    assert  test.authorizer_claims() is None
+    with pytest.raises(ag.HttpRequestEntityTooLargeError) as exceptionInfo:
+        with patch('json.loads') as jl:
+            test.query_payload()
 
+    jl.assert_not_called()
+    assert exceptionInfo.value.args[0] == "Payload exceeds the maximum size of 100 bytes."
 
-def test_LambdaProxyEvent_authorizer_claims_raisesIfRequestContextFieldIsMissing():
-    event = {}
 
-    test = ag.LambdaProxyEvent(event)
+def test_LambdaProxyEvent_query_payload_raisesIfTooLargeBeforeDecodingBase64():
+    event = {
+        "body": base64.b64encode(b'{ "key": "' + b'x' * 100 + b'" }').decode(),
+        "isBase64Encoded": True
+    }
 
-    with pytest.raises(AwsEventSpecificationError) as exceptionInfo:
-        with patch.object(ag.LambdaEvent, '_raiseCannotReachError', side_effect=ag.LambdaEvent._raiseCannotReachError) as mcre:
-            test.authorizer_claims()
+    test = ag.LambdaProxyEvent(event, max_payload_size=100)
 
-    mcre.assert_called_once_with("'requestContext'")
+    with pytest.raises(ag.HttpRequestEntityTooLargeError):
+        with patch('base64.b64decode') as bd:
+            test.query_payload()
 
+    bd.assert_not_called()
 
-def test_LambdaProxyEvent_authorizer_claims_raisesIfClaimsIsNotADict():
-    claims = ['192837645', 'jane@example.com', 'Jane', 'Doe']
-    
+
+def test_LambdaProxyEvent_query_payload_acceptsNoSizeLimit():
     event = {
-        'requestContext': {
-            'authorizer': {
-                'claims': claims
-            }
-        }
+        "body": "{ \"key\": \"" + 'x' * 100 + "\" }"
     }
 
-    test = ag.LambdaProxyEvent(event)
+    with patch.object(ag.LambdaProxyEvent, 'max_payload_size', 10):
+        assert ag.LambdaProxyEvent(event, max_payload_size=None).query_payload() == { 'key': 'x' * 100 }
 
-    with pytest.raises(AwsEventSpecificationError) as exceptionInfo:
-        test.authorizer_claims()
+        with pytest.raises(ag.HttpRequestEntityTooLargeError):
+            ag.LambdaProxyEvent(event).query_payload()
 
-    assert exceptionInfo.value.args[0] == "Claims should be a dict, not a <class 'list'>."  
-    
-    
-def test_HttpClientError_init_initializesStatusProperly(caplog):
-    status = random.randint(200, 599)
-    message = f'{random.randint(1000, 9999)} some text'
 
-    test = ag.HttpClientError(status, message)
+@pytest.mark.parametrize('encoding, compress', [
+    ('gzip', gzip.compress),
+    ('deflate', zlib.compress),
+    ('gzip, identity', gzip.compress)
+])
+def test_LambdaProxyEvent_query_payload_decompressesBodies(encoding, compress):
+    randInt = random.randint(1000, 100000)
 
-    assert test.status == status
+    event = {
+        "headers": { 'Content-Encoding': encoding },
+        "body": base64.b64encode(compress(("{ \"key\": " + repr(randInt) + " }").encode())).decode(),
+        "isBase64Encoded": True
+    }
 
+    test = ag.LambdaProxyEvent(event)
 
-def test_HttpClientError_init_initializesMessageProperly(caplog):
-    status = random.randint(200, 599)
-    message = f'{random.randint(1000, 9999)} some text'
+    assert test.query_payload() == { 'key': randInt }
 
-    test = ag.HttpClientError(status, message)
 
-    assert str(test) == message
+def test_LambdaProxyEvent_query_payload_decompressesStackedEncodings():
+    event = {
+        "headers": { 'Content-Encoding': 'deflate, gzip' },
+        "body": base64.b64encode(gzip.compress(zlib.compress(b'{ "key": 1 }'))).decode(),
+        "isBase64Encoded": True
+    }
 
+    assert ag.LambdaProxyEvent(event).query_payload() == { 'key': 1 }
 
-def test_simple_message_returnsProperPayload():
-    message = f'{random.randint(0, 9999)} with some blablah'
 
-    payload = ag.simple_message(message)
+def test_LambdaProxyEvent_query_payload_raisesIfDecompressedPayloadIsTooLarge():
+    event = {
+        "headers": { 'Content-Encoding': 'gzip' },
+        "body": base64.b64encode(gzip.compress(b'{ "key": "' + b'x' * 100000 + b'" }')).decode(),
+        "isBase64Encoded": True
+    }
 
-    assert payload == { "Message": message }
+    test = ag.LambdaProxyEvent(event, max_payload_size=1000)
 
+    with pytest.raises(ag.HttpRequestEntityTooLargeError) as exceptionInfo:
+        test.query_payload()
 
-def test_determine_content_type_acceptsAnyAnyByDefault():
-    event = ag.LambdaProxyEvent(
-        {
-            'headers': {
-                'Accept': '*/*'
-            }
-        }
-    )
+    assert exceptionInfo.value.args[0] == "Payload exceeds the maximum size of 1000 bytes."
 
-    selected = ag.determine_content_type(event)
 
-    assert selected == '*/*'
+def test_LambdaProxyEvent_query_payload_decompressesMultiMemberGzipBodies():
+    event = {
+        "headers": { 'Content-Encoding': 'gzip' },
+        "body": base64.b64encode(gzip.compress(b'{ "key": ') + gzip.compress(b'"value" }')).decode(),
+        "isBase64Encoded": True
+    }
+
+    assert ag.LambdaProxyEvent(event).query_payload() == { 'key': 'value' }
+
+
+def test_LambdaProxyEvent_query_payload_capsSizeAcrossGzipMembers():
+    member = gzip.compress(b' ' * 600)
+
+    event = {
+        "headers": { 'Content-Encoding': 'gzip' },
+        "body": base64.b64encode(member + member + gzip.compress(b'{}')).decode(),
+        "isBase64Encoded": True
+    }
+
+    with pytest.raises(ag.HttpRequestEntityTooLargeError):
+        ag.LambdaProxyEvent(event, max_payload_size=1000).query_payload()
+
+
+def test_LambdaProxyEvent_query_payload_raisesIfEncodingIsUnsupported():
+    event = {
+        "headers": { 'Content-Encoding': 'br' },
+        "body": "e30=",
+        "isBase64Encoded": True
+    }
+
+    with pytest.raises(ag.HttpUnsupportedMediaTypeError) as exceptionInfo:
+        ag.LambdaProxyEvent(event).query_payload()
+
+    assert exceptionInfo.value.args[0] == "Unsupported Content-Encoding: br."
+
+
+@pytest.mark.parametrize('body', [
+    base64.b64encode(b'not compressed').decode(),
+    base64.b64encode(gzip.compress(b'{ "key": 1 }')[:-10]).decode()
+])
+def test_LambdaProxyEvent_query_payload_raisesIfCompressedDataIsCorrupted(body):
+    event = {
+        "headers": { 'Content-Encoding': 'gzip' },
+        "body": body,
+        "isBase64Encoded": True
+    }
+
+    with pytest.raises(ag.MalformedPayloadError) as exceptionInfo:
+        ag.LambdaProxyEvent(event).query_payload()
+
+    assert exceptionInfo.value.args[0].startswith("Payload is malformed. Compressed data cannot be decoded: ")
+
+
+def test_LambdaProxyEvent_query_payload_raisesIfCompressedDataIsNotBase64Encoded():
+    event = {
+        "headers": { 'Content-Encoding': 'gzip' },
+        "body": "{}"
+    }
+
+    with pytest.raises(ag.MalformedPayloadError) as exceptionInfo:
+        ag.LambdaProxyEvent(event).query_payload()
+
+    assert exceptionInfo.value.args[0] == "Payload is malformed. Compressed payloads are expected to be base64 encoded."
+
+
+def _api_event(method='GET', path='/items', headers=None, query=None, **fields):
+    return ag.LambdaProxyEvent(
+        {
+            'requestContext': { 'httpMethod': method, 'path': path },
+            'headers': headers or {},
+            'queryStringParameters': None,
+            'multiValueQueryStringParameters': query,
+            **fields
+        }
+    )
+
+
+def _multipart_event(parts, boundary='XyZ-boundary'):
+    body = b''
+
+    for headers, content in parts:
+        body += b'--' + boundary.encode() + b'\r\n' + b''.join(h.encode() + b'\r\n' for h in headers) + b'\r\n' + content + b'\r\n'
+
+    body += b'--' + boundary.encode() + b'--\r\n'
+
+    return _api_event('POST', headers={ 'Content-Type': f'multipart/form-data; boundary="{boundary}"' }, body=base64.b64encode(body).decode(), isBase64Encoded=True)
+
+
+def test_LambdaProxyEvent_form_parsesUrlEncodedBodies():
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': { 'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8' },
+            'body': 'name=Jane+Doe&colors=red&colors=blue&empty=&city=S%C3%A3o%20Paulo'
+        }
+    )
+
+    assert event.form() == { 'name': ['Jane Doe'], 'colors': ['red', 'blue'], 'empty': [''], 'city': ['São Paulo'] }
+    assert event.files() == {}
+
+
+def test_LambdaProxyEvent_form_parsesMultipartFields():
+    event = _multipart_event([
+        ([ 'Content-Disposition: form-data; name="name"' ], 'Jane Doe'.encode()),
+        ([ 'Content-Disposition: form-data; name="colors"' ], b'red'),
+        ([ 'Content-Disposition: form-data; name="colors"', 'Content-Type: text/plain; charset=latin-1' ], 'bl\xe9'.encode('latin-1'))
+    ])
+
+    assert event.form() == { 'name': ['Jane Doe'], 'colors': ['red', 'blé'] }
+    assert event.files() == {}
+
+
+def test_LambdaProxyEvent_files_returnsZeroCopyViews():
+    content = bytes(random.getrandbits(8) for _ in range(1000)) + b'\r\n--not-the-boundary'
+
+    event = _multipart_event([
+        ([ 'Content-Disposition: form-data; name="title"' ], b'My cat'),
+        ([ 'Content-Disposition: form-data; name="picture"; filename="cat.png"', 'Content-Type: image/png' ], content)
+    ])
+
+    test = event.files()['picture'][0]
+
+    assert event.form() == { 'title': ['My cat'] }
+    assert isinstance(test.data, memoryview)
+    assert test.data == content
+    assert test.path is None
+    assert (test.name, test.filename, test.content_type, test.size) == ('picture', 'cat.png', 'image/png', len(content))
+
+    with test.open() as f:
+        assert f.read() == content
+
+
+@pytest.mark.parametrize('disposition, expected', [
+    ('form-data; name="doc"; filename="say \\"hi\\", q=0.txt"', 'say "hi", q=0.txt'),
+    ('form-data; name="doc"; filename="naive.txt"; filename*=UTF-8\'\'na%C3%AFve.txt', 'naïve.txt'),
+    ('form-data; name=doc; filename=plain.txt', 'plain.txt')
+])
+def test_LambdaProxyEvent_files_parsesDispositionParameters(disposition, expected):
+    event = _multipart_event([ ([ f'Content-Disposition: {disposition}' ], b'content') ])
+
+    with patch('awsmate.apigateway.parse_header_preferences') as mphp:
+        test = event.files()['doc'][0]
+
+    mphp.assert_not_called()
+    assert test.filename == expected
+
+
+def test_LambdaProxyEvent_files_spillsLargeFilesToDisk(tmp_path):
+    content = b'x' * 2000
+
+    event = _multipart_event([
+        ([ 'Content-Disposition: form-data; name="document"; filename="big.txt"' ], content)
+    ])
+
+    event.file_spill_threshold = 1000
+    test = event.files()['document'][0]
+
+    try:
+        assert test.data is None
+        assert test.content_type == 'application/octet-stream'
+        assert test.size == len(content)
+
+        with test.open() as f:
+            assert f.read() == content
+
+        test.save(str(tmp_path / 'copy.txt'))
+        assert (tmp_path / 'copy.txt').read_bytes() == content
+
+    finally:
+        test.discard()
+
+    assert not os.path.exists(test.path)
+
+
+def test_LambdaProxyEvent_form_parsesOnlyOnce():
+    event = _multipart_event([
+        ([ 'Content-Disposition: form-data; name="name"' ], b'Jane')
+    ])
+
+    form = event.form()
+
+    with patch.object(event, '_decoded_body') as db:
+        assert event.form() is form
+        db.assert_not_called()
+
+
+def test_LambdaProxyEvent_form_returnsEmptyFormIfBodyIsNull():
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': { 'Content-Type': 'multipart/form-data; boundary=abc' },
+            'body': None
+        }
+    )
+
+    assert event.form() == {}
+    assert event.files() == {}
+
+
+def test_LambdaProxyEvent_form_raisesIfNotAForm():
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': { 'Content-Type': 'application/json' },
+            'body': '{}'
+        }
+    )
+
+    with pytest.raises(ag.HttpUnsupportedMediaTypeError) as exceptionInfo:
+        event.form()
+
+    assert exceptionInfo.value.args[0] == "Unsupported Content-Type: application/json. Expected a form."
+
+
+@pytest.mark.parametrize('content_type, body, message', [
+    ('multipart/form-data', '--abc--', "Payload is malformed. Multipart boundary is missing from the Content-Type header."),
+    ('multipart/form-data; boundary=abc', 'nothing', "Payload is malformed. Multipart boundary cannot be found."),
+    ('multipart/form-data; boundary=abc', '--abc\r\nContent-Disposition: form-data; name="a"\r\n\r\nvalue', "Payload is malformed. Multipart body is truncated."),
+    ('multipart/form-data; boundary=abc', '--abc\r\nContent-Disposition: form-data\r\n\r\nvalue\r\n--abc--', "Payload is malformed. Multipart part has no name.")
+])
+def test_LambdaProxyEvent_form_raisesIfMultipartIsMalformed(content_type, body, message):
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': { 'Content-Type': content_type },
+            'body': body
+        }
+    )
+
+    with pytest.raises(ag.MalformedPayloadError) as exceptionInfo:
+        event.files()
+
+    assert exceptionInfo.value.args[0] == message
+
+
+
+def test_LambdaProxyEvent_authorizer_claims_returnsTheClaimsIfAny():
+    claims = {
+        'cognito:username': '192837645', 
+        'email': 'jane@example.com', 
+        'given_name': 'Jane', 
+        'family_name': 'Doe'
+    }
+    
+    event = {
+        'requestContext': {
+            'authorizer': {
+                'claims': claims
+            }
+        }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    assert  test.authorizer_claims() == claims
+
+
+def test_LambdaProxyEvent_authorizer_claims_returnsTheClaimsEvenIfNone():
+    event = {
+        'requestContext': {
+            'authorizer': {
+                'claims': None
+            }
+        }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    assert  test.authorizer_claims() is None    
+
+
+def test_LambdaProxyEvent_authorizer_claims_returnsNoneIfNoClaims():
+    event = {
+        'requestContext': {
+            'authorizer': {}
+        }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    assert  test.authorizer_claims() is None
+
+
+def test_LambdaProxyEvent_authorizer_claims_returnsNoneIfNoAuthorizer():
+    event = {
+        'requestContext': {}
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    assert  test.authorizer_claims() is None
+
+
+def test_LambdaProxyEvent_authorizer_claims_raisesIfRequestContextFieldIsMissing():
+    event = {}
+
+    test = ag.LambdaProxyEvent(event)
+
+    with pytest.raises(AwsEventSpecificationError) as exceptionInfo:
+        with patch.object(ag.LambdaEvent, '_raiseCannotReachError', side_effect=ag.LambdaEvent._raiseCannotReachError) as mcre:
+            test.authorizer_claims()
+
+    mcre.assert_called_once_with("'requestContext'")
+
+
+def test_LambdaProxyEvent_authorizer_claims_raisesIfClaimsIsNotADict():
+    claims = ['192837645', 'jane@example.com', 'Jane', 'Doe']
+    
+    event = {
+        'requestContext': {
+            'authorizer': {
+                'claims': claims
+            }
+        }
+    }
+
+    test = ag.LambdaProxyEvent(event)
+
+    with pytest.raises(AwsEventSpecificationError) as exceptionInfo:
+        test.authorizer_claims()
+
+    assert exceptionInfo.value.args[0] == "Claims should be a dict, not a <class 'list'>."  
+    
+    
+def test_HttpClientError_init_initializesStatusProperly(caplog):
+    status = random.randint(200, 599)
+    message = f'{random.randint(1000, 9999)} some text'
+
+    test = ag.HttpClientError(status, message)
+
+    assert test.status == status
+
+
+def test_HttpClientError_init_initializesMessageProperly(caplog):
+    status = random.randint(200, 599)
+    message = f'{random.randint(1000, 9999)} some text'
+
+    test = ag.HttpClientError(status, message)
+
+    assert str(test) == message
+
+
+@pytest.mark.parametrize('status, expected', [
+    (404, ag.HttpNotFoundError),
+    (405, ag.HttpMethodNotAllowedError),
+    (418, ag.HttpImATeapotError),
+    (425, ag.HttpTooEarlyError),
+    (451, ag.HttpUnavailableForLegalReasonsError),
+    (503, ag.HttpRServiceUnavailableError),
+    (511, ag.HttpNetworkAuthenticationRequiredError)
+])
+def test_HttpError_for_status_returnsDefinedClasses(status, expected):
+    assert ag.HttpError.for_status(status) is expected
+    assert expected().status == status
+
+
+@pytest.mark.parametrize('error, phrase', [
+    (ag.HttpImATeapotError, "I'm a Teapot"),
+    (ag.HttpTooEarlyError, 'Too Early'),
+    (ag.HttpUnavailableForLegalReasonsError, 'Unavailable For Legal Reasons')
+])
+def test_HttpError_statusesMissingFromOlderPythons_haveDefaultMessage(error, phrase):
+    assert str(error()) == phrase
+    assert str(error('some message')) == 'some message'
+
+
+@pytest.mark.parametrize('status, base', [ (418, ag.HttpClientError), (451, ag.HttpClientError), (506, ag.HttpServerError) ])
+def test_http_error_class_generatesErrorClasses(status, base):
+    errorClass = ag._http_error_class(ag.HTTPStatus(status))
+
+    assert issubclass(errorClass, base)
+    assert errorClass().status == status
+    assert str(errorClass()) == ag.HTTPStatus(status).phrase
+    assert str(errorClass('some message')) == 'some message'
+
+
+def test_build_http_errors_bindsGeneratedClassesToModule(monkeypatch):
+    class NewStatus(enum.IntEnum):
+        SOME_NEW_STATUS = 499
+
+        @property
+        def phrase(self):
+            return 'Some New Status'
+
+    class Statuses(type):
+        def __iter__(cls):
+            return iter([ *knownStatuses, NewStatus.SOME_NEW_STATUS ])
+
+        def __getattr__(cls, name):
+            return getattr(knownStatuses, name)
+
+    knownStatuses = ag.HTTPStatus
+    monkeypatch.setattr(ag, 'HTTPStatus', Statuses('HTTPStatus', (), {}))
+
+    try:
+        errors = ag._build_http_errors()
+
+        assert errors[404] is ag.HttpNotFoundError
+        assert errors[499] is ag.HttpSomeNewStatusError
+        assert str(ag.HttpSomeNewStatusError()) == 'Some New Status'
+
+    finally:
+        vars(ag).pop('HttpSomeNewStatusError', None)
+
+
+@pytest.mark.parametrize('status', [ 200, 304, 499, 600, '404' ])
+def test_HttpError_for_status_rejectsUnknownStatuses(status):
+    with pytest.raises(ValueError, match=f'Unknown HTTP error status: {status}.'):
+        ag.HttpError.for_status(status)
+
+
+def test_problem_payload_returnsProblemDetails():
+    assert ag.problem_payload(ag.HttpNotFoundError('No such report: 42.')) == {
+        'type': 'about:blank',
+        'title': 'Not Found',
+        'status': 404,
+        'detail': 'No such report: 42.'
+    }
+
+
+def test_problem_payload_acceptsOptionalMembers():
+    payload = ag.problem_payload(ag.HttpError(499, 'Client Closed'), detail='Gone away', type='https://example.com/closed', instance='/reports/42')
+
+    assert payload == { 'type': 'https://example.com/closed', 'title': 'Client Closed', 'status': 499, 'detail': 'Gone away', 'instance': '/reports/42' }
+
+
+def test_problem_transformer_returnsProblemJson():
+    payload = ag.problem_payload(ag.HttpConflictError())
+
+    body, contentType = ag.problem_transformer(payload)
+
+    assert contentType == 'application/problem+json; charset=utf-8'
+    assert json.loads(body) == payload
+    assert ag.problem_transformer({ 'detail': [ 'unhashable' ] })[0] == '{"detail":["unhashable"]}'
+
+
+def test_problem_transformer_keepsValueTypes():
+    assert ag.problem_transformer({ 'value': 1 })[0] == '{"value":1}'
+    assert ag.problem_transformer({ 'value': True })[0] == '{"value":true}'
+    assert ag.problem_transformer({ 'value': 1.0 })[0] == '{"value":1.0}'
+
+
+def test_simple_message_returnsProperPayload():
+    message = f'{random.randint(0, 9999)} with some blablah'
+
+    payload = ag.simple_message(message)
+
+    assert payload == { "Message": message }
+
+
+def test_determine_content_type_acceptsAnyAnyByDefault():
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': {
+                'Accept': '*/*'
+            }
+        }
+    )
+
+    selected = ag.determine_content_type(event)
+
+    assert selected == '*/*'
 
 
 def test_determine_content_type_acceptsApplicationAnyByDefault():
@@ -910,6 +1663,171 @@ def test_determine_content_type_raisesWithRandomType():
     assert exceptionInfo.value.args[0] == "None of the formats specified in the Accept header are available. Available formats are: application/json."  
 
 
+def test_determine_content_type_acceptsContentNegotiator():
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': {
+                'Accept': 'text/*'
+            }
+        }
+    )
+
+    negotiator = ag.ContentNegotiator({ 'text/html': lambda x : x })
+
+    assert ag.determine_content_type(event, custom_transformers = negotiator) == 'text/html'
+
+
+def test_negotiate_returnsMediaTypeTransformerAndEncoding():
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': {
+                'Accept': 'application/*',
+                'Accept-Encoding': 'deflate, gzip;q=0.5'
+            }
+        }
+    )
+
+    test = ag.negotiate(event)
+
+    assert test.media_type == 'application/*'
+    assert test.transformer is ag.json_transformer
+    assert test.encoding == 'deflate'
+
+
+def test_negotiate_defaultsToIdentityEncoding():
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': {
+                'Accept-Encoding': 'identity, gzip'
+            }
+        }
+    )
+
+    assert ag.negotiate(event).encoding == 'identity'
+    assert ag.negotiate(ag.LambdaProxyEvent({ 'headers': {} })).encoding == 'identity'
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip;q=0.5, deflate', 'deflate'),
+    ('br, gzip', 'gzip'),
+    ('*', 'gzip'),
+    ('gzip;q=0, *', 'deflate'),
+    ('gzip;q=0, deflate;q=0, *', 'identity'),
+    ('br', 'identity')
+])
+def test_negotiate_selectsEncodingAccordingToQualityValues(accept_encoding, expected):
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': accept_encoding } })
+
+    assert ag.negotiate(event).encoding == expected
+
+
+def test_negotiate_cachesResultOnEvent():
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': {
+                'Accept': 'text/*'
+            }
+        }
+    )
+
+    negotiator = ag.ContentNegotiator({ 'text/html': lambda x : x })
+    test = ag.negotiate(event, custom_transformers = negotiator)
+
+    with patch.object(negotiator, 'negotiate') as negotiate:
+        assert ag.negotiate(event, custom_transformers = negotiator) is test
+        assert ag.determine_content_type(event, custom_transformers = negotiator) == 'text/html'
+        negotiate.assert_not_called()
+
+    with pytest.raises(ag.HttpNotAcceptableError):
+        ag.negotiate(event)
+
+
+def test_ContentNegotiator_negotiate_matchesMediaRangesWithRegisteredTypes():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x, 'text/csv': lambda x : x })
+
+    assert test.negotiate('text/*') == 'text/html'
+
+
+def test_ContentNegotiator_negotiate_prefersRegisteredMediaRanges():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x, 'text/*': lambda x : x })
+
+    assert test.negotiate('text/*') == 'text/*'
+
+
+def test_ContentNegotiator_negotiate_excludesZeroWeightedTypes():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x, 'text/csv': lambda x : x })
+
+    assert test.negotiate('text/*, text/html;q=0') == 'text/csv'
+
+
+def test_ContentNegotiator_negotiate_excludesZeroWeightedMediaRanges():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x, 'image/png': lambda x : x })
+
+    assert test.negotiate('image/*, text/*;q=0') == 'image/png'
+
+
+def test_ContentNegotiator_negotiate_excludesZeroWeightedTypesFromRegisteredMediaRanges():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x })
+
+    assert test.negotiate('*/*;q=0.1, application/json;q=0') == 'text/html'
+    assert test.negotiate('*/*;q=0.1, image/png;q=0') == '*/*'
+
+    with pytest.raises(ag.HttpNotAcceptableError):
+        ag.ContentNegotiator().negotiate('*/*;q=0.1, application/json;q=0')
+
+
+def test_ContentNegotiator_negotiate_prefersMoreSpecificTypes():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x, 'text/csv': lambda x : x })
+
+    assert test.negotiate('text/*, text/csv') == 'text/csv'
+
+
+def test_ContentNegotiator_negotiate_isCaseInsensitive():
+    test = ag.ContentNegotiator({ 'text/HTML': lambda x : x })
+
+    assert test.negotiate('Text/Html') == 'text/HTML'
+
+
+def test_ContentNegotiator_negotiate_assumesAnyAnyIfNoAcceptHeader():
+    assert ag.ContentNegotiator().negotiate(None) == '*/*'
+    assert ag.ContentNegotiator().negotiate('') == '*/*'
+
+
+def test_ContentNegotiator_negotiate_raisesIfNothingMatches():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x, 'text/*': lambda x : x })
+
+    with pytest.raises(ag.HttpNotAcceptableError) as exceptionInfo:
+        test.negotiate('image/*')
+
+    assert exceptionInfo.value.args[0] == "None of the formats specified in the Accept header are available. Available formats are: application/json, text/html."
+
+
+def test_ContentNegotiator_negotiate_cachesDecisions():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x })
+
+    test.negotiate('text/*')
+
+    with patch.object(test, '_resolve') as mr:
+        assert test.negotiate('text/*') == 'text/html'
+
+    mr.assert_not_called()
+
+
+def test_ContentNegotiator_transformer_returnsRegisteredTransformer():
+    transformer = lambda x : x
+
+    test = ag.ContentNegotiator({ 'text/html': transformer })
+
+    assert test.transformer('text/html') is transformer
+    assert test.transformer('*/*') is ag.json_transformer
+
+
+def test_ContentNegotiator_available_formats_excludesMediaRanges():
+    test = ag.ContentNegotiator({ 'text/html': lambda x : x, 'text/*': lambda x : x })
+
+    assert test.available_formats == ('application/json', 'text/html')
+
+
 def test_is_binary_returnsFalseForTextAny():
     mimeType = f'text/{random.randint(1000, 9999)}'
 
@@ -934,6 +1852,16 @@ def test_is_binary_returnsFalseForApplicationXml():
     assert ag.is_binary(mimeType) is False    
 
 
+@pytest.mark.parametrize('mimeType', [ 'application/problem+json; charset=utf-8', 'application/atom+xml' ])
+def test_is_binary_returnsFalseForStructuredSyntaxSuffixes(mimeType):
+    assert ag.is_binary(mimeType) is False
+
+
+@pytest.mark.parametrize('mimeType', [ 'application/x-ndjson; charset=utf-8', 'application/javascript' ])
+def test_is_binary_returnsFalseForOtherTextualApplicationTypes(mimeType):
+    assert ag.is_binary(mimeType) is False
+
+
 def test_is_binary_returnsTrueForApplicationAny():
     mimeType = f'application/{random.randint(1000, 9999)}'
 
@@ -980,6 +1908,148 @@ def test_json_transformer_returnsProperContentType():
     assert contentType == 'application/json; charset=utf-8'    
 
 
+def test_json_transformer_isCompactAndNotAsciiEscaped():
+    content, _ = ag.json_transformer({ 'city': 'São Paulo', 'values': [1, 2] })
+
+    assert content == '{"city":"São Paulo","values":[1,2]}'
+
+
+def test_JsonTransformer_supportsExtraTypes():
+    @dataclasses.dataclass
+    class Point:
+        x: int
+        at: datetime.date
+
+    class Color(enum.Enum):
+        RED = 'red'
+
+    identifier = uuid.uuid4()
+
+    payload = {
+        'point': Point(1, datetime.date(2020, 1, 2)),
+        'when': datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+        'time': datetime.time(3, 4),
+        'price': decimal.Decimal('12.50'),
+        'count': decimal.Decimal('3'),
+        'id': identifier,
+        'color': Color.RED,
+        'tags': frozenset(['a']),
+        'rows': iter([1, 2])
+    }
+
+    content, _ = ag.JsonTransformer()(payload)
+
+    assert json.loads(content) == {
+        'point': { 'x': 1, 'at': '2020-01-02' },
+        'when': '2020-01-02T03:04:05+00:00',
+        'time': '03:04:00',
+        'price': 12.5,
+        'count': 3,
+        'id': str(identifier),
+        'color': 'red',
+        'tags': ['a'],
+        'rows': [1, 2]
+    }
+
+
+def test_JsonTransformer_canBeConfigured():
+    test = ag.JsonTransformer(compact=False, ensure_ascii=True, indent=4, sort_keys=True)
+
+    content, contentType = test({ 'b': 'é', 'a': 1 })
+
+    assert content == '{\n    "a": 1,\n    "b": "\\u00e9"\n}'
+    assert contentType == 'application/json; charset=utf-8'
+
+
+def test_JsonTransformer_fallsBackToCustomDefault():
+    class Custom:
+        pass
+
+    test = ag.JsonTransformer(default=lambda obj: 'custom')
+
+    assert test({ 'a': Custom(), 'b': decimal.Decimal('1') })[0] == '{"a":"custom","b":1}'
+
+    with pytest.raises(TypeError):
+        ag.JsonTransformer()({ 'a': Custom() })
+
+
+def test_ndjson_transformer_writesOneDocumentPerLine():
+    chunks, contentType = ag.ndjson_transformer(({ 'id': i, 'name': f'é{i}' } for i in range(3)))
+
+    assert ''.join(chunks) == '{"id":0,"name":"é0"}\n{"id":1,"name":"é1"}\n{"id":2,"name":"é2"}\n'
+    assert contentType == 'application/x-ndjson; charset=utf-8'
+
+
+def test_build_http_response_returnsNdjsonAsText():
+    event = _api_event(headers={ 'Accept': 'application/x-ndjson' })
+
+    response = ag.build_http_response(200, [ { 'a': 1 }, { 'b': 2 } ], event = event, custom_transformers = ag.tabular_transformers)
+
+    assert response['isBase64Encoded'] is False
+    assert response['body'] == '{"a":1}\n{"b":2}\n'
+    assert response['headers']['Content-Type'] == 'application/x-ndjson; charset=utf-8'
+
+
+def test_ndjson_transformer_consumesRowsLazily():
+    consumed = []
+
+    def rows():
+        for i in range(10000):
+            consumed.append(i)
+            yield { 'id': i, 'padding': 'x' * 100 }
+
+    chunks, _ = ag.ndjson_transformer(rows())
+
+    assert consumed == []
+
+    first = next(chunks)
+
+    assert 0 < len(consumed) < 10000
+    assert len(first) >= ag._tabular_batch_size
+    assert len((first + ''.join(chunks)).splitlines()) == 10000
+
+
+def test_ndjson_transformer_handlesSingleMappings():
+    chunks, _ = ag.ndjson_transformer({ 'Message': 'Not Found' })
+
+    assert ''.join(chunks) == '{"Message":"Not Found"}\n'
+
+
+def test_csv_transformer_writesHeaderForMappings():
+    chunks, contentType = ag.csv_transformer(iter([ { 'id': 1, 'name': 'Doe, Jane' }, { 'id': 2, 'name': 'John', 'extra': 'ignored' } ]))
+
+    assert ''.join(chunks) == 'id,name\r\n1,"Doe, Jane"\r\n2,John\r\n'
+    assert contentType == 'text/csv; charset=utf-8; header=present'
+
+
+def test_csv_transformer_writesSequences():
+    chunks, contentType = ag.csv_transformer([ (1, 'a'), (2, 'b') ])
+
+    assert ''.join(chunks) == '1,a\r\n2,b\r\n'
+    assert contentType == 'text/csv; charset=utf-8; header=absent'
+
+
+def test_csv_transformer_handlesEmptyPayloads():
+    chunks, _ = ag.csv_transformer([])
+
+    assert ''.join(chunks) == ''
+
+
+def test_tabular_transformers_areNegotiatedAndStreamed():
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'text/csv, application/json;q=0.5', 'Accept-Encoding': 'gzip' } })
+    rows = ({ 'id': i, 'label': f'row {i}' } for i in range(5000))
+
+    response = ag.build_http_response(200, rows, event = event, custom_transformers = ag.tabular_transformers)
+
+    lines = gzip.decompress(base64.b64decode(response['body'])).decode('utf-8').splitlines()
+
+    assert response['headers']['Content-Type'] == 'text/csv; charset=utf-8; header=present'
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert lines[0] == 'id,label'
+    assert lines[-1] == '4999,row 4999'
+    assert len(lines) == 5001
+
+
 def test__basic_transformers_areAllJson():
     assert ag._basic_transformers == {
         '*/*': ag.json_transformer,
@@ -988,7 +2058,7 @@ def test__basic_transformers_areAllJson():
     }
 
 
-def test_build_http_response_returnsPrettyJsonPayloadByDefault():
+def test_build_http_response_returnsCompactJsonPayloadByDefault():
     status = random.randint(200, 599)
     
     payload = {
@@ -999,7 +2069,7 @@ def test_build_http_response_returnsPrettyJsonPayloadByDefault():
     expectedResponse = {
         'isBase64Encoded': False,
         'statusCode': status,
-        'body': json.dumps(payload, indent = 2),
+        'body': json.dumps(payload, separators = (',', ':'), ensure_ascii = False),
         'headers': {     
             'Content-Type': 'application/json; charset=utf-8'
         }
@@ -1018,7 +2088,7 @@ def test_build_http_response_turnsStringPayloadsIntoSimpleMessages():
     expectedResponse = {
         'isBase64Encoded': False,
         'statusCode': status,
-        'body': json.dumps(ag.simple_message(message), indent = 2),
+        'body': json.dumps(ag.simple_message(message), separators = (',', ':'), ensure_ascii = False),
         'headers': {     
             'Content-Type': 'application/json; charset=utf-8'
         }
@@ -1030,14 +2100,11 @@ def test_build_http_response_turnsStringPayloadsIntoSimpleMessages():
 
 
 def test_build_http_response_returnsZippedPayloadIfDesired():
-    import base64
-    import gzip
-    
     status = random.randint(200, 599)
     
     payload = {
         "val": random.randint(0, 1000),
-        "msg": f"MSG{str(random.randint(0, 1000))}"
+        "msg": f"MSG{str(random.randint(0, 1000))}" * 400
     }
 
     event = ag.LambdaProxyEvent(
@@ -1048,19 +2115,193 @@ def test_build_http_response_returnsZippedPayloadIfDesired():
         }
     )    
 
-    expectedResponse = {
-        'isBase64Encoded': True,
-        'statusCode': status,
-        'body': base64.b64encode(gzip.compress(json.dumps(payload, indent = 2).encode('utf-8'))).decode('utf-8'),
-        'headers': {     
-            'Content-Type': 'application/json; charset=utf-8',
-            'Content-Encoding': 'gzip'
-        }
+    response = ag.build_http_response(status, payload, event = event) 
+
+    assert response['isBase64Encoded'] is True
+    assert response['statusCode'] == status
+    assert response['headers'] == { 'Content-Type': 'application/json; charset=utf-8', 'Content-Encoding': 'gzip' }
+    assert gzip.decompress(base64.b64decode(response['body'])) == json.dumps(payload, separators = (',', ':'), ensure_ascii = False).encode('utf-8')
+
+
+def test_build_http_response_returnsDeflatedPayloadIfPreferred():
+    payload = { 'msg': 'x' * 2000 }
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip;q=0.5, deflate' } })
+
+    response = ag.build_http_response(200, payload, event = event)
+
+    assert response['headers']['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(base64.b64decode(response['body'])) == json.dumps(payload, separators = (',', ':'), ensure_ascii = False).encode('utf-8')
+
+
+def test_build_http_response_doesNotCompressSmallBodies():
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip' } })
+
+    response = ag.build_http_response(200, 'OK', event = event)
+
+    assert response['isBase64Encoded'] is False
+    assert 'Content-Encoding' not in response['headers']
+    assert json.loads(response['body']) == { 'Message': 'OK' }
+
+
+def test_build_http_response_followsCompressionPolicy():
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'deflate, gzip' } })
+    policy = ag.CompressionPolicy(min_size = 0, level = 1, encodings = ('gzip',))
+
+    response = ag.build_http_response(200, 'OK', event = event, compression = policy)
+
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(base64.b64decode(response['body'])) == b'{"Message":"OK"}'
+
+    policy = ag.CompressionPolicy(min_size = 0, level = 1)
+
+    response = ag.build_http_response(200, 'OK', event = event, compression = policy)
+
+    assert response['headers']['Content-Encoding'] == 'deflate'
+    assert base64.b64decode(response['body']) == policy.compress(json.dumps({ 'Message': 'OK' }, separators = (',', ':'), ensure_ascii = False).encode('utf-8'), 'deflate')
+
+
+def test_build_http_response_negotiatesEncodingsAllowedByPolicy():
+    policy = ag.CompressionPolicy(min_size = 0, encodings = ('deflate',))
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip, deflate' } })
+
+    assert ag.negotiate(event, compression = policy).encoding == 'deflate'
+    assert ag.build_http_response(200, 'OK', event = event, compression = policy)['headers']['Content-Encoding'] == 'deflate'
+
+    negotiated = ag.negotiate(ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip, deflate;q=0.5' } }))
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip, deflate;q=0.5' } })
+
+    assert negotiated.encoding == 'gzip'
+    assert ag.build_http_response(200, 'OK', event = event, negotiation = negotiated, compression = policy)['headers']['Content-Encoding'] == 'deflate'
+    assert 'Content-Encoding' not in ag.build_http_response(200, 'OK', event = event, compression = ag.CompressionPolicy(min_size = 0, encodings = ()))['headers']
+
+
+def test_stream_http_response_negotiatesEncodingsAllowedByPolicy():
+    writer = ag.LocalStreamWriter()
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip, deflate' } })
+
+    ag.stream_http_response(writer, 200, 'x' * 2000, event = event, content_type = 'text/plain', compression = ag.CompressionPolicy(encodings = ('deflate',)))
+
+    assert writer.prelude()['headers']['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(writer.body()) == b'x' * 2000
+
+
+@pytest.mark.parametrize('size', [ 10, 100000, 300001 ])
+def test_build_http_response_streamsTransformerOutput(size):
+    text = ''.join(random.choice('abcdefghé€') for _ in range(size))
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'text/plain', 'Accept-Encoding': 'gzip' } })
+    policy = ag.CompressionPolicy(min_size = 100)
+
+    def chunks(payload):
+        for i in range(0, len(text), 7777):
+            yield text[i:i + 7777] if i % 2 else text[i:i + 7777].encode('utf-8')
+
+    transformers = {
+        'str': lambda payload: (text, 'text/plain'),
+        'bytes': lambda payload: (text.encode('utf-8'), 'text/plain'),
+        'chunks': lambda payload: (chunks(payload), 'text/plain')
     }
 
-    response = ag.build_http_response(status, payload, event = event) 
+    for transformer in transformers.values():
+        response = ag.build_http_response(200, {}, event = event, custom_transformers = { 'text/plain': transformer }, compression = policy)
 
-    assert response == expectedResponse
+        if size < 100:
+            assert 'Content-Encoding' not in response['headers']
+            assert response['body'] == text
+        else:
+            assert response['headers']['Content-Encoding'] == 'gzip'
+            assert response['isBase64Encoded'] is True
+            assert gzip.decompress(base64.b64decode(response['body'])).decode('utf-8') == text
+
+
+def test_build_http_response_decodesUncompressedBytesAndChunks():
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'text/plain' } })
+
+    for output in [ 'hé'.encode('utf-8'), iter([ 'h', 'é'.encode('utf-8') ]) ]:
+        response = ag.build_http_response(200, {}, event = event, custom_transformers = { 'text/plain': lambda payload: (output, 'text/plain') })
+
+        assert response['body'] == 'hé'
+        assert response['isBase64Encoded'] is False
+
+
+def test_build_http_response_encodesBinaryContentOnce():
+    data = bytes(random.getrandbits(8) for _ in range(1000))
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'image/png', 'Accept-Encoding': 'gzip' } })
+
+    outputs = [
+        lambda: data,
+        lambda: bytearray(data),
+        lambda: memoryview(data),
+        lambda: iter([ data[:100], data[100:] ])
+    ]
+
+    for output in outputs:
+        response = ag.build_http_response(200, {}, event = event, custom_transformers = { 'image/png': lambda payload: (output(), 'image/png') })
+
+        assert response['isBase64Encoded'] is True
+        assert 'Content-Encoding' not in response['headers']
+        assert base64.b64decode(response['body']) == data
+
+
+def test_build_http_response_keepsBinaryContentReturnedAsString():
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'application/pdf' } })
+    encoded = base64.b64encode(b'%PDF-1.4').decode('ascii')
+
+    response = ag.build_http_response(200, {}, event = event, custom_transformers = { 'application/pdf': lambda payload: (encoded, 'application/pdf') })
+
+    assert response['isBase64Encoded'] is True
+    assert response['body'] == encoded
+
+
+def test_build_http_response_compressesBinaryCompressibleTypes():
+    svg = ('<svg xmlns="http://www.w3.org/2000/svg">' + '<rect/>' * 500 + '</svg>').encode('utf-8')
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'image/svg+xml', 'Accept-Encoding': 'gzip' } })
+
+    response = ag.build_http_response(200, {}, event = event, custom_transformers = { 'image/svg+xml': lambda payload: (memoryview(svg), 'image/svg+xml') })
+
+    assert response['isBase64Encoded'] is True
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(base64.b64decode(response['body'])) == svg
+
+
+def test_CompressionPolicy_is_compressible_matchesTypesRangesAndSuffixes():
+    test = ag.CompressionPolicy()
+
+    assert test.is_compressible('application/json; charset=utf-8')
+    assert test.is_compressible('text/csv')
+    assert test.is_compressible('application/problem+json')
+    assert test.is_compressible('application/atom+XML')
+    assert not test.is_compressible('image/png')
+    assert not test.is_compressible('application/pdf')
+    assert not test.is_compressible('application/zip')
+
+
+def test_CompressionPolicy_select_appliesThreshold():
+    test = ag.CompressionPolicy(min_size = 100)
+
+    assert test.select('gzip', 'application/json', 100) == 'gzip'
+    assert test.select('gzip', 'application/json', 99) == 'identity'
+    assert test.select('gzip', 'image/png', 1000) == 'identity'
+    assert test.select('identity', 'application/json', 1000) == 'identity'
+
+
+def test_CompressionPolicy_compress_isDeterministic():
+    test = ag.CompressionPolicy(level = 4)
+    data = b'some data' * 100
+
+    assert test.compress(data, 'gzip') == test.compress(data, 'gzip')
+    assert gzip.decompress(test.compress(data, 'gzip')) == data
+    assert zlib.decompress(test.compress(data, 'deflate')) == data
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({ 'level': 0 }, 'Compression level is out of range: 0.'),
+    ({ 'encodings': ('br',) }, 'Unsupported compression encoding: br.')
+])
+def test_CompressionPolicy_raisesOnBadSettings(kwargs, message):
+    with pytest.raises(ValueError) as exceptionInfo:
+        ag.CompressionPolicy(**kwargs)
+
+    assert exceptionInfo.value.args[0] == message
 
 
 def test_build_http_response_returnsMimeTypeAccordingToCustomPreferences():
@@ -1086,11 +2327,74 @@ def test_build_http_response_returnsMimeTypeAccordingToCustomPreferences():
         'headers': {     
             'Content-Type': 'text/strange'
         }
-    }
+    }
+
+    response = ag.build_http_response(status, payload, event=event, custom_transformers={ 'text/*': lambda x : (x, 'text/strange') })
+
+    assert response == expectedResponse
+
+
+def test_build_http_response_acceptsContentNegotiator():
+    status = random.randint(200, 599)
+
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': {
+                'Accept': 'text/*'
+            }
+        }
+    )
+
+    negotiator = ag.ContentNegotiator({ 'text/plain': lambda x : (x['Message'], 'text/plain') })
+
+    response = ag.build_http_response(status, 'some message', event=event, custom_transformers=negotiator)
+
+    assert response['body'] == 'some message'
+    assert response['headers']['Content-Type'] == 'text/plain'
+
+
+def test_build_http_response_reusesNegotiationResult():
+    status = random.randint(200, 599)
+
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': {
+                'Accept': 'text/*'
+            }
+        }
+    )
+
+    negotiation = ag.NegotiationResult('text/plain', lambda x : (x['Message'], 'text/plain'), 'identity')
+
+    with patch('awsmate.apigateway.negotiate') as negotiate:
+        response = ag.build_http_response(status, 'some message', event=event, negotiation=negotiation)
+        negotiate.assert_not_called()
+
+    assert response['body'] == 'some message'
+    assert response['headers']['Content-Type'] == 'text/plain'
+    assert 'Content-Encoding' not in response['headers']
+
+
+def test_build_http_response_reusesNegotiationCachedOnEvent():
+    status = random.randint(200, 599)
+
+    event = ag.LambdaProxyEvent(
+        {
+            'headers': {
+                'Accept': 'text/*'
+            }
+        }
+    )
 
-    response = ag.build_http_response(status, payload, event=event, custom_transformers={ 'text/*': lambda x : (x, 'text/strange') })
+    negotiator = ag.ContentNegotiator({ 'text/plain': lambda x : (x['Message'], 'text/plain') })
 
-    assert response == expectedResponse
+    assert ag.determine_content_type(event, custom_transformers=negotiator) == 'text/plain'
+
+    with patch.object(negotiator, 'negotiate') as negotiate:
+        response = ag.build_http_response(status, 'some message', event=event, custom_transformers=negotiator)
+        negotiate.assert_not_called()
+
+    assert response['body'] == 'some message'
 
 
 def test_build_http_response_allowsReturningExtraHeaders():
@@ -1109,7 +2413,7 @@ def test_build_http_response_allowsReturningExtraHeaders():
     expectedResponse = {
         'isBase64Encoded': False,
         'statusCode': status,
-        'body': json.dumps(payload, indent = 2),
+        'body': json.dumps(payload, separators = (',', ':'), ensure_ascii = False),
         'headers': {     
             'Content-Type': 'application/json; charset=utf-8',
             **extra_headers
@@ -1121,6 +2425,122 @@ def test_build_http_response_allowsReturningExtraHeaders():
     assert response == expectedResponse    
 
 
+@pytest.mark.parametrize('payload', [ 'plain', 'accentué' ])
+def test_build_http_response_passesUncompressedByteSizeToHooks(payload):
+    hook = MagicMock()
+    ag.register_response_hook(hook)
+
+    try:
+        response = ag.build_http_response(200, payload)
+
+    finally:
+        ag.unregister_response_hook(hook)
+
+    hook.assert_called_once_with(response, len(response['body'].encode('utf-8')))
+
+
+def test_build_http_response_returnsStrongETag():
+    payload = { 'val': random.randint(0, 1000) }
+
+    response = ag.build_http_response(200, payload, etag = 'strong')
+    other = ag.build_http_response(200, { 'val': payload['val'] + 1 }, etag = 'strong')
+
+    assert re.fullmatch(r'"[0-9a-f]{32}"', response['headers']['ETag'])
+    assert response['headers']['ETag'] == ag.build_http_response(200, payload, etag = 'strong')['headers']['ETag']
+    assert response['headers']['ETag'] != other['headers']['ETag']
+
+
+def test_build_http_response_returnsWeakETag():
+    response = ag.build_http_response(200, 'OK', etag = 'weak')
+
+    assert re.fullmatch(r'W/"[0-9a-f]{32}"', response['headers']['ETag'])
+
+
+def test_build_http_response_rejectsUnknownETagKind():
+    with pytest.raises(ValueError, match = 'Unknown ETag kind: medium.'):
+        ag.build_http_response(200, 'OK', etag = 'medium')
+
+
+def test_build_http_response_suffixesStrongETagOfCompressedBodies():
+    payload = { 'msg': 'x' * 2000 }
+
+    identity = ag.build_http_response(200, payload, etag = 'strong')
+    zipped = ag.build_http_response(200, payload, event = _api_event(headers={ 'Accept-Encoding': 'gzip' }), etag = 'strong')
+
+    assert zipped['headers']['ETag'] == identity['headers']['ETag'][:-1] + '-gzip"'
+
+
+def test_build_http_response_hashesStreamedBodies():
+    chunks = ag.build_http_response(200, [ 1, 2 ], custom_transformers = { 'application/json': lambda x: iter([ '[1,', '2]' ]) }, etag = 'strong')
+    whole = ag.build_http_response(200, [ 1, 2 ], etag = 'strong')
+
+    assert chunks['body'] == '[1,2]'
+    assert chunks['headers']['ETag'] == whole['headers']['ETag']
+
+
+@pytest.mark.parametrize('ifNoneMatch', [ '{tag}', 'W/{tag}', '"abc", {tag}', '*', '{gzipTag}' ])
+def test_build_http_response_returnsNotModifiedIfETagMatches(ifNoneMatch):
+    payload = { 'msg': 'x' * 2000 }
+    tag = ag.build_http_response(200, payload, etag = 'strong')['headers']['ETag']
+    gzipTag = tag[:-1] + '-gzip"'
+
+    event = _api_event(headers={ 'If-None-Match': ifNoneMatch.format(tag = tag, gzipTag = gzipTag), 'Accept-Encoding': 'gzip' })
+
+    response = ag.build_http_response(200, payload, event = event, etag = 'strong', extra_headers = { 'Cache-Control': 'no-cache' })
+
+    assert response == {
+        'isBase64Encoded': False,
+        'statusCode': 304,
+        'body': '',
+        'headers': { 'Cache-Control': 'no-cache', 'ETag': gzipTag }
+    }
+
+
+@pytest.mark.parametrize('method, status, ifNoneMatch', [
+    ('GET', 200, '"abc"'),
+    ('POST', 200, '*'),
+    ('GET', 201, '*')
+])
+def test_build_http_response_ignoresUnmatchedOrUnsupportedConditions(method, status, ifNoneMatch):
+    event = _api_event(method, headers={ 'If-None-Match': ifNoneMatch })
+
+    response = ag.build_http_response(status, 'OK', event = event, etag = 'weak')
+
+    assert response['statusCode'] == status
+    assert json.loads(response['body']) == { 'Message': 'OK' }
+
+
+@pytest.mark.parametrize('ifModifiedSince, expectedStatus', [
+    ('Tue, 02 Jun 2020 10:30:00 GMT', 304),
+    ('Wed, 03 Jun 2020 00:00:00 GMT', 304),
+    ('Tue, 02 Jun 2020 10:29:59 GMT', 200),
+    ('not a date', 200)
+])
+def test_build_http_response_evaluatesIfModifiedSince(ifModifiedSince, expectedStatus):
+    lastModified = datetime.datetime(2020, 6, 2, 10, 30, 0, 500000)
+    event = _api_event(headers={ 'If-Modified-Since': ifModifiedSince })
+
+    response = ag.build_http_response(200, 'OK', event = event, last_modified = lastModified)
+
+    assert response['statusCode'] == expectedStatus
+    assert response['headers']['Last-Modified'] == 'Tue, 02 Jun 2020 10:30:00 GMT'
+
+
+def test_build_http_response_ignoresIfModifiedSinceWhenIfNoneMatchIsPresent():
+    event = _api_event(headers={ 'If-None-Match': '"abc"', 'If-Modified-Since': 'Wed, 03 Jun 2020 00:00:00 GMT' })
+
+    response = ag.build_http_response(200, 'OK', event = event, etag = 'strong', last_modified = datetime.datetime(2020, 6, 2))
+
+    assert response['statusCode'] == 200
+
+
+@pytest.fixture(autouse=True)
+def canned_responses():
+    yield ag._canned_responses
+
+    ag._canned_responses.clear()
+
+
 def test_build_http_server_error_response_passeAllParameters():
     error = ag.HttpInsufficientStorageError()
     msg = 'client message'
@@ -1157,7 +2577,7 @@ def test_build_http_server_error_response_callsLoggerByDefault():
         with patch('awsmate.apigateway.log_internal_error') as mlie:
             ag.build_http_server_error_response(error)
 
-    mlie.assert_called_once_with(f'{error.status} - {str(error)}')    
+    mlie.assert_called_once_with('%s - %s', error.status, error)    
 
 
 def test_build_http_server_error_response_doesNotCallsLoggerIfSpecified():
@@ -1170,6 +2590,14 @@ def test_build_http_server_error_response_doesNotCallsLoggerIfSpecified():
     mlie.assert_not_called()
 
 
+def test_build_http_server_error_response_dumpsDebugBufferIfNotLogging():
+    with patch('awsmate.apigateway.build_http_response'):
+        with patch('awsmate.apigateway.dump_debug_buffer') as mddb:
+            ag.build_http_server_error_response(ag.HttpRServiceUnavailableError(), log=False)
+
+    mddb.assert_called_once()
+
+
 def test_build_http_client_error_response_passeAllParameters():
     exception = ag.HttpBadRequestError("some message")
     event = ag.LambdaProxyEvent({})
@@ -1195,7 +2623,7 @@ def test_build_http_client_error_response_callsLoggerByDefault():
         with patch.object(ag.logger, 'error') as mle:
             ag.build_http_client_error_response(error)
 
-    mle.assert_called_once_with(f'{error.status} - {str(error)}')  
+    mle.assert_called_once_with('%s - %s', error.status, error)  
 
 
 def test_build_http_client_error_response_doesNotCallsLoggerIfSpecified():
@@ -1206,4 +2634,579 @@ def test_build_http_client_error_response_doesNotCallsLoggerIfSpecified():
             ag.build_http_client_error_response(error, log=False)
 
     mle.assert_not_called()  
-    
\ No newline at end of file
+    
+
+def test_build_http_client_error_response_addsAllowHeader():
+    error = ag.HttpMethodNotAllowedError(allowed_methods=('GET', 'POST'))
+
+    response = ag.build_http_client_error_response(error, log=False, extra_headers={ 'someKey': 'someValue' })
+
+    assert response['statusCode'] == 405
+    assert response['headers']['Allow'] == 'GET, POST'
+    assert response['headers']['someKey'] == 'someValue'
+
+
+def test_build_http_server_error_response_buildsCannedResponsesOnce(canned_responses):
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip' } })
+    policy = ag.CompressionPolicy(min_size=0)
+
+    first = ag.build_http_server_error_response(ag.HttpRServiceUnavailableError(), log=False, event=event, compression=policy)
+
+    with patch('awsmate.apigateway.build_http_response') as mbhr:
+        with patch('awsmate.apigateway.dump_debug_buffer') as mddb:
+            second = ag.build_http_server_error_response(ag.HttpRServiceUnavailableError(), log=False, event=event, compression=policy)
+
+    mbhr.assert_not_called()
+    mddb.assert_called_once()
+    assert second == first
+    assert second['headers'] is not first['headers']
+    assert len(canned_responses) == 1
+
+
+@pytest.mark.parametrize('other', [
+    { 'client_message': 'Other message' },
+    { 'extra_headers': { 'someKey': 'someValue' } },
+    { 'event': ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip' } }) }
+])
+def test_build_http_server_error_response_keysCannedResponses(canned_responses, other):
+    ag.build_http_server_error_response(ag.HttpRServiceUnavailableError(), log=False)
+    ag.build_http_server_error_response(ag.HttpRServiceUnavailableError(), log=False, **other)
+
+    assert len(canned_responses) == 2
+
+
+def test_build_http_client_error_response_doesNotCacheWithTransformersDict(canned_responses):
+    transformers = { '*/*': lambda x: (x['Message'], 'text/plain') }
+
+    response = ag.build_http_client_error_response(ag.HttpTooManyRequestsError(), log=False, custom_transformers=transformers)
+
+    assert response['body'] == 'Too Many Requests'
+    assert len(canned_responses) == 0
+
+
+def test_build_http_client_error_response_cachesBodySizeAsBuilt(canned_responses):
+    negotiator = ag.ContentNegotiator({ '*/*': lambda x: ('not base64!', 'image/png') })
+
+    response = ag.build_http_client_error_response(ag.HttpNotFoundError(), log=False, custom_transformers=negotiator)
+
+    assert response['isBase64Encoded'] is True
+    assert list(canned_responses.values())[0][1] == len('not base64!')
+
+
+def test_build_http_client_error_response_callsHooksOnCannedResponses():
+    hook = MagicMock()
+    ag.register_response_hook(hook)
+
+    try:
+        first = ag.build_http_client_error_response(ag.HttpTooManyRequestsError(), log=False)
+        ag.build_http_client_error_response(ag.HttpTooManyRequestsError(), log=False)
+
+    finally:
+        ag.unregister_response_hook(hook)
+
+    assert hook.call_count == 2
+    assert hook.call_args_list[1][0] == (first, len(first['body']))
+
+
+def test_build_http_client_error_response_returnsProblemDetailsIfDesired():
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'text/html', 'Accept-Encoding': 'gzip' } })
+    policy = ag.CompressionPolicy(min_size=0)
+
+    response = ag.build_http_client_error_response(ag.HttpTooManyRequestsError('Slow down.'), log=False, problem=True, event=event, compression=policy)
+
+    assert response['statusCode'] == 429
+    assert response['headers']['Content-Type'] == 'application/problem+json; charset=utf-8'
+    assert json.loads(gzip.decompress(base64.b64decode(response['body']))) == {
+        'type': 'about:blank', 'title': 'Too Many Requests', 'status': 429, 'detail': 'Slow down.'
+    }
+
+
+def test_build_http_server_error_response_returnsClientMessageAsProblemDetail():
+    response = ag.build_http_server_error_response(ag.HttpBadGatewayError('secret'), log=False, problem=True, client_message='Try again later.')
+
+    assert response['headers']['Content-Type'] == 'application/problem+json; charset=utf-8'
+    assert json.loads(response['body'])['detail'] == 'Try again later.'
+    assert 'secret' not in response['body']
+
+
+def test_Router_dispatch_callsHandlerWithTypedParameters():
+    router = ag.Router()
+
+    @router.route('/projects/{project_id:int}/modules/{name}')
+    def handler(event, project_id, name):
+        return (event, project_id, name)
+
+    event = _api_event(path='/projects/42/modules/core/')
+
+    assert router.dispatch(event) == (event, 42, 'core')
+
+
+def test_Router_resolve_prefersStaticSegments():
+    router = ag.Router()
+    router.add('GET', '/projects/{project_id}', 'param')
+    router.add('GET', '/projects/new', 'static')
+
+    assert router.resolve('GET', ('projects', 'new')) == ('static', {})
+    assert router.resolve('get', ('projects', 'other')) == ('param', { 'project_id': 'other' })
+
+
+def test_Router_resolve_backtracksOnConversionFailuresAndDeadEnds():
+    router = ag.Router()
+    router.add('GET', '/items/{item_id:int}', 'int')
+    router.add('GET', '/items/{slug}', 'str')
+    router.add('POST', '/items/new', 'create')
+
+    assert router.resolve('GET', ('items', '7')) == ('int', { 'item_id': 7 })
+    assert router.resolve('GET', ('items', 'seven')) == ('str', { 'slug': 'seven' })
+    assert router.resolve('GET', ('items', 'new')) == ('str', { 'slug': 'new' })
+
+
+def test_Router_resolve_raisesNotFound():
+    router = ag.Router()
+    router.add('GET', '/projects/{project_id:int}', 'handler')
+
+    for path in [ ('projects',), ('projects', 'abc'), ('projects', '1', 'extra'), ('other',) ]:
+        with pytest.raises(ag.HttpNotFoundError):
+            router.resolve('GET', path)
+
+
+def test_Router_resolve_raisesMethodNotAllowedWithAllowedMethods():
+    router = ag.Router()
+    router.add(('PUT', 'GET'), '/projects/{project_id}', 'handler')
+    router.add('DELETE', '/projects/{project_id:int}', 'handler')
+
+    with pytest.raises(ag.HttpMethodNotAllowedError) as exceptionInfo:
+        router.resolve('POST', ('projects', '1'))
+
+    assert exceptionInfo.value.allowed_methods == ('DELETE', 'GET', 'PUT')
+
+
+@pytest.mark.parametrize('template, message', [
+    ('/projects/{id:uuid}', 'Unknown route parameter type: uuid.'),
+    ('/projects/{id', 'Malformed route template segment: {id.'),
+    ('/projects/{id}/{id}', 'Duplicate route parameter: id.')
+])
+def test_Router_add_raisesIfTemplateIsMalformed(template, message):
+    with pytest.raises(ValueError) as exceptionInfo:
+        ag.Router().add('GET', template, 'handler')
+
+    assert exceptionInfo.value.args[0] == message
+
+
+def test_Router_add_raisesIfRouteIsAlreadyDefined():
+    router = ag.Router()
+    router.add('GET', '/projects/{id}', 'handler')
+
+    with pytest.raises(ValueError) as exceptionInfo:
+        router.add('get', '/projects/{id}/', 'other')
+
+    assert exceptionInfo.value.args[0] == 'Route already defined: GET /projects/{id}/.'
+
+
+def test_Pipeline_wrap_buildsResponsesFromRoutedPayloads():
+    router = ag.Router()
+
+    @router.route('/projects/{project_id:int}')
+    def handler(event, project_id):
+        return { 'p': project_id }
+
+    test = ag.Pipeline(ag.ErrorMappingStage(log_client_errors=False)).wrap(router.dispatch)
+
+    found = test(_api_event(path='/projects/4'), None)
+    missing = test(_api_event(path='/others'), None)
+
+    assert found['statusCode'] == 200
+    assert json.loads(found['body']) == { 'p': 4 }
+    assert missing['statusCode'] == 404
+
+
+def test_Pipeline_flattensOnlyOverriddenHooks():
+    class BeforeOnly(ag.Stage):
+        def before(self, state):
+            return None
+
+    stage = BeforeOnly()
+    test = ag.Pipeline(stage, ag.TimingStage())
+
+    assert len(test._befores) == 2
+    assert len(test._afters) == 1
+    assert len(test._onErrors) == 0
+
+
+def test_Pipeline_wrap_buildsResponseFromPayload():
+    test = ag.Pipeline().wrap(lambda event: { 'key': 'value' }, status=201)
+
+    response = test(_api_event(), None)
+
+    assert response['statusCode'] == 201
+    assert json.loads(response['body']) == { 'key': 'value' }
+
+
+def test_Pipeline_run_callsHooksInOrder():
+    calls = []
+
+    class Recorder(ag.Stage):
+        def __init__(self, name):
+            self.name = name
+
+        def before(self, state):
+            calls.append(f'before {self.name}')
+
+        def after(self, state, response):
+            calls.append(f'after {self.name}')
+            return response
+
+    ag.Pipeline(Recorder('a'), Recorder('b')).run(lambda event: calls.append('handler') or 'OK', _api_event())
+
+    assert calls == ['before a', 'before b', 'handler', 'after b', 'after a']
+
+
+def test_Pipeline_run_shortCircuitsOnBeforeResponse():
+    class Shortcut(ag.Stage):
+        def before(self, state):
+            return { 'statusCode': 204, 'headers': {} }
+
+    with patch('awsmate.apigateway.build_http_response') as mbhr:
+        response = ag.Pipeline(Shortcut()).run(lambda event: pytest.fail('handler called'), _api_event())
+
+    mbhr.assert_not_called()
+    assert response['statusCode'] == 204
+
+
+def test_Pipeline_run_raisesUnhandledErrors():
+    def handler(event):
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        ag.Pipeline(ag.TimingStage()).run(handler, _api_event())
+
+
+def test_ErrorMappingStage_mapsErrors():
+    def client(event):
+        raise ag.HttpNotFoundError()
+
+    def server(event):
+        raise ag.HttpBadGatewayError()
+
+    def unexpected(event):
+        raise ValueError('secret')
+
+    test = ag.Pipeline(ag.ErrorMappingStage(log_client_errors=False, log_server_errors=False))
+
+    assert test.run(client, _api_event())['statusCode'] == 404
+    assert test.run(server, _api_event())['statusCode'] == 502
+
+    response = test.run(unexpected, _api_event())
+
+    assert response['statusCode'] == 500
+    assert 'secret' not in response['body']
+
+
+def test_ErrorMappingStage_returnsProblemDetailsIfDesired():
+    def handler(event):
+        raise ag.HttpError.for_status(409)()
+
+    test = ag.Pipeline(ag.ErrorMappingStage(log_client_errors=False, problem=True), ag.NegotiationStage())
+
+    response = test.run(handler, _api_event())
+
+    assert response['headers']['Content-Type'] == 'application/problem+json; charset=utf-8'
+    assert json.loads(response['body'])['status'] == 409
+
+
+def test_NegotiationStage_negotiatesBeforeHandler():
+    seen = []
+    negotiator = ag.ContentNegotiator({ 'text/plain': lambda x : (x['Message'], 'text/plain') })
+
+    def handler(event):
+        seen.append(ag.negotiate(event, custom_transformers=negotiator).media_type)
+        return 'hello'
+
+    response = ag.Pipeline(ag.ErrorMappingStage(), ag.NegotiationStage(negotiator)).run(handler, _api_event(headers={ 'Accept': 'text/*' }))
+
+    assert seen == ['text/plain']
+    assert response['body'] == 'hello'
+
+
+def test_NegotiationStage_answersNotAcceptableWithoutCallingHandler():
+    test = ag.Pipeline(ag.ErrorMappingStage(log_client_errors=False), ag.NegotiationStage())
+
+    response = test.run(lambda event: pytest.fail('handler called'), _api_event(headers={ 'Accept': 'image/png' }))
+
+    assert response['statusCode'] == 406
+
+
+def test_CompressionStage_appliesPolicy():
+    event = _api_event(headers={ 'Accept-Encoding': 'gzip' })
+
+    assert 'Content-Encoding' not in ag.Pipeline(ag.CompressionStage()).run(lambda event: 'hello', event)['headers']
+    assert ag.Pipeline(ag.CompressionStage(ag.CompressionPolicy(min_size=0))).run(lambda event: 'hello', event)['headers']['Content-Encoding'] == 'gzip'
+
+
+def test_CorsStage_addsHeadersToResponsesAndErrors():
+    def handler(event):
+        raise ag.HttpForbiddenError()
+
+    test = ag.Pipeline(ag.CorsStage(allow_origin='*', expose_headers=('ETag',)), ag.ErrorMappingStage(log_client_errors=False))
+
+    response = test.run(handler, _api_event())
+
+    assert response['statusCode'] == 403
+    assert response['headers']['Access-Control-Allow-Origin'] == '*'
+    assert response['headers']['Access-Control-Expose-Headers'] == 'ETag'
+
+
+def test_CorsStage_echoesAllowedOrigins():
+    test = ag.Pipeline(ag.CorsStage(allow_origin=('https://a.example.com', 'https://b.example.com')))
+
+    allowed = test.run(lambda event: 'OK', _api_event(headers={ 'Origin': 'https://b.example.com' }))
+    other = test.run(lambda event: 'OK', _api_event(headers={ 'Origin': 'https://c.example.com' }))
+
+    assert allowed['headers']['Access-Control-Allow-Origin'] == 'https://b.example.com'
+    assert allowed['headers']['Vary'] == 'Origin'
+    assert 'Access-Control-Allow-Origin' not in other['headers']
+
+
+def test_CorsStage_answersPreflightRequests():
+    test = ag.Pipeline(ag.CorsStage(allow_methods=('GET', 'POST'), max_age=600))
+
+    headers = {
+        'Access-Control-Request-Method': 'POST',
+        'Access-Control-Request-Headers': 'Content-Type'
+    }
+
+    response = test.run(lambda event: pytest.fail('handler called'), _api_event('OPTIONS', headers=headers))
+
+    assert response['statusCode'] == 204
+    assert response['headers']['Access-Control-Allow-Methods'] == 'GET, POST'
+    assert response['headers']['Access-Control-Allow-Headers'] == 'Content-Type'
+    assert response['headers']['Access-Control-Max-Age'] == '600'
+
+
+def test_TimingStage_addsHeaderAndObservesMetric():
+    metrics = MagicMock()
+
+    response = ag.Pipeline(ag.TimingStage(metrics=metrics)).run(lambda event: 'OK', _api_event())
+
+    assert re.match(r'^app;dur=\d+\.\d$', response['headers']['Server-Timing'])
+    metrics.observe.assert_called_once()
+    assert metrics.observe.call_args[0][0] == 'HandlerLatency'
+    assert metrics.observe.call_args[0][2] == 'Milliseconds'
+
+
+def test_ResponseCache_evictsLeastRecentlyUsedEntries():
+    test = ag.ResponseCache(max_entries=2)
+
+    test.put('a', { 'statusCode': 200, 'headers': {} })
+    test.put('b', { 'statusCode': 200, 'headers': {} })
+    test.get('a')
+    test.put('c', { 'statusCode': 200, 'headers': {} })
+
+    assert len(test) == 2
+    assert test.get('b') is None
+    assert test.get('a') is not None
+    assert test.get('c') is not None
+
+
+def test_ResponseCache_expiresEntries():
+    test = ag.ResponseCache(ttl=10)
+
+    with patch('awsmate.apigateway.time.monotonic', return_value=100):
+        test.put('a', { 'statusCode': 200, 'headers': {} })
+
+    with patch('awsmate.apigateway.time.monotonic', return_value=109):
+        assert test.get('a') is not None
+
+    with patch('awsmate.apigateway.time.monotonic', return_value=110):
+        assert test.get('a') is None
+
+    assert len(test) == 0
+
+
+def test_ResponseCache_copiesResponses():
+    test = ag.ResponseCache()
+    response = { 'statusCode': 200, 'body': 'x', 'headers': { 'someKey': 'someValue' } }
+
+    test.put('a', response)
+    response['headers']['other'] = 'value'
+    test.get('a')['headers']['other'] = 'value'
+
+    assert test.get('a') == { 'statusCode': 200, 'body': 'x', 'headers': { 'someKey': 'someValue' } }
+
+
+def test_ResponseCache_rejectsInvalidSize():
+    with pytest.raises(ValueError, match='Invalid maximum number of entries: 0.'):
+        ag.ResponseCache(max_entries=0)
+
+
+def test_CacheStage_skipsHandlerOnHits():
+    handler = MagicMock(return_value={ 'msg': 'x' * 2000 })
+    test = ag.Pipeline(ag.TimingStage(), ag.NegotiationStage(), ag.CompressionStage(), ag.CacheStage())
+    event = _api_event(query={ 'b': [ '2' ], 'a': [ '1' ] }, headers={ 'Accept-Encoding': 'gzip' })
+
+    first = test.run(handler, event)
+    second = test.run(handler, _api_event(query={ 'a': [ '1' ], 'b': [ '2' ] }, headers={ 'Accept-Encoding': 'gzip' }))
+
+    handler.assert_called_once()
+    assert second['headers']['Content-Encoding'] == 'gzip'
+    assert second['body'] == first['body']
+    assert second['headers'] is not first['headers']
+
+
+def test_CacheStage_skipsAfterHooksOfInnerStagesOnHits():
+    class Inner(ag.Stage):
+        def __init__(self):
+            self.calls = 0
+
+        def after(self, state, response):
+            self.calls += 1
+            response['headers']['X-Inner'] = str(int(response['headers'].get('X-Inner', '0')) + 1)
+            return response
+
+    inner = Inner()
+    test = ag.Pipeline(ag.CacheStage(), inner)
+
+    first = test.run(lambda event: 'OK', _api_event())
+    second = test.run(lambda event: pytest.fail('handler called'), _api_event())
+
+    assert first['headers']['X-Inner'] == '1'
+    assert second['headers']['X-Inner'] == '1'
+    assert inner.calls == 1
+
+
+def test_Pipeline_run_callsAfterHooksOfReachedStagesOnly():
+    calls = []
+
+    class Recorder(ag.Stage):
+        def __init__(self, name, response=None):
+            self.name = name
+            self.response = response
+
+        def before(self, state):
+            calls.append(f'{self.name}.before')
+            return self.response
+
+        def after(self, state, response):
+            calls.append(f'{self.name}.after')
+            return response
+
+    shortcut = ag.build_http_response(204, None)
+    test = ag.Pipeline(Recorder('a'), Recorder('b', shortcut), Recorder('c'))
+
+    assert test.run(lambda event: pytest.fail('handler called'), _api_event()) == shortcut
+    assert calls == [ 'a.before', 'b.before', 'b.after', 'a.after' ]
+
+
+@pytest.mark.parametrize('other', [
+    _api_event(path='/others'),
+    _api_event(query={ 'a': [ '1' ] }),
+    _api_event(headers={ 'Accept-Encoding': 'gzip' }),
+    _api_event(headers={ 'Accept': 'application/x-ndjson' }),
+    _api_event(headers={ 'Cache-Control': 'no-cache' }),
+    _api_event('POST')
+])
+def test_CacheStage_callsHandlerOnMisses(other):
+    handler = MagicMock(return_value={ 'msg': 'x' * 2000 })
+    test = ag.Pipeline(ag.NegotiationStage(ag.tabular_transformers), ag.CacheStage())
+
+    test.run(handler, _api_event())
+    test.run(handler, other)
+
+    assert handler.call_count == 2
+
+
+def test_CacheStage_onlyCachesSuccessfulResponses():
+    handler = MagicMock(side_effect=ag.HttpNotFoundError())
+    test = ag.Pipeline(ag.ErrorMappingStage(log_client_errors=False), ag.CacheStage())
+
+    assert test.run(handler, _api_event())['statusCode'] == 404
+    assert test.run(handler, _api_event())['statusCode'] == 404
+    assert handler.call_count == 2
+
+
+def test_StreamWriter_cannotBeInstantiated():
+    with pytest.raises(TypeError):
+        ag.StreamWriter()
+
+
+def test_stream_http_response_writesPreludeThenChunks():
+    writer = ag.LocalStreamWriter()
+
+    def chunks():
+        yield 'first,'
+        yield b''
+        yield 'second'.encode('utf-8')
+
+    ag.stream_http_response(writer, 201, chunks(), content_type='text/plain', extra_headers={ 'someKey': 'someValue' })
+
+    assert writer.closed
+    assert writer.chunks[1] == b'\x00' * 8
+    assert writer.chunks[2:] == [ b'first,', b'second' ]
+    assert writer.prelude() == { 'statusCode': 201, 'headers': { 'Content-Type': 'text/plain', 'someKey': 'someValue' } }
+    assert writer.body() == b'first,second'
+
+
+def test_stream_http_response_transformsPayloads():
+    writer = ag.LocalStreamWriter()
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'application/x-ndjson' } })
+
+    ag.stream_http_response(writer, 200, ({ 'id': i } for i in range(3)), event=event, custom_transformers=ag.tabular_transformers)
+
+    assert writer.prelude()['headers']['Content-Type'] == 'application/x-ndjson; charset=utf-8'
+    assert writer.body() == b'{"id":0}\n{"id":1}\n{"id":2}\n'
+
+
+def test_stream_http_response_answersNotAcceptable():
+    writer = ag.LocalStreamWriter()
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'image/png' } })
+
+    ag.stream_http_response(writer, 200, { 'key': 'value' }, event=event)
+
+    assert writer.prelude()['statusCode'] == 406
+    assert json.loads(writer.body())['Message'].startswith('None of the formats')
+
+
+def test_stream_http_response_compressesOnTheFly():
+    writer = ag.LocalStreamWriter()
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept': 'text/csv', 'Accept-Encoding': 'gzip' } })
+    lines = [ f'{i},{"x" * 100}\n' for i in range(100) ]
+    produced = []
+
+    def chunks():
+        for line in lines:
+            # Each chunk but the ones read ahead has been sent when the next one is produced.
+            produced.append(len(writer.chunks))
+            yield line
+
+    ag.stream_http_response(writer, 200, chunks(), event=event, content_type='text/csv')
+
+    assert writer.prelude()['headers']['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(writer.body()) == ''.join(lines).encode('utf-8')
+    assert produced[-1] > produced[20] > 2
+
+
+def test_stream_http_response_doesNotCompressSmallBodies():
+    writer = ag.LocalStreamWriter()
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip' } })
+
+    ag.stream_http_response(writer, 200, 'OK', event=event)
+
+    assert 'Content-Encoding' not in writer.prelude()['headers']
+    assert json.loads(writer.body()) == { 'Message': 'OK' }
+
+
+def test_stream_http_response_closesWriterOnErrors():
+    writer = ag.LocalStreamWriter()
+
+    def chunks():
+        yield 'some data'
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        ag.stream_http_response(writer, 200, chunks(), content_type='text/plain')
+
+    assert writer.closed
+    assert writer.body() == b'some data'
+
+    with pytest.raises(ValueError):
+        writer.write(b'more')
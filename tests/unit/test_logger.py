@@ -0,0 +1,525 @@
+import pytest
+
+import io
+import json
+import logging
+import random
+
+import awsmate.logger as al
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+
+def _record(msg: str, *args, level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord('root', level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+
+    return record
+
+
+@pytest.fixture
+def stream_handler():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+
+    with patch.object(al.logger, 'handlers', [handler]):
+        yield handler, stream
+
+    al.end_invocation()
+
+
+def test_JsonFormatter_format_returnsStandardFields():
+    record = _record('Order %s processed', 1234)
+
+    entry = json.loads(al.JsonFormatter().format(record))
+
+    assert entry == {
+        'timestamp': int(record.created * 1000),
+        'level': 'INFO',
+        'logger': 'root',
+        'message': 'Order 1234 processed'
+    }
+
+
+def test_JsonFormatter_format_addsExtraFields():
+    randInt = random.randint(1000, 9999)
+
+    entry = json.loads(al.JsonFormatter().format(_record('msg', amount = randInt)))
+
+    assert entry['amount'] == randInt
+
+
+def test_JsonFormatter_format_addsExceptionIfAny():
+    try:
+        raise RuntimeError('WOW!')
+
+    except RuntimeError:
+        import sys
+        record = logging.LogRecord('root', logging.ERROR, __file__, 1, 'msg', None, sys.exc_info())
+
+    entry = json.loads(al.JsonFormatter().format(record))
+
+    assert entry['exception'].startswith('Traceback (most recent call last):')
+    assert entry['exception'].endswith('RuntimeError: WOW!')
+
+
+def test_JsonFormatter_format_serializesUnknownTypesAsStrings():
+    entry = json.loads(al.JsonFormatter().format(_record('msg', obj = { 1, 2 } - { 1, 2 })))
+
+    assert entry['obj'] == 'set()'
+
+
+def test_JsonFormatter_format_doesNotEscapeNonAsciiCharacters():
+    assert '"message":"été"' in al.JsonFormatter().format(_record('été'))
+
+
+def test_set_json_format_setsFormatterOfAllHandlers(stream_handler):
+    handler, _ = stream_handler
+
+    al.set_json_format()
+
+    assert isinstance(handler.formatter, al.JsonFormatter)
+    assert al._contextFilter in handler.filters
+
+
+def test_set_json_format_restoresPlainFormat(stream_handler):
+    handler, _ = stream_handler
+
+    al.set_json_format()
+    al.set_json_format(False)
+
+    assert not isinstance(handler.formatter, al.JsonFormatter)
+    assert al._contextFilter not in handler.filters
+
+
+def test_begin_invocation_addsContextFieldsToJsonRecords(stream_handler):
+    handler, stream = stream_handler
+    context = SimpleNamespace(aws_request_id = 'some-request-id', function_name = 'some-function')
+
+    al.set_json_format()
+    al.begin_invocation(context)
+
+    handler.handle(_record('msg'))
+
+    entry = json.loads(stream.getvalue())
+
+    assert entry['aws_request_id'] == 'some-request-id'
+    assert entry['function_name'] == 'some-function'
+    assert isinstance(entry['cold_start'], bool)
+
+
+def test_begin_invocation_flagsColdStartOnlyOnce(stream_handler):
+    with patch.object(al, '_coldStart', True):
+        al.begin_invocation()
+        first = al._invocationContext['cold_start']
+
+        al.begin_invocation()
+        second = al._invocationContext['cold_start']
+
+    assert first is True
+    assert second is False
+
+
+def test_end_invocation_clearsContextFields(stream_handler):
+    al.begin_invocation(SimpleNamespace(aws_request_id = 'some-request-id', function_name = 'some-function'))
+    al.end_invocation()
+
+    assert al._invocationContext == {}
+
+
+def test_logged_handler_wrapsInvocation():
+    context = SimpleNamespace(aws_request_id = 'some-request-id', function_name = 'some-function')
+    seen = {}
+
+    @al.logged_handler
+    def handler(event, context):
+        seen.update(al._invocationContext)
+        return event
+
+    assert handler('some-event', context) == 'some-event'
+    assert seen['aws_request_id'] == 'some-request-id'
+    assert al._invocationContext == {}
+
+
+def test_log_internal_error_logsMessageAndStackTrace():
+    with patch.object(al.logger, 'critical') as mlc:
+        try:
+            raise RuntimeError('WOW!')
+
+        except RuntimeError:
+            al.log_internal_error('This one is %s', 'expected')
+
+    mlc.assert_called_once_with('INTERNAL ERROR: This one is %s.', 'expected', exc_info = True)
+
+
+def test_log_internal_error_doesNothingIfCriticalIsDisabled():
+    with patch.object(al.logger, 'isEnabledFor', return_value = False):
+        with patch.object(al.logger, 'critical') as mlc:
+            al.log_internal_error('some message')
+
+    mlc.assert_not_called()
+
+
+@pytest.fixture
+def queued_stream_handler(stream_handler):
+    yield stream_handler
+
+    al.set_queued_emission(False)
+
+
+def test_set_queued_emission_replacesHandlersWithAQueueHandler(queued_stream_handler):
+    handler, _ = queued_stream_handler
+
+    al.set_queued_emission()
+
+    assert handler not in al.logger.handlers
+    assert isinstance(al.logger.handlers[0], al._BoundedQueueHandler)
+    assert handler in al._output_handlers()
+
+
+def test_set_queued_emission_restoresHandlersWhenDisabled(queued_stream_handler):
+    handler, _ = queued_stream_handler
+
+    al.set_queued_emission()
+    al.set_queued_emission(False)
+
+    assert handler in al.logger.handlers
+    assert not any(isinstance(h, al._BoundedQueueHandler) for h in al.logger.handlers)
+    assert al._queueListener is None
+
+
+def test_set_queued_emission_movesFiltersToTheQueueHandler(queued_stream_handler):
+    handler, _ = queued_stream_handler
+
+    al.set_json_format()
+    al.set_queued_emission()
+
+    assert al._contextFilter not in handler.filters
+    assert al._contextFilter in al.logger.handlers[0].filters
+    assert isinstance(handler.formatter, al.JsonFormatter)
+
+
+def test_flush_writesAllQueuedRecords(queued_stream_handler):
+    _, stream = queued_stream_handler
+
+    al.set_queued_emission()
+
+    for i in range(100):
+        al.logger.warning('record %d', i)
+
+    al.flush()
+
+    assert stream.getvalue().splitlines() == [ f'record {i}' for i in range(100) ]
+
+
+def test_flush_reportsDroppedRecords(queued_stream_handler):
+    _, stream = queued_stream_handler
+
+    al.set_queued_emission()
+    al.logger.handlers[0].dropped = 3
+
+    al.flush()
+
+    assert stream.getvalue() == '3 log records were dropped because the log queue was full.\n'
+    assert al.logger.handlers[0].dropped == 0
+
+
+def test__BoundedQueueHandler_enqueue_dropsDebugRecordsFirst():
+    import queue
+
+    handler = al._BoundedQueueHandler(queue.Queue(4))
+
+    for level in (logging.INFO, logging.INFO, logging.DEBUG, logging.INFO, logging.INFO, logging.WARNING):
+        handler.enqueue(_record('msg', level = level))
+
+    assert [ handler.queue.get_nowait().levelno for _ in range(4) ] == [ logging.INFO ] * 4
+    assert handler.dropped == 2
+
+
+def test__BoundedQueueHandler_enqueue_neverDropsErrors():
+    import queue
+
+    handler = al._BoundedQueueHandler(queue.Queue(1))
+    handler.enqueue(_record('msg', level = logging.INFO))
+
+    with patch.object(handler.queue, 'put') as mput:
+        handler.enqueue(_record('msg', level = logging.ERROR))
+
+    mput.assert_called_once()
+    assert handler.dropped == 0
+
+
+def test__BoundedQueueHandler_prepare_mergesArgumentsWithoutFormatting():
+    record = _record('Order %s processed', 1234)
+
+    prepared = al._BoundedQueueHandler(__import__('queue').Queue()).prepare(record)
+
+    assert prepared.msg == 'Order 1234 processed'
+    assert prepared.args is None
+    assert record.args == (1234,)
+
+
+def test_end_invocation_flushesRecords():
+    with patch.object(al, 'flush') as mf:
+        al.end_invocation()
+
+    mf.assert_called_once()
+
+
+@pytest.fixture
+def buffered_stream_handler(stream_handler):
+    yield stream_handler
+
+    al.set_debug_buffer(False)
+
+
+def test_set_debug_buffer_capturesDebugRecordsInsteadOfWritingThem(buffered_stream_handler):
+    _, stream = buffered_stream_handler
+
+    al.set_debug_buffer()
+    al.logger.debug('debug message')
+    al.logger.info('info message')
+
+    assert stream.getvalue() == 'info message\n'
+    assert [ r.getMessage() for r in al._debugBuffer.records ] == [ 'debug message' ]
+
+
+def test_set_debug_buffer_restoresLevelWhenDisabled(buffered_stream_handler):
+    level = al.logger.level
+
+    al.set_debug_buffer()
+    al.set_debug_buffer(False)
+
+    assert al.logger.level == level
+    assert al._debugBuffer is None
+
+
+def test_set_debug_buffer_keepsLibraryLoggersAtFormerLevel(buffered_stream_handler):
+    _, stream = buffered_stream_handler
+
+    al.set_debug_buffer()
+    logging.getLogger('botocore.endpoint').debug('library message')
+
+    assert not logging.getLogger('botocore').isEnabledFor(logging.DEBUG)
+    assert len(al._debugBuffer.records) == 0
+
+    al.set_debug_buffer(False)
+
+    assert logging.getLogger('botocore').level == logging.NOTSET
+
+
+def test_set_debug_buffer_buffersGivenLoggersOnly(buffered_stream_handler):
+    _, stream = buffered_stream_handler
+    level = al.logger.level
+
+    al.set_debug_buffer(logger_names = ('myapp',))
+    logging.getLogger('myapp.reports').debug('application message')
+    al.logger.debug('root message')
+
+    assert al.logger.level == level
+    assert stream.getvalue() == ''
+    assert [ r.getMessage() for r in al._debugBuffer.records ] == [ 'application message' ]
+
+    al.set_debug_buffer(False)
+
+    assert logging.getLogger('myapp').level == logging.NOTSET
+
+
+def test_set_debug_buffer_keepsLastRecordsOnly(buffered_stream_handler):
+    al.set_debug_buffer(capacity = 3)
+
+    for i in range(10):
+        al.logger.debug('record %d', i)
+
+    assert [ r.getMessage() for r in al._debugBuffer.records ] == [ 'record 7', 'record 8', 'record 9' ]
+
+
+def test_dump_debug_buffer_writesAndEmptiesTheBuffer(buffered_stream_handler):
+    _, stream = buffered_stream_handler
+
+    al.set_debug_buffer()
+    al.logger.debug('debug message')
+    al.dump_debug_buffer()
+
+    assert stream.getvalue() == 'debug message\n'
+    assert len(al._debugBuffer.records) == 0
+
+
+def test_dump_debug_buffer_livesWellWithNoBuffer():
+    al.dump_debug_buffer()
+
+
+def test_discard_debug_buffer_emptiesTheBufferWithoutWriting(buffered_stream_handler):
+    _, stream = buffered_stream_handler
+
+    al.set_debug_buffer()
+    al.logger.debug('debug message')
+    al.discard_debug_buffer()
+    al.dump_debug_buffer()
+
+    assert stream.getvalue() == ''
+
+
+def test_log_internal_error_dumpsDebugBuffer(buffered_stream_handler):
+    _, stream = buffered_stream_handler
+
+    al.set_debug_buffer()
+    al.logger.debug('debug message')
+    al.log_internal_error('failure')
+
+    assert stream.getvalue().startswith('debug message\nINTERNAL ERROR: failure.')
+
+
+def test_logged_handler_dumpsDebugBufferIfHandlerRaises(buffered_stream_handler):
+    _, stream = buffered_stream_handler
+
+    @al.logged_handler
+    def handler(event, context):
+        al.logger.debug('debug message')
+        raise RuntimeError('WOW!')
+
+    al.set_debug_buffer()
+
+    with pytest.raises(RuntimeError):
+        handler({}, None)
+
+    assert stream.getvalue() == 'debug message\n'
+
+
+def test_logged_handler_discardsDebugBufferOnSuccess(buffered_stream_handler):
+    _, stream = buffered_stream_handler
+
+    @al.logged_handler
+    def handler(event, context):
+        al.logger.debug('debug message')
+
+    al.set_debug_buffer()
+    handler({}, None)
+    al.dump_debug_buffer()
+
+    assert stream.getvalue() == ''
+
+
+def test_log_json_logsTheDocumentAsIs(stream_handler):
+    handler, stream = stream_handler
+
+    al.set_json_format()
+    al.log_json({ 'some_key': 'some_value' })
+
+    assert stream.getvalue() == '{"some_key":"some_value"}\n'
+
+
+@pytest.fixture
+def sampled_stream_handler(stream_handler):
+    yield stream_handler
+
+    al.set_sampling_rates(None)
+
+
+def test_set_sampling_rates_dropsRecordsOfSampledLevels(sampled_stream_handler):
+    _, stream = sampled_stream_handler
+
+    al.set_sampling_rates({ logging.INFO: 0.0 })
+    al.logger.info('info message')
+    al.logger.warning('warning message')
+
+    assert stream.getvalue() == 'warning message\n'
+
+
+def test_set_sampling_rates_keepsProportionOfRecords(sampled_stream_handler):
+    _, stream = sampled_stream_handler
+
+    al.set_sampling_rates({ logging.INFO: 0.5 })
+
+    with patch('random.random', side_effect = [ 0.2, 0.7, 0.4, 0.9 ]):
+        for i in range(4):
+            al.logger.info('record %d', i)
+
+    assert stream.getvalue() == 'record 0\nrecord 2\n'
+
+
+def test_set_sampling_rates_neverDropsJsonDocuments(sampled_stream_handler):
+    _, stream = sampled_stream_handler
+
+    al.set_sampling_rates({ logging.INFO: 0.0 })
+    al.log_json({ 'key': 1 })
+
+    assert stream.getvalue() == '{"key":1}\n'
+
+
+def test_set_sampling_rates_disablesSamplingWithNone(sampled_stream_handler):
+    handler, _ = sampled_stream_handler
+
+    al.set_sampling_rates({ logging.INFO: 0.0 })
+    al.set_sampling_rates(None)
+
+    assert handler.filters == []
+
+
+@pytest.fixture
+def deduplicated_stream_handler(stream_handler):
+    yield stream_handler
+
+    al.set_error_deduplication(False)
+
+
+def _fail_and_log():
+    try:
+        raise RuntimeError('WOW!')
+
+    except RuntimeError:
+        al.log_internal_error('failure')
+
+
+def test_set_error_deduplication_writesStackTraceOncePerWindow(deduplicated_stream_handler):
+    _, stream = deduplicated_stream_handler
+
+    al.set_error_deduplication()
+
+    for _ in range(3):
+        _fail_and_log()
+
+    lines = stream.getvalue().splitlines()
+    fingerprint = next(iter(al._errorFingerprints))
+
+    assert stream.getvalue().count('Traceback (most recent call last):') == 1
+    assert lines[-2] == f'INTERNAL ERROR: failure. Repeated error {fingerprint}: 1 occurrence(s) since its stack trace was written.'
+    assert lines[-1] == f'INTERNAL ERROR: failure. Repeated error {fingerprint}: 2 occurrence(s) since its stack trace was written.'
+
+
+def test_set_error_deduplication_writesStackTraceAgainAfterWindow(deduplicated_stream_handler):
+    _, stream = deduplicated_stream_handler
+
+    al.set_error_deduplication(window = 10)
+
+    with patch('time.monotonic', side_effect = [ 100.0, 105.0, 111.0 ]):
+        for _ in range(3):
+            _fail_and_log()
+
+    assert stream.getvalue().count('Traceback (most recent call last):') == 2
+
+
+def test_set_error_deduplication_distinguishesStackTraces(deduplicated_stream_handler):
+    _, stream = deduplicated_stream_handler
+
+    al.set_error_deduplication()
+
+    _fail_and_log()
+
+    try:
+        raise ValueError('Other')
+
+    except ValueError:
+        al.log_internal_error('other failure')
+
+    assert stream.getvalue().count('Traceback (most recent call last):') == 2
+
+
+def test_set_error_deduplication_isDisabledByDefault(stream_handler):
+    _, stream = stream_handler
+
+    _fail_and_log()
+    _fail_and_log()
+
+    assert stream.getvalue().count('Traceback (most recent call last):') == 2
@@ -0,0 +1,144 @@
+import pytest
+
+import base64
+import gzip
+import json
+import random
+
+import awsmate.apigateway as ag
+import awsmate.metrics as am
+
+from unittest.mock import patch
+
+
+def test_MetricsAggregator_init_raisesIfDimensionSetRefersToUnknownDimension():
+    with pytest.raises(ValueError) as exceptionInfo:
+        am.MetricsAggregator('Namespace', dimensions = { 'Service': 'billing' }, dimension_sets = [ [ 'Service', 'Stage' ] ])
+
+    assert exceptionInfo.value.args[0] == 'Dimension set refers to an unknown dimension: Stage.'
+
+
+def test_MetricsAggregator_documents_returnsNothingIfNoMetrics():
+    assert am.MetricsAggregator('Namespace').documents() == []
+
+
+def test_MetricsAggregator_documents_returnsEmfDocument():
+    test = am.MetricsAggregator('Namespace', dimensions = { 'Service': 'billing' })
+
+    test.increment('Requests')
+    test.increment('Requests', 2)
+    test.observe('PayloadSize', 10, 'Bytes')
+    test.observe('PayloadSize', 20, 'Bytes')
+
+    with patch('time.time', return_value = 1700000000.0):
+        documents = test.documents()
+
+    assert documents == [
+        {
+            '_aws': {
+                'Timestamp': 1700000000000,
+                'CloudWatchMetrics': [
+                    {
+                        'Namespace': 'Namespace',
+                        'Dimensions': [ [ 'Service' ] ],
+                        'Metrics': [ { 'Name': 'Requests', 'Unit': 'Count' }, { 'Name': 'PayloadSize', 'Unit': 'Bytes' } ]
+                    }
+                ]
+            },
+            'Service': 'billing',
+            'Requests': 3,
+            'PayloadSize': [ 10, 20 ]
+        }
+    ]
+
+
+def test_MetricsAggregator_documents_usesGivenDimensionSets():
+    test = am.MetricsAggregator('Namespace', dimensions = { 'Service': 'billing', 'Stage': 'prod' }, dimension_sets = [ [ 'Service' ], [ 'Service', 'Stage' ] ])
+    test.increment('Requests')
+
+    assert test.documents()[0]['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [ [ 'Service' ], [ 'Service', 'Stage' ] ]
+
+
+def test_MetricsAggregator_documents_splitsAtMetricsCountLimit():
+    test = am.MetricsAggregator('Namespace')
+
+    for i in range(am.MAX_METRICS_PER_DOCUMENT * 2 + 1):
+        test.increment(f'Metric{i}')
+
+    documents = test.documents()
+
+    assert [ len(d['_aws']['CloudWatchMetrics'][0]['Metrics']) for d in documents ] == [ am.MAX_METRICS_PER_DOCUMENT, am.MAX_METRICS_PER_DOCUMENT, 1 ]
+
+
+def test_MetricsAggregator_documents_splitsAtValuesCountLimit():
+    test = am.MetricsAggregator('Namespace')
+    values = [ random.random() for _ in range(am.MAX_VALUES_PER_METRIC + 5) ]
+
+    test.increment('Requests')
+
+    for value in values:
+        test.observe('Latency', value, 'Milliseconds')
+
+    documents = test.documents()
+
+    assert len(documents) == 2
+    assert documents[0]['Latency'] + documents[1]['Latency'] == values
+    assert 'Requests' in documents[0] and 'Requests' not in documents[1]
+
+
+def test_MetricsAggregator_timer_observesDurationInMilliseconds():
+    test = am.MetricsAggregator('Namespace')
+
+    with patch('time.perf_counter', side_effect = [ 1.0, 1.25 ]):
+        with test.timer('Latency'):
+            pass
+
+    assert test._histograms['Latency'] == [ 'Milliseconds', [ 250.0 ] ]
+
+
+def test_MetricsAggregator_emit_logsDocumentsAndResets():
+    test = am.MetricsAggregator('Namespace')
+    test.increment('Requests')
+
+    with patch('awsmate.metrics.log_json') as mlj:
+        test.emit()
+
+    assert mlj.call_args[0][0]['Requests'] == 1
+    assert test.documents() == []
+
+
+def test_MetricsAggregator_instrument_observesLatencyAndEmits():
+    test = am.MetricsAggregator('Namespace')
+
+    @test.instrument
+    def handler(event, context):
+        return event
+
+    with patch.object(test, 'emit') as me:
+        assert handler('some-event', None) == 'some-event'
+
+    me.assert_called_once()
+    assert len(test._histograms['Latency'][1]) == 1
+
+
+def test_MetricsAggregator_record_http_responses_recordsStatusAndSizes():
+    test = am.MetricsAggregator('Namespace')
+    event = ag.LambdaProxyEvent({ 'headers': { 'Accept-Encoding': 'gzip' } })
+    payload = { 'data': 'x' * 2000 }
+
+    test.record_http_responses()
+
+    try:
+        response = ag.build_http_response(200, payload, event = event)
+        ag.build_http_response(404, 'Not Found')
+
+    finally:
+        test.record_http_responses(False)
+
+    uncompressedSize = len(gzip.decompress(base64.b64decode(response['body'])))
+    compressedSize = len(base64.b64decode(response['body']))
+
+    assert test._counters == { 'Http2xx': [ 'Count', 1 ], 'Http4xx': [ 'Count', 1 ] }
+    assert test._histograms['ResponseBodySize'][1][0] == uncompressedSize
+    assert test._histograms['CompressionRatio'][1] == [ compressedSize / uncompressedSize ]
+    assert ag._response_hooks == []